@@ -1,18 +1,41 @@
 #!/usr/bin/env python3
 import os
-import matplotlib
 import markdown
-from datetime import datetime
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from pymavlink import mavutil
-from flask import Flask, request, render_template, send_from_directory, redirect, url_for, session
+from datetime import datetime, timedelta
+from flask import Flask, Response, g, request, render_template, send_file, send_from_directory, redirect, url_for, session
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from authlib.integrations.flask_client import OAuth
 import sqlite3
+from contextlib import contextmanager, nullcontext
 import shutil
-from werkzeug.security import generate_password_hash, check_password_hash
+import socket
+import atexit
+import hashlib
+import json
+import threading
+import time
+import re
+import hmac
+import mimetypes
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from dataflash import DataFlashLog
+from loganalysis import (MESSAGES, PARSE_ENGINE, PLOT_MESSAGE_TYPES, PLOT_POINTS, TelemetrySeries, parse_log,
+                         read_dataflash_series, select_message_types, FLIGHT_SUMMARY_COLUMNS,
+                         compute_flight_summary, compute_flight_analytics, generate_plots,
+                         plot_titles, anonymize_gps_log)
+from instrumentation import MetricsRegistry, Profiler, StageTimings
+from export import EXPORT_FORMATS, export_chunks, format_available
+import videoindex
+import fleet
+from werkzeug.security import generate_password_hash, check_password_hash, safe_join
+from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
+try:
+    import fcntl
+except ImportError:  # Windows: file locks only exclude threads of this process
+    fcntl = None
 load_dotenv()
 
 app = Flask(__name__)
@@ -40,17 +63,236 @@ github = oauth.register(
 # Directories
 UPLOAD_FOLDER = 'uploads'
 PLOT_FOLDER = 'static/plots'
+PARSE_CACHE_FOLDER = 'cache'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['PLOT_FOLDER'] = PLOT_FOLDER
+app.config['PARSE_CACHE_FOLDER'] = PARSE_CACHE_FOLDER
+app.config['PARSE_CACHE_MAX_BYTES'] = int(os.environ.get('PARSE_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+app.config['PLOT_CACHE_MAX_BYTES'] = int(os.environ.get('PLOT_CACHE_MAX_BYTES', 1024 ** 3))
+# Seconds after its last write that a cache's .tmp- entry, left by a process that died
+# mid-write, is removed by eviction
+app.config['CACHE_TMP_GRACE_SECONDS'] = float(os.environ.get('CACHE_TMP_GRACE_SECONDS', 3600))
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PLOT_FOLDER, exist_ok=True)
+os.makedirs(PARSE_CACHE_FOLDER, exist_ok=True)
+
+# Instrumentation. Request and processing-stage durations are aggregated into histograms
+# served at /metrics in the Prometheus text format, and each job's own stage breakdown
+# is logged and kept on its row (see /jobs/<id>/status). PROFILE_MODE=cprofile or
+# pyinstrument also profiles every job and request, keeping a dump in PROFILE_FOLDER
+# for those that ran longer than PROFILE_SLOW_SECONDS. With several server processes
+# (see gunicorn.conf.py), METRICS_FOLDER holds each one's snapshot so any of them can
+# report the totals.
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+app.config['PROFILE_MODE'] = os.environ.get('PROFILE_MODE', 'off')
+app.config['PROFILE_FOLDER'] = os.environ.get('PROFILE_FOLDER', 'profiles')
+app.config['PROFILE_SLOW_SECONDS'] = float(os.environ.get('PROFILE_SLOW_SECONDS', 30))
+if app.config['PROFILE_MODE'] not in ('off', 'cprofile', 'pyinstrument'):
+    raise ValueError(f"Unknown PROFILE_MODE: {app.config['PROFILE_MODE']}")
+app.config['METRICS_FOLDER'] = os.environ.get('METRICS_FOLDER')
+if app.config['METRICS_FOLDER']:
+    os.makedirs(app.config['METRICS_FOLDER'], exist_ok=True)
+profiler = None
+if app.config['PROFILE_MODE'] != 'off':
+    profiler = Profiler(app.config['PROFILE_MODE'], app.config['PROFILE_FOLDER'],
+                        app.config['PROFILE_SLOW_SECONDS'], app.logger)
+
+metrics = MetricsRegistry(app.config['METRICS_FOLDER'])
+request_duration = metrics.histogram('loganalyser_http_request_duration_seconds',
+                                     "Time to handle a request, by endpoint", ['endpoint', 'method'])
+stage_duration = metrics.histogram('loganalyser_stage_duration_seconds',
+                                   "Time spent in each upload and processing stage", ['stage'])
+job_duration = metrics.histogram('loganalyser_job_duration_seconds', "Log processing job run time", ['status'])
+parse_cache_events = metrics.counter('loganalyser_parse_cache_events_total',
+                                     "Parse cache hits, misses and evictions", ['event'])
+PARSE_CACHE_EVENTS = ['evictions', 'hits', 'misses']
+for event in PARSE_CACHE_EVENTS:
+    parse_cache_events.inc(0, event=event)
+
+@contextmanager
+def file_lock(path):
+    # Exclusive lock on `path` across threads and server processes (each holder opens its
+    # own descriptor, and flock excludes other descriptors of the same file)
+    with open(path, 'a') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def observe_stages(stages):
+    for record in stages:
+        stage_duration.observe(record['seconds'], stage=record['stage'])
+
+@contextmanager
+def timed_stage(name):
+    # Time a stage that belongs to no job, e.g. rendering a session's markdown
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_duration.observe(time.perf_counter() - start, stage=name)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if profiler:
+        g.request_profile = profiler.profile(f"request-{request.endpoint or 'unmatched'}")
+        g.request_profile.__enter__()
+
+@app.teardown_request
+def finish_request_timer(exc):
+    if 'request_profile' in g:
+        g.request_profile.__exit__(None, None, None)
+    if 'request_start' in g:
+        request_duration.observe(time.perf_counter() - g.request_start,
+                                 endpoint=request.endpoint or 'unmatched', method=request.method)
 
 # Database setup
 DATABASE = 'users.db'
 
+# SQLite connections are pooled instead of opened per query. Each one runs in WAL mode
+# (readers never wait for the writer) with NORMAL sync, and waits on a busy database
+# rather than failing with "database is locked".
+app.config['SQLITE_JOURNAL_MODE'] = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 8))
+
+class ConnectionPool:
+    def __init__(self, database, size):
+        self.database = database
+        self.size = size
+        self.idle = []
+        self.inherited = []
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, timeout=30, check_same_thread=False)
+        conn.execute(f"PRAGMA journal_mode = {app.config['SQLITE_JOURNAL_MODE']}")
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        conn.execute('PRAGMA cache_size = -16000')  # 16 MB page cache per connection
+        return conn
+
+    @contextmanager
+    def connection(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                # Forked child: the parent's connections must not be used or closed here
+                self.inherited += self.idle
+                self.idle, self.pid = [], os.getpid()
+            conn = self.idle.pop() if self.idle else None
+        if conn is None:
+            conn = self._connect()
+        try:
+            with conn:  # commit on success, roll back on error
+                yield conn
+        finally:
+            with self.lock:
+                if len(self.idle) < self.size:
+                    self.idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+db_pool = ConnectionPool(DATABASE, app.config['DB_POOL_SIZE'])
+
+def db_connection():
+    return db_pool.connection()
+
+def _add_column(c, table, column, declaration):
+    c.execute(f'PRAGMA table_info({table})')
+    if column not in {row[1] for row in c.fetchall()}:
+        c.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+
+def _migrate_jobs(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS jobs
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  session_id INTEGER,
+                  user_id INTEGER,
+                  status TEXT,
+                  error TEXT,
+                  created_at TIMESTAMP,
+                  updated_at TIMESTAMP,
+                  FOREIGN KEY (session_id) REFERENCES sessions(id),
+                  FOREIGN KEY (user_id) REFERENCES users(id))''')
+    for column, declaration in [('stage', 'TEXT'), ('bytes_done', 'INTEGER DEFAULT 0'),
+                                ('bytes_total', 'INTEGER DEFAULT 0'), ('plots_done', 'INTEGER DEFAULT 0'),
+                                ('plots_total', 'INTEGER DEFAULT 0')]:
+        _add_column(c, 'jobs', column, declaration)
+
+def _migrate_flight_summaries(c):
+    c.execute(f'''CREATE TABLE IF NOT EXISTS flight_summaries
+                  (session_id INTEGER PRIMARY KEY,
+                   {', '.join(f'{column} REAL' for column in FLIGHT_SUMMARY_COLUMNS)},
+                   computed_at TIMESTAMP,
+                   FOREIGN KEY (session_id) REFERENCES sessions(id))''')
+
+def _migrate_airframe(c):
+    _add_column(c, 'sessions', 'airframe', 'TEXT')
+
+def _migrate_indexes(c):
+    # The session list and fleet queries filter by owner/airframe and sort by date; jobs
+    # are looked up by session (latest first) and by status on restart
+    c.execute('CREATE INDEX IF NOT EXISTS idx_sessions_user_created ON sessions(user_id, created_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_sessions_airframe_created ON sessions(airframe, created_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_jobs_session ON jobs(session_id, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)')
+
+def _migrate_job_timings(c):
+    _add_column(c, 'jobs', 'timings', 'TEXT')
+
+def _migrate_session_messages(c):
+    # Message types chosen at upload, comma-separated; NULL means every registered type
+    _add_column(c, 'sessions', 'messages', 'TEXT')
+
+def _migrate_video_offset(c):
+    # Seconds added to video time to get log time, shared by the session's videos
+    _add_column(c, 'sessions', 'video_offset', 'REAL DEFAULT 0')
+
+def _migrate_flight_analytics(c):
+    # compute_flight_analytics output (tracking error, spectra, ESC balance, events) as JSON
+    c.execute('''CREATE TABLE IF NOT EXISTS flight_analytics
+                 (session_id INTEGER PRIMARY KEY,
+                  analytics TEXT,
+                  computed_at TIMESTAMP,
+                  FOREIGN KEY (session_id) REFERENCES sessions(id))''')
+
+def _migrate_workers(c):
+    # Server processes (see "Worker processes" below) and the one holding each job
+    c.execute('''CREATE TABLE IF NOT EXISTS workers
+                 (id TEXT PRIMARY KEY,
+                  host TEXT,
+                  pid INTEGER,
+                  started_at TIMESTAMP,
+                  heartbeat_at TIMESTAMP)''')
+    _add_column(c, 'jobs', 'worker', 'TEXT')
+
+def _migrate_flight_metrics(c):
+    # Fleet metrics over decoded columns (see fleet_query), per log content and metric
+    # name, so they outlive the log's parse cache entry; a NULL value means no data
+    c.execute('''CREATE TABLE IF NOT EXISTS flight_metrics
+                 (digest TEXT,
+                  metric TEXT,
+                  value REAL,
+                  computed_at TIMESTAMP,
+                  PRIMARY KEY (digest, metric))''')
+
+# Schema changes since the original users/sessions tables, applied in order and recorded
+# in PRAGMA user_version. Each step is idempotent, so databases created before versioning
+# (user_version 0) safely run them all once. Append new steps; never reorder.
+MIGRATIONS = [_migrate_jobs, _migrate_flight_summaries, _migrate_airframe, _migrate_indexes, _migrate_job_timings,
+              _migrate_session_messages, _migrate_video_offset, _migrate_flight_analytics, _migrate_workers,
+              _migrate_flight_metrics]
+
 def init_db():
-    with sqlite3.connect(DATABASE) as conn:
+    with db_connection() as conn:
         c = conn.cursor()
+        # Every server process runs this on import; the first takes the write lock and
+        # migrates, the others wait and find the schema current
+        c.execute('BEGIN IMMEDIATE')
         c.execute('''CREATE TABLE IF NOT EXISTS users
                      (id INTEGER PRIMARY KEY AUTOINCREMENT,
                       github_id TEXT UNIQUE,
@@ -63,10 +305,21 @@ def init_db():
                       videos TEXT,
                       created_at TIMESTAMP,
                       FOREIGN KEY (user_id) REFERENCES users(id))''')
+        c.execute('PRAGMA user_version')
+        version = c.fetchone()[0]
+        for number, migrate in enumerate(MIGRATIONS[version:], start=version + 1):
+            migrate(c)
+            c.execute(f'PRAGMA user_version = {number}')
         conn.commit()
 
 init_db()
 
+def session_message_types(value):
+    # sessions.messages -> list of message types, or None for all of them
+    if value is None:
+        return None
+    return [name for name in value.split(',') if name]
+
 # User model for Flask-Login
 class User(UserMixin):
     def __init__(self, id, github_id, username):
@@ -74,375 +327,1073 @@ class User(UserMixin):
         self.github_id = github_id
         self.username = username
 
+# load_user runs on every authenticated request; users rarely change, so lookups are
+# cached for USER_CACHE_TTL seconds
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 60))
+user_cache = {}
+user_cache_lock = threading.Lock()
+
 @login_manager.user_loader
 def load_user(user_id):
-    with sqlite3.connect(DATABASE) as conn:
+    now = time.monotonic()
+    with user_cache_lock:
+        cached = user_cache.get(user_id)
+    if cached and cached[0] > now:
+        return cached[1]
+    with db_connection() as conn:
         c = conn.cursor()
         c.execute('SELECT id, github_id, username FROM users WHERE id = ?', (user_id,))
         user = c.fetchone()
-        if user:
-            return User(user[0], user[1], user[2])
+    user = User(user[0], user[1], user[2]) if user else None
+    with user_cache_lock:
+        user_cache[user_id] = (now + USER_CACHE_TTL, user)
+    return user
+
+# Multi-resolution min/max index. Level k holds the (min index, max index) pair of
+# every block of PYRAMID_BLOCK * 2**k samples, all levels concatenated finest first,
+# so any time window can be reduced to a bounded number of points by reading only the
+# blocks that cover it.
+PYRAMID_BLOCK = 16
+
+def pyramid_levels(n):
+    # (row offset, block count, block size) of each level for a column of n samples
+    levels = []
+    offset, count, size = 0, -(-n // PYRAMID_BLOCK), PYRAMID_BLOCK
+    while count:
+        levels.append((offset, count, size))
+        if count == 1:
+            break
+        offset, count, size = offset + count, -(-count // 2), size * 2
+    return levels
+
+def build_minmax_pyramid(values):
+    values = np.asarray(values)
+    n = len(values)
+    index_type = np.int32 if n < 2 ** 31 else np.int64
+    if n == 0:
+        return np.zeros((0, 2), dtype=index_type)
+    full = n // PYRAMID_BLOCK
+    blocks = values[:full * PYRAMID_BLOCK].reshape(full, PYRAMID_BLOCK)
+    starts = np.arange(full) * PYRAMID_BLOCK
+    level = np.stack([starts + blocks.argmin(axis=1), starts + blocks.argmax(axis=1)], axis=1)
+    if full * PYRAMID_BLOCK < n:
+        tail = values[full * PYRAMID_BLOCK:]
+        level = np.vstack([level, [full * PYRAMID_BLOCK + tail.argmin(), full * PYRAMID_BLOCK + tail.argmax()]])
+    levels = [level]
+    while len(level) > 1:
+        # Merge neighbouring blocks; an odd last block is paired with itself
+        if len(level) % 2:
+            level = np.vstack([level, level[-1:]])
+        pairs = level.reshape(-1, 2, 2)
+        mins, maxs = pairs[:, :, 0], pairs[:, :, 1]
+        level = np.stack([np.take_along_axis(mins, values[mins].argmin(axis=1)[:, None], axis=1)[:, 0],
+                          np.take_along_axis(maxs, values[maxs].argmax(axis=1)[:, None], axis=1)[:, 0]], axis=1)
+        levels.append(level)
+    return np.concatenate(levels).astype(index_type)
+
+def _minmax_picks(values, start, stop):
+    # Sorted indices of the min and max sample in values[start:stop]
+    if stop <= start:
+        return np.arange(0)
+    window = values[start:stop]
+    return np.sort([start + int(np.argmin(window)), start + int(np.argmax(window))])
+
+def query_minmax_pyramid(pyramid, values, start, stop, points):
+    # Sample indices in [start, stop) reduced to at most ~2 * points min/max picks. The
+    # blocks wholly inside the window come from the pyramid; the partial blocks at its
+    # edges are reduced from the samples, so their extremes outside the window are
+    # never picked in place of the ones inside it.
+    if stop - start <= 2 * points:
+        return np.arange(start, stop)
+    for offset, count, size in pyramid_levels(len(values)):
+        if (stop - start) / size <= points or offset + count == len(pyramid):
+            first, last = -(-start // size), stop // size
+            if first >= last:
+                return _minmax_picks(values, start, stop)
+            picks = np.sort(np.asarray(pyramid[offset + first:offset + last]), axis=1).ravel()
+            return np.concatenate([_minmax_picks(values, start, first * size), picks,
+                                   _minmax_picks(values, last * size, stop)])
+    return np.arange(0)
+
+# Parsed-log cache. Each log's decoded series are stored on disk under the SHA-256 of
+# the log contents as one uncompressed .npy file per column, plus a min/max pyramid per
+# field, so a cache hit is just a set of memory maps. An entry holds whichever message
+# types have been requested for that log so far; asking for more decodes only the
+# missing ones and merges them in. Entries are evicted least-recently-used once the
+# folder grows past PARSE_CACHE_MAX_BYTES.
+PARSE_CACHE_VERSION = 2
+
+parse_cache_lock = threading.Lock()
+# Digests of recently used logs by (path, size, mtime), so a log is hashed once rather
+# than on every request; the DIGEST_MEMO_MAX most recently used are kept
+DIGEST_MEMO_MAX = 1024
+_digest_memo = {}
+_digest_memo_lock = threading.Lock()
+
+def _digest_memo_key(path):
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+def _memo_digest(memo_key, digest):
+    with _digest_memo_lock:
+        _digest_memo.pop(memo_key, None)
+        _digest_memo[memo_key] = digest
+        while len(_digest_memo) > DIGEST_MEMO_MAX:
+            del _digest_memo[next(iter(_digest_memo))]
+
+def remember_digest(path, digest):
+    # Record a digest computed while the file was being written, so it is never re-read
+    _memo_digest(_digest_memo_key(path), digest)
+
+def file_digest(path):
+    memo_key = _digest_memo_key(path)
+    with _digest_memo_lock:
+        digest = _digest_memo.pop(memo_key, None)
+        if digest is not None:
+            _digest_memo[memo_key] = digest  # now the most recently used
+            return digest
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    _memo_digest(memo_key, sha.hexdigest())
+    return sha.hexdigest()
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    _digest_memo[memo_key] = sha.hexdigest()
+    return _digest_memo[memo_key]
+
+def _count_cache_event(event):
+    parse_cache_events.inc(event=event)
+
+def _cache_entries(cache_root):
+    # (last used, bytes, path) for every complete entry directory under cache_root
+    entries = []
+    for name in os.listdir(cache_root):
+        path = os.path.join(cache_root, name)
+        if not os.path.isdir(path) or '.tmp-' in name:
+            continue
+        size = sum(entry.stat().st_size for entry in os.scandir(path))
+        entries.append((os.stat(path).st_mtime, size, path))
+    return entries
+
+def remove_stale_tmp(cache_root):
+    # Remove .tmp- entries not written to for CACHE_TMP_GRACE_SECONDS; a live writer
+    # keeps adding files, which refreshes its directory's mtime
+    cutoff = time.time() - app.config['CACHE_TMP_GRACE_SECONDS']
+    for name in os.listdir(cache_root):
+        path = os.path.join(cache_root, name)
+        try:
+            if '.tmp-' not in name or os.stat(path).st_mtime >= cutoff:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+        except OSError:
+            pass  # finished or removed meanwhile
+
+def evict_lru(cache_root, max_bytes, keep=None):
+    # Remove least-recently-used entries until cache_root fits in max_bytes, after
+    # clearing out stale .tmp- entries
+    remove_stale_tmp(cache_root)
+    entries = sorted(_cache_entries(cache_root))
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        evicted += 1
+    return evicted
+
+def evict_parse_cache(keep=None):
+    evicted = evict_lru(app.config['PARSE_CACHE_FOLDER'], app.config['PARSE_CACHE_MAX_BYTES'], keep)
+    parse_cache_events.inc(evicted, event='evictions')
+
+def read_cache_manifest(entry):
+    try:
+        with open(os.path.join(entry, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
         return None
+    if manifest.get('version') != PARSE_CACHE_VERSION:
+        return None
+    return manifest
 
-# Utility functions (unchanged)
-def get_time_from_msg(msg):
-    if hasattr(msg, 'time_boot_ms'):
-        return msg.time_boot_ms / 1000.0
-    if hasattr(msg, 'TimeUS'):
-        return msg.TimeUS / 1e6
-    return None
+def read_parse_cache(digest, message_types=None):
+    # {message type: series} for the requested types (None = all), or None unless every
+    # one of them is cached
+    entry = os.path.join(app.config['PARSE_CACHE_FOLDER'], digest)
+    manifest = read_cache_manifest(entry)
+    if manifest is None:
+        return None
+
+    def load(name, instance, fields):
+        prefix = name if instance is None else f"{name}.{instance}"
+        paths = {column: os.path.join(entry, f"{prefix}.{column}.npy") for column in ['Time'] + fields}
+        columns = [np.load(paths[column], mmap_mode='r') for column in ['Time'] + fields]
+        series = TelemetrySeries.from_columns(fields, columns[0], columns[1:])
+        series.paths = paths
+        return series
+
+    data = {}
+    try:
+        for name in select_message_types(message_types):
+            spec = manifest['series'][name]
+            if spec['instances'] is None:
+                data[name] = load(name, None, spec['fields'])
+            else:
+                data[name] = {i: load(name, i, spec['fields']) for i in spec['instances']}
+    except (OSError, KeyError, ValueError):
+        # Type not cached yet, entry evicted or written by an incompatible version
+        return None
+    os.utime(entry)  # mark as recently used for LRU eviction
+    return data
+
+def cached_message_types(digest):
+    manifest = read_cache_manifest(os.path.join(app.config['PARSE_CACHE_FOLDER'], digest))
+    return set(manifest['series']) if manifest else set()
+
+def write_parse_cache(digest, data):
+    # Store parsed `data` ({message type: series}), adding to an existing entry
+    cache_root = app.config['PARSE_CACHE_FOLDER']
+    entry = os.path.join(cache_root, digest)
+    tmp_entry = f"{entry}.tmp-{os.getpid()}-{threading.get_ident()}"
+    os.makedirs(tmp_entry)
+    manifest = {'version': PARSE_CACHE_VERSION, 'series': {}, 'streams': {}}
+    try:
+        for name, value in data.items():
+            instances = value if isinstance(value, dict) else {None: value}
+            first = next(iter(instances.values()))
+            manifest['series'][name] = {'fields': first.fields,
+                                        'instances': None if None in instances else list(instances)}
+            for instance, series in instances.items():
+                prefix = name if instance is None else f"{name}.{instance}"
+                manifest['streams'][prefix] = {'fields': series.fields, 'samples': len(series)}
+                for column in ['Time'] + series.fields:
+                    np.save(os.path.join(tmp_entry, f"{prefix}.{column}.npy"), series[column])
+                for column in series.fields:
+                    np.save(os.path.join(tmp_entry, f"{prefix}.{column}.minmax.npy"),
+                            build_minmax_pyramid(series[column]))
+        with open(os.path.join(tmp_entry, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+    except BaseException:
+        shutil.rmtree(tmp_entry, ignore_errors=True)  # e.g. disk full
+        raise
+    try:
+        os.rename(tmp_entry, entry)
+    except OSError:
+        # The log is already cached (or another worker cached it first); add to it
+        try:
+            _merge_cache_entry(entry, tmp_entry, manifest)
+        except OSError:
+            pass  # entry evicted meanwhile; the types are decoded again when next requested
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+    evict_parse_cache(keep=entry)
+
+def _merge_cache_entry(entry, tmp_entry, manifest):
+    # Move the new columns in, then extend the manifest. Merges are serialised across
+    # server processes and the manifest is replaced atomically, so readers see either the
+    # old or the merged type list.
+    with parse_cache_lock, file_lock(os.path.join(app.config['PARSE_CACHE_FOLDER'], 'merge.lock')):
+        existing = read_cache_manifest(entry)
+        if existing is not None:
+            existing['series'].update(manifest['series'])
+            existing['streams'].update(manifest['streams'])
+            manifest = existing
+        for name in os.listdir(tmp_entry):
+            if name != 'manifest.json':
+                os.replace(os.path.join(tmp_entry, name), os.path.join(entry, name))
+        with open(os.path.join(tmp_entry, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+        os.replace(os.path.join(tmp_entry, 'manifest.json'), os.path.join(entry, 'manifest.json'))
+
+# DataFlash indexes of logs uploaded in chunks, built as the bytes arrived and handed
+# over on commit to the job that decodes the log in this process: {digest: DataFlashLog}.
+# A job recovered by another process indexes the log itself; only the newest
+# UPLOADED_INDEXES_MAX are kept waiting, the rest closed.
+UPLOADED_INDEXES_MAX = 16
+uploaded_indexes = {}
+uploaded_indexes_lock = threading.Lock()
+
+def hand_over_index(digest, log):
+    with uploaded_indexes_lock:
+        previous = uploaded_indexes.pop(digest, None)
+        uploaded_indexes[digest] = log
+        while len(uploaded_indexes) > UPLOADED_INDEXES_MAX:
+            stale = uploaded_indexes.pop(next(iter(uploaded_indexes)))
+            stale.close()
+    if previous:
+        previous.close()
+
+def take_uploaded_index(digest):
+    with uploaded_indexes_lock:
+        return uploaded_indexes.pop(digest, None)
 
-def parse_log(logfile):
-    # Check file extension to determine parsing method
-    if logfile.endswith('.BIN'):
-        mav = mavutil.mavlink_connection(logfile, robust_parsing=True, dialect='ardupilotmega')
-    elif logfile.endswith('.log'):
-        mav = mavutil.mavlink_connection(logfile, robust_parsing=True, dialect='ardupilotmega')  # Adjust if needed for .log files
+def load_parsed_log(logfile, message_types=None, progress_callback=None, timings=None):
+    # {message type: series} for the requested types (None = all), decoding only those
+    # not already in the parse cache
+    timings = timings or StageTimings()
+    names = select_message_types(message_types)
+    with timings.stage('parse.digest'):
+        digest = file_digest(logfile)
+    with timings.stage('parse.cache_read') as stage:
+        available = cached_message_types(digest)
+        cached = [name for name in names if name in available]
+        data = read_parse_cache(digest, cached) if cached else {}
+        if data is None:
+            data = {}  # evicted since the manifest was read
+        stage['hit'] = len(data) == len(names)
+    if len(data) == len(names):
+        _count_cache_event('hits')
+        app.logger.info("Parse cache hit for %s (%s)", logfile, digest[:12])
+        if progress_callback:
+            size = os.path.getsize(logfile)
+            progress_callback(size, size)
+        return data
+    missing = [name for name in names if name not in data]
+    _count_cache_event('misses')
+    app.logger.info("Parse cache miss for %s (%s): decoding %s", logfile, digest[:12], ', '.join(missing))
+    log_index = take_uploaded_index(digest)
+    if log_index is not None:
+        with log_index:
+            parsed = read_dataflash_series(log_index, missing, timings)
+        if progress_callback:
+            size = os.path.getsize(logfile)
+            progress_callback(size, size)
     else:
-        raise ValueError("Unsupported file format")
-    
-    # Initialize data structures
-    attitude_data = {'Time': [], 'Roll': [], 'Pitch': [], 'Yaw': [], 'DesRoll': [], 'DesPitch': [], 'DesYaw': []}
-    RATE_data = {'Time': [], 'R': [], 'P': [], 'Y': [], 'RDes': [], 'PDes': [], 'YDes': []}
-    altitude_data = {'Time0': [], 'Time1': [], 'Alt0': [], 'Alt1': []}
-    ESC_data = {i: {'Time': [], 'RPM': [], 'RawRPM': [], 'Voltage': [], 'Current': [], 'Temp': []} for i in range(4)}
-    BAT_data = {'Time': [], 'Volt': [], 'Curr': [], 'Temp': []}
-    GPA_data = {'Time': [], 'HAcc': [], 'SAcc': [], 'VAcc': []}
-    VIBE_data = {'Time': [], 'VibeX': [], 'VibeY': [], 'VibeZ': [], 'Clip': []}
-    RCIN_data = {'Time': [], 'C1': [], 'C2': [], 'C3': [], 'C4': []}
-    RCOU_data = {'Time': [], 'C1': [], 'C2': [], 'C3': [], 'C4': []}
-    XKF4_data = {'Time': [], 'SV': [], 'SP': [], 'SH': [], 'SM': [], 'SVT': []}
-
-    # Parse the log file
-    while True:
-        msg = mav.recv_match(blocking=True)
-        if msg is None:
-            break
-        t = get_time_from_msg(msg) or (mav.time if hasattr(mav, 'time') else None)
-        if t is None:
+        parsed = parse_log(logfile, missing, progress_callback=progress_callback, timings=timings)
+    with timings.stage('parse.cache_write'):
+        write_parse_cache(digest, parsed)
+    # Hand back the memory-mapped copy so the parsed arrays can be freed and the columns
+    # can be shared with plot workers; fall back to the in-memory data if already evicted
+    data.update(read_parse_cache(digest, missing) or parsed)
+    return {name: data[name] for name in names}
+
+def cached_series_index(logfile, message_types=None):
+    # (cache entry path, manifest) for a log's parse cache entry, with manifest None
+    # unless every requested message type (None = all) is cached; never decodes
+    entry = os.path.join(app.config['PARSE_CACHE_FOLDER'], file_digest(logfile))
+    manifest = read_cache_manifest(entry)
+    if manifest is None or any(name not in manifest['series'] for name in select_message_types(message_types)):
+        return entry, None
+    try:
+        os.utime(entry)  # mark as recently used for LRU eviction
+    except OSError:
+        return entry, None  # evicted meanwhile
+    return entry, manifest
+
+def load_series_index(logfile, message_types=None):
+    # cached_series_index(), decoding any of the requested message types that aren't
+    # cached yet
+    entry, manifest = cached_series_index(logfile, message_types)
+    if manifest is None:
+        load_parsed_log(logfile, message_types)
+        manifest = read_cache_manifest(entry)
+    return entry, manifest
+
+def read_series_window(entry, manifest, stream, fields, t0=None, t1=None, points=1000):
+    # Samples of `fields` of one stream between t0 and t1, reduced through the min/max
+    # pyramid to at most ~2 * points per field. Only the pyramid blocks inside the window,
+    # the samples of the partial blocks at its edges and the picked samples are read
+    # from the memory-mapped columns.
+    spec = manifest['streams'][stream]
+    n = spec['samples']
+    time = np.load(os.path.join(entry, f"{stream}.Time.npy"), mmap_mode='r')
+    start = 0 if t0 is None else int(np.searchsorted(time, t0, side='left'))
+    stop = n if t1 is None else int(np.searchsorted(time, t1, side='right'))
+    window = {}
+    for field in fields:
+        values = np.load(os.path.join(entry, f"{stream}.{field}.npy"), mmap_mode='r')
+        pyramid = np.load(os.path.join(entry, f"{stream}.{field}.minmax.npy"), mmap_mode='r')
+        index = query_minmax_pyramid(pyramid, values, start, stop, points)
+        samples = np.asarray(values[index], dtype=np.float64)
+        window[field] = {'time': np.asarray(time[index]).tolist(),
+                         'values': [value if np.isfinite(value) else None for value in samples.tolist()]}
+    return {'stream': stream, 'samples': stop - start,
+            'range': [float(time[0]), float(time[-1])] if n else None, 'fields': window}
+
+def store_flight_summary(session_id, summary):
+    with db_connection() as conn:
+        conn.execute(f'''INSERT OR REPLACE INTO flight_summaries
+                         (session_id, {', '.join(FLIGHT_SUMMARY_COLUMNS)}, computed_at)
+                         VALUES (?, {', '.join('?' for _ in FLIGHT_SUMMARY_COLUMNS)}, ?)''',
+                     (session_id, *[summary[column] for column in FLIGHT_SUMMARY_COLUMNS], datetime.utcnow()))
+        conn.commit()
+
+def store_flight_analytics(session_id, analytics):
+    with db_connection() as conn:
+        conn.execute('INSERT OR REPLACE INTO flight_analytics (session_id, analytics, computed_at) VALUES (?, ?, ?)',
+                     (session_id, json.dumps(analytics), datetime.utcnow()))
+        conn.commit()
+
+def read_flight_analytics(session_id):
+    with db_connection() as conn:
+        row = conn.execute('SELECT analytics FROM flight_analytics WHERE session_id = ?', (session_id,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+# Fleet queries across many flights (see fleet.py). Metrics over decoded columns are
+# computed in parallel on FLEET_WORKERS threads, straight from the memory-mapped parse
+# cache, decoding only the message types they refer to on a cache miss.
+app.config['FLEET_WORKERS'] = int(os.environ.get('FLEET_WORKERS', os.cpu_count() or 1))
+fleet_executor = ThreadPoolExecutor(max_workers=app.config['FLEET_WORKERS'], thread_name_prefix='fleet')
+
+def flight_metrics(log_file, metrics):
+    # STREAM.FIELD metrics of one flight's log, stored per log in flight_metrics
+    def compute(missing):
+        entry, manifest = load_series_index(log_file, {stream.split('.')[0] for stream, _, _ in missing})
+
+        def read_column(stream, field):
+            spec = manifest['streams'].get(stream) if manifest else None
+            if not spec or field not in spec['fields']:
+                return None
+            return np.load(os.path.join(entry, f"{stream}.{field}.npy"), mmap_mode='r')
+        return fleet.compute_metrics(read_column, missing)
+    return fleet.stored_flight_metrics(db_connection, file_digest(log_file), metrics, compute)
+
+def fleet_query(filters=(), metrics=(), **options):
+    # fleet.fleet_query over this app's database and parse cache; options are airframe,
+    # user_id, since and last
+    return fleet.fleet_query(db_connection, flight_metrics, filters, metrics, map=fleet_executor.map, **options)
+
+# Rendered plots are content-addressed: each log's figures live in PLOT_FOLDER/<log
+# digest>/ with a plots.json manifest, are rendered once, and are evicted LRU once the
+# folder grows past PLOT_CACHE_MAX_BYTES. Figures for a subset of message types go in
+# <log digest>-<8 hex digits naming the subset>/. Bump PLOT_VERSION when figures change;
+# changing PLOT_POINTS also invalidates existing renders.
+PLOT_VERSION = 3
+
+def plot_set_id(digest, message_types=None):
+    names = select_message_types(message_types)
+    if names == PLOT_MESSAGE_TYPES:
+        return digest
+    return f"{digest}-{hashlib.sha256(','.join(names).encode()).hexdigest()[:8]}"
+
+def read_plot_manifest(plot_dir):
+    try:
+        with open(os.path.join(plot_dir, 'plots.json')) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != PLOT_VERSION or manifest.get('points') != PLOT_POINTS:
+        return None
+    return {key: os.path.join(plot_dir, filename) for key, filename in manifest['plots'].items()}
+
+def ensure_plots(logfile, message_types=None, progress_callback=None, timings=None):
+    # Returns (plot id, {plot key: png path}) for the figures of the requested message
+    # types (None = all), rendering only if no up-to-date plots exist
+    timings = timings or StageTimings()
+    plot_id = plot_set_id(file_digest(logfile), message_types)
+    plot_dir = os.path.join(app.config['PLOT_FOLDER'], plot_id)
+    with timings.stage('plots.cache_read') as stage:
+        plot_files = read_plot_manifest(plot_dir)
+        stage['hit'] = plot_files is not None
+    if plot_files is not None:
+        os.utime(plot_dir)  # mark as recently used for LRU eviction
+        if progress_callback:
+            progress_callback(len(plot_files), len(plot_files))
+        return plot_id, plot_files
+
+    data = load_parsed_log(logfile, message_types)
+    tmp_dir = f"{plot_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        rendered = generate_plots(data, tmp_dir, progress_callback=progress_callback, timings=timings)
+        with open(os.path.join(tmp_dir, 'plots.json'), 'w') as f:
+            json.dump({'version': PLOT_VERSION, 'points': PLOT_POINTS,
+                       'plots': {key: os.path.basename(path) for key, path in rendered.items()}}, f)
+        if os.path.isdir(plot_dir) and read_plot_manifest(plot_dir) is None:
+            shutil.rmtree(plot_dir, ignore_errors=True)  # rendered by an older PLOT_VERSION
+        try:
+            os.rename(tmp_dir, plot_dir)
+        except OSError:
+            pass  # another worker rendered the same log first
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)  # left only if rendering failed or lost the race
+    evict_lru(app.config['PLOT_FOLDER'], app.config['PLOT_CACHE_MAX_BYTES'], keep=plot_dir)
+    return plot_id, read_plot_manifest(plot_dir)
+
+# Video thumbnails (see videoindex.py), extracted by VIDEO_WORKERS background threads
+# when videos are uploaded (or first viewed) and never on the request path. Each
+# video's thumbnails live in THUMBNAIL_FOLDER/<key>/, the key naming the file's path,
+# size and mtime plus the interval and width, so a folder's contents never change and
+# are served as immutable. Evicted LRU past THUMBNAIL_CACHE_MAX_BYTES. Extraction state
+# is kept next to the folder so every server process sees it: <key>.pending while a
+# worker extracts and <key>.error if extraction failed. The pending file is claimed by
+# creating it, names the claiming process, and is touched by that process's maintenance
+# thread, so a claim outlives neither its process nor WORKER_TIMEOUT_SECONDS without a
+# heartbeat. A failed extraction is retried THUMBNAIL_RETRY_SECONDS after it failed, up
+# to THUMBNAIL_MAX_ATTEMPTS attempts in all.
+app.config['THUMBNAIL_FOLDER'] = os.path.join('static', 'thumbnails')
+app.config['THUMBNAIL_INTERVAL'] = float(os.environ.get('THUMBNAIL_INTERVAL', 5))
+app.config['THUMBNAIL_WIDTH'] = int(os.environ.get('THUMBNAIL_WIDTH', 320))
+app.config['THUMBNAIL_CACHE_MAX_BYTES'] = int(os.environ.get('THUMBNAIL_CACHE_MAX_BYTES', 1024 ** 3))
+app.config['VIDEO_WORKERS'] = int(os.environ.get('VIDEO_WORKERS', 1))
+app.config['THUMBNAIL_RETRY_SECONDS'] = float(os.environ.get('THUMBNAIL_RETRY_SECONDS', 600))
+app.config['THUMBNAIL_MAX_ATTEMPTS'] = int(os.environ.get('THUMBNAIL_MAX_ATTEMPTS', 3))
+os.makedirs(app.config['THUMBNAIL_FOLDER'], exist_ok=True)
+video_executor = ThreadPoolExecutor(max_workers=app.config['VIDEO_WORKERS'], thread_name_prefix='video')
+thumbnail_claims = set()  # pending files claimed by this process
+thumbnail_claims_lock = threading.Lock()
+
+def thumbnail_key(video_path):
+    stat = os.stat(video_path)
+    identity = (f"{os.path.abspath(video_path)}:{stat.st_size}:{stat.st_mtime_ns}:"
+                f"{app.config['THUMBNAIL_INTERVAL']:g}:{app.config['THUMBNAIL_WIDTH']}")
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+def build_thumbnails(video_path, key):
+    # Worker thread body: extract into a temporary folder and move it into place
+    out_dir = os.path.join(app.config['THUMBNAIL_FOLDER'], key)
+    tmp_dir = f"{out_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        with timed_stage('video.thumbnails'):
+            videoindex.extract_thumbnails(video_path, tmp_dir, app.config['THUMBNAIL_INTERVAL'],
+                                          app.config['THUMBNAIL_WIDTH'])
+        try:
+            os.rename(tmp_dir, out_dir)
+        except OSError:
+            pass  # extracted by another worker first
+        evict_lru(app.config['THUMBNAIL_FOLDER'], app.config['THUMBNAIL_CACHE_MAX_BYTES'], keep=out_dir)
+        try:
+            os.remove(f'{out_dir}.error')  # an earlier attempt's
+        except FileNotFoundError:
+            pass
+    except Exception as e:
+        app.logger.exception("Thumbnail extraction failed for %s", video_path)
+        failure = read_thumbnail_failure(out_dir)
+        with open(f'{tmp_dir}.error', 'w') as f:
+            json.dump({'error': str(e), 'attempts': (failure['attempts'] if failure else 0) + 1}, f)
+        os.replace(f'{tmp_dir}.error', f'{out_dir}.error')
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        try:
+            os.remove(f'{out_dir}.pending')
+        except OSError:
+            pass
+        with thumbnail_claims_lock:
+            thumbnail_claims.discard(f'{out_dir}.pending')
+
+def read_thumbnail_failure(out_dir):
+    # {'error', 'attempts', 'failed_at'} of the last failed extraction, or None
+    try:
+        with open(f'{out_dir}.error') as f:
+            failure = json.load(f)
+        failure['failed_at'] = os.path.getmtime(f'{out_dir}.error')
+    except (OSError, ValueError):
+        return None
+    return failure
+
+def read_thumbnail_error(key):
+    failure = read_thumbnail_failure(os.path.join(app.config['THUMBNAIL_FOLDER'], key))
+    return failure['error'] if failure else None
+
+def thumbnail_claim_stale(pending):
+    # True if the process that claimed an extraction is gone: it ran on this host and
+    # has exited, or its heartbeat (the file's mtime) stopped. A claim still being
+    # written has no owner yet and counts as live until it too misses the heartbeat.
+    try:
+        heartbeat = datetime.utcfromtimestamp(os.path.getmtime(pending))
+        with open(pending) as f:
+            owner = json.loads(f.read() or 'null')
+    except FileNotFoundError:
+        return False  # just finished
+    except ValueError:
+        owner = None
+    cutoff = datetime.utcnow() - timedelta(seconds=app.config['WORKER_TIMEOUT_SECONDS'])
+    if owner is None:
+        return heartbeat < cutoff
+    if owner['host'] == socket.gethostname() and owner['pid'] == os.getpid():
+        with thumbnail_claims_lock:
+            return pending not in thumbnail_claims  # an earlier process with our pid
+    return not worker_alive(owner['host'], owner['pid'], heartbeat, cutoff)
+
+def claim_thumbnails(out_dir):
+    # True if this process should extract: nobody else is, or the process that claimed
+    # the extraction died without finishing
+    pending = f'{out_dir}.pending'
+    for _ in range(2):
+        try:
+            fd = os.open(pending, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if not thumbnail_claim_stale(pending):
+                return False
+            try:
+                os.remove(pending)
+            except FileNotFoundError:
+                pass
             continue
+        with thumbnail_claims_lock:
+            thumbnail_claims.add(pending)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'host': socket.gethostname(), 'pid': os.getpid()}, f)
+        return True
+    return False
 
-        msg_type = msg.get_type()
-        dataDict = msg.to_dict()
-
-        if msg_type == "ATT":
-            attitude_data['Time'].append(t)
-            attitude_data['Roll'].append(dataDict['Roll'])
-            attitude_data['Pitch'].append(dataDict['Pitch'])
-            attitude_data['Yaw'].append(dataDict['Yaw'])
-            attitude_data['DesRoll'].append(dataDict['DesRoll'])
-            attitude_data['DesPitch'].append(dataDict['DesPitch'])
-            attitude_data['DesYaw'].append(dataDict['DesYaw'])
-        elif msg_type == "RATE":
-            RATE_data['Time'].append(t)
-            RATE_data['R'].append(dataDict['R'])
-            RATE_data['P'].append(dataDict['P'])
-            RATE_data['Y'].append(dataDict['Y'])
-            RATE_data['RDes'].append(dataDict['RDes'])
-            RATE_data['PDes'].append(dataDict['PDes'])
-            RATE_data['YDes'].append(dataDict['YDes'])
-        elif msg_type == "XKF4":
-            XKF4_data['Time'].append(t)
-            XKF4_data['SV'].append(dataDict['SV'])
-            XKF4_data['SP'].append(dataDict['SP'])
-            XKF4_data['SH'].append(dataDict['SH'])
-            XKF4_data['SM'].append(dataDict['SM'])
-            XKF4_data['SVT'].append(dataDict['SVT'])
-        elif msg_type == "BARO" and dataDict['I'] in [0, 1]:
-            if hasattr(msg, 'Alt'):
-                key = 'Time0' if dataDict['I'] == 0 else 'Time1'
-                alt_key = 'Alt0' if dataDict['I'] == 0 else 'Alt1'
-                altitude_data[key].append(t)
-                altitude_data[alt_key].append(msg.Alt)
-        elif msg_type == "GPA":
-            GPA_data['Time'].append(t)
-            GPA_data['HAcc'].append(dataDict['HAcc'])
-            GPA_data['SAcc'].append(dataDict['SAcc'])
-            GPA_data['VAcc'].append(dataDict['VAcc'])
-        elif msg_type == "VIBE":
-            VIBE_data['Time'].append(t)
-            VIBE_data['VibeX'].append(dataDict['VibeX'])
-            VIBE_data['VibeY'].append(dataDict['VibeY'])
-            VIBE_data['VibeZ'].append(dataDict['VibeZ'])
-            VIBE_data['Clip'].append(dataDict['Clip'])
-        elif msg_type == "ESC" and dataDict['Instance'] in ESC_data:
-            instance = dataDict['Instance']
-            ESC_data[instance]['Time'].append(t)
-            ESC_data[instance]['RPM'].append(msg.RPM)
-            ESC_data[instance]['RawRPM'].append(msg.RawRPM)
-            ESC_data[instance]['Voltage'].append(msg.Volt)
-            ESC_data[instance]['Current'].append(msg.Curr)
-            ESC_data[instance]['Temp'].append(msg.Temp)
-        elif msg_type == "BAT":
-            BAT_data['Time'].append(t)
-            BAT_data['Volt'].append(msg.Volt)
-            BAT_data['Curr'].append(msg.Curr)
-            BAT_data['Temp'].append(msg.Temp)
-        elif msg_type == "RCIN":
-            RCIN_data['Time'].append(t)
-            RCIN_data['C1'].append(msg.C1)
-            RCIN_data['C2'].append(msg.C2)
-            RCIN_data['C3'].append(msg.C3)
-            RCIN_data['C4'].append(msg.C4)
-        elif msg_type == "RCOU":
-            RCOU_data['Time'].append(t)
-            RCOU_data['C1'].append(msg.C1)
-            RCOU_data['C2'].append(msg.C2)
-            RCOU_data['C3'].append(msg.C3)
-            RCOU_data['C4'].append(msg.C4)
-
-    return attitude_data, RATE_data, altitude_data, ESC_data, BAT_data, GPA_data, VIBE_data, RCIN_data, RCOU_data, XKF4_data
-
-def generate_plots(attitude_data, RATE_data, altitude_data, ESC_data, BAT_data, GPA_data, VIBE_data, RCIN_data, RCOU_data, XKF4_data, plot_dir):
-    plot_files = {}
-    if os.path.exists(plot_dir):
-        shutil.rmtree(plot_dir)
-    os.makedirs(plot_dir)
-
-    # Attitude Plot
-    plt.figure(figsize=(12, 12))
-    plt.subplot(3, 1, 1)
-    plt.plot(attitude_data['Time'], attitude_data['Roll'], label='Roll', color='red')
-    plt.plot(attitude_data['Time'], attitude_data['DesRoll'], label='DesRoll', color='black', linestyle='--')
-    plt.xlabel("Time (s)")
-    plt.ylabel("Roll (Degrees)")
-    plt.title("Roll and DesRoll vs Time")
-    plt.legend()
-    plt.grid()
-
-    plt.subplot(3, 1, 2)
-    plt.plot(attitude_data['Time'], attitude_data['Pitch'], label='Pitch', color='green')
-    plt.plot(attitude_data['Time'], attitude_data['DesPitch'], label='DesPitch', color='blue', linestyle='--')
-    plt.xlabel("Time (s)")
-    plt.ylabel("Pitch (Degrees)")
-    plt.title("Pitch and DesPitch vs Time")
-    plt.legend()
-    plt.grid()
-
-    plt.subplot(3, 1, 3)
-    plt.plot(attitude_data['Time'], attitude_data['Yaw'], label='Yaw', color='orange')
-    plt.plot(attitude_data['Time'], attitude_data['DesYaw'], label='DesYaw', color='black', linestyle='--')
-    plt.xlabel("Time (s)")
-    plt.ylabel("Yaw (Degrees)")
-    plt.title("Yaw and DesYaw vs Time")
-    plt.legend()
-    plt.grid()
-
-    plt.tight_layout()
-    plot_files['attitude'] = os.path.join(plot_dir, 'attitude.png')
-    plt.savefig(plot_files['attitude'])
-    plt.close()
-
-    # Rate Plot
-    plt.figure(figsize=(12, 12))
-    plt.subplot(3, 1, 1)
-    plt.plot(RATE_data['Time'], RATE_data['R'], label='R', color='red')
-    plt.plot(RATE_data['Time'], RATE_data['RDes'], label='RDes', color='purple', linestyle='--')
-    plt.xlabel("Time (s)")
-    plt.ylabel("R (Degrees/s)")
-    plt.title("R and RDes vs Time")
-    plt.legend()
-    plt.grid()
-
-    plt.subplot(3, 1, 2)
-    plt.plot(RATE_data['Time'], RATE_data['P'], label='P', color='green')
-    plt.plot(RATE_data['Time'], RATE_data['PDes'], label='PDes', color='blue', linestyle='--')
-    plt.xlabel("Time (s)")
-    plt.ylabel("P (Degrees/s)")
-    plt.title("P and PDes vs Time")
-    plt.legend()
-    plt.grid()
-
-    plt.subplot(3, 1, 3)
-    plt.plot(RATE_data['Time'], RATE_data['Y'], label='Y', color='orange')
-    plt.plot(RATE_data['Time'], RATE_data['YDes'], label='YDes', color='black', linestyle='--')
-    plt.xlabel("Time (s)")
-    plt.ylabel("Y (Degrees/s)")
-    plt.title("Y and YDes vs Time")
-    plt.legend()
-    plt.grid()
-
-    plt.tight_layout()
-    plot_files['rate'] = os.path.join(plot_dir, 'rate.png')
-    plt.savefig(plot_files['rate'])
-    plt.close()
-
-    # Altitude Plot
-    plt.figure(figsize=(12, 10))
-    if altitude_data['Time0'] or altitude_data['Time1']:
-        plt.plot(altitude_data['Time0'], altitude_data['Alt0'], label='Altitude0', color='black')
-        plt.plot(altitude_data['Time1'], altitude_data['Alt1'], label='Altitude1', color='purple')
-        plt.xlabel("Time (s)")
-        plt.ylabel("Altitude (m)")
-        plt.title("Altitude vs Time")
-        plt.legend()
-        plt.grid()
-    plt.tight_layout()
-    plot_files['altitude'] = os.path.join(plot_dir, 'altitude.png')
-    plt.savefig(plot_files['altitude'])
-    plt.close()
-
-    # ESC Plots
-    for instance, data in ESC_data.items():
-        plt.figure(figsize=(12, 12))
-        keys = ['RPM', 'RawRPM', 'Voltage', 'Current', 'Temp']
-        for i, key in enumerate(keys, start=1):
-            if data['Time']:
-                plt.subplot(len(keys), 1, i)
-                plt.plot(data['Time'], data[key], label=key, color='C' + str(i))
-                plt.xlabel("Time (s)")
-                plt.ylabel(key)
-                plt.title(f"ESC{instance} {key} vs Time")
-                plt.legend()
-                plt.grid()
-        plt.tight_layout()
-        plot_files[f'esc_{instance}'] = os.path.join(plot_dir, f'esc_{instance}.png')
-        plt.savefig(plot_files[f'esc_{instance}'])
-        plt.close()
-
-    # Battery Plot
-    if BAT_data['Time']:
-        plt.figure(figsize=(10, 8))
-        plt.subplot(3, 1, 1)
-        plt.plot(BAT_data['Time'], BAT_data['Volt'], label='Voltage', color='blue')
-        plt.xlabel("Time (s)")
-        plt.ylabel("Voltage (V)")
-        plt.title("Battery Voltage vs Time")
-        plt.legend()
-        plt.grid()
-        plt.subplot(3, 1, 2)
-        plt.plot(BAT_data['Time'], BAT_data['Curr'], label='Current', color='green')
-        plt.xlabel("Time (s)")
-        plt.ylabel("Current (A)")
-        plt.title("Battery Current vs Time")
-        plt.legend()
-        plt.grid()
-        plt.subplot(3, 1, 3)
-        plt.plot(BAT_data['Time'], BAT_data['Temp'], label='Temperature', color='red')
-        plt.xlabel("Time (s)")
-        plt.ylabel("Temperature (°C)")
-        plt.title("Battery Temperature vs Time")
-        plt.legend()
-        plt.grid()
-        plt.tight_layout()
-        plot_files['battery'] = os.path.join(plot_dir, 'battery.png')
-        plt.savefig(plot_files['battery'])
-        plt.close()
-
-    # GPA Plot
-    if GPA_data['Time']:
-        plt.figure(figsize=(10, 6))
-        plt.plot(GPA_data['Time'], GPA_data['HAcc'], label='HAcc', color='blue')
-        plt.plot(GPA_data['Time'], GPA_data['SAcc'], label='SAcc', color='green')
-        plt.plot(GPA_data['Time'], GPA_data['VAcc'], label='VAcc', color='red')
-        plt.xlabel("Time (s)")
-        plt.ylabel("Accuracy")
-        plt.title("GPA Data vs Time")
-        plt.legend()
-        plt.grid()
-        plt.tight_layout()
-        plot_files['gpa'] = os.path.join(plot_dir, 'gpa.png')
-        plt.savefig(plot_files['gpa'])
-        plt.close()
-
-    # VIBE Plot
-    if VIBE_data['Time']:
-        plt.figure(figsize=(10, 6))
-        plt.plot(VIBE_data['Time'], VIBE_data['VibeX'], label='VibeX', color='blue')
-        plt.plot(VIBE_data['Time'], VIBE_data['VibeY'], label='VibeY', color='green')
-        plt.plot(VIBE_data['Time'], VIBE_data['VibeZ'], label='VibeZ', color='red')
-        plt.plot(VIBE_data['Time'], VIBE_data['Clip'], label='Clip', color='purple')
-        plt.xlabel("Time (s)")
-        plt.ylabel("Vibration")
-        plt.title("VIBE Data vs Time")
-        plt.legend()
-        plt.grid()
-        plt.tight_layout()
-        plot_files['vibe'] = os.path.join(plot_dir, 'vibe.png')
-        plt.savefig(plot_files['vibe'])
-        plt.close()
-
-    # RCIN Plot
-    if RCIN_data['Time']:
-        plt.figure(figsize=(10, 6))
-        for i in range(1, 5):
-            plt.plot(RCIN_data['Time'], RCIN_data[f'C{i}'], label=f'C{i}')
-        plt.xlabel("Time (s)")
-        plt.ylabel("RCIN Channels")
-        plt.title("RCIN Data vs Time")
-        plt.legend()
-        plt.grid()
-        plt.tight_layout()
-        plot_files['rcin'] = os.path.join(plot_dir, 'rcin.png')
-        plt.savefig(plot_files['rcin'])
-        plt.close()
-
-    # RCOU Plot
-    if RCOU_data['Time']:
-        plt.figure(figsize=(10, 6))
-        for i in range(1, 5):
-            plt.plot(RCOU_data['Time'], RCOU_data[f'C{i}'], label=f'C{i}')
-        plt.xlabel("Time (s)")
-        plt.ylabel("RCOU Channels")
-        plt.title("RCOU Data vs Time")
-        plt.legend()
-        plt.grid()
-        plt.tight_layout()
-        plot_files['rcou'] = os.path.join(plot_dir, 'rcou.png')
-        plt.savefig(plot_files['rcou'])
-        plt.close()
-
-    # XKF4 Plot
-    if XKF4_data['Time']:
-        plt.figure(figsize=(10, 6))
-        keys = ['SV', 'SP', 'SH', 'SM', 'SVT']
-        for key in keys:
-            plt.plot(XKF4_data['Time'], XKF4_data[key], label=key)
-        plt.xlabel("Time (s)")
-        plt.ylabel("XKF4 Values")
-        plt.title("XKF4 Data vs Time")
-        plt.legend()
-        plt.grid()
-        plt.tight_layout()
-        plot_files['xkf4'] = os.path.join(plot_dir, 'xkf4.png')
-        plt.savefig(plot_files['xkf4'])
-        plt.close()
-
-    return plot_files
-def anonymize_gps_log(input_path, output_path):
-    with open(input_path, 'r') as f:
-        lines = f.readlines()
-
-    output_lines = []
-
-    # Confirmed field index mapping from your log
-    field_indices = {
-        "GPS":   {"Lat": 7, "Lng": 8, "Alt": 9},
-        "AHR2":  {"Lat": 6, "Lng": 7},
-        "EAHR":  {"Lat": 5, "Lng": 6},  # assumed
-        "POS":   {"Lat": 2, "Lng": 3},  # ✅ corrected
-        "TERR":  {"Lat": 3, "Lng": 4},  # ✅ corrected
-        "ORGN":  {"Lat": 3, "Lng": 4}
-    }
-
-    for line in lines:
-        line_stripped = line.strip()
-        for msg_type, fields in field_indices.items():
-            if line_stripped.startswith(msg_type):
-                parts = line_stripped.split(',')
+def touch_thumbnail_claims():
+    # Heartbeat of this process's extractions, from worker_maintenance
+    with thumbnail_claims_lock:
+        claims = list(thumbnail_claims)
+    for pending in claims:
+        try:
+            os.utime(pending)
+        except FileNotFoundError:
+            pass
+
+def request_thumbnails(video_path):
+    # (status, key, index): 'ready' with the thumbnail index, 'pending' while a worker
+    # extracts them (queued here if nobody has yet), 'failed', or 'unavailable' if
+    # ffmpeg isn't installed or the video is missing
+    if not videoindex.thumbnails_available() or not os.path.isfile(video_path):
+        return 'unavailable', None, None
+    key = thumbnail_key(video_path)
+    out_dir = os.path.join(app.config['THUMBNAIL_FOLDER'], key)
+    index = videoindex.read_thumbnail_index(out_dir)
+    if index is not None:
+        os.utime(out_dir)  # mark as recently used for LRU eviction
+        return 'ready', key, index
+    failure = read_thumbnail_failure(out_dir)
+    if failure and (failure['attempts'] >= app.config['THUMBNAIL_MAX_ATTEMPTS'] or
+                    time.time() - failure['failed_at'] < app.config['THUMBNAIL_RETRY_SECONDS']):
+        return 'failed', key, None
+    if claim_thumbnails(out_dir):
+        video_executor.submit(build_thumbnails, video_path, key)
+    return 'pending', key, None
+
+# Background log processing. Uploads enqueue a job row in SQLite and hand its id to a
+# local thread pool; the row is the source of truth, so queued or interrupted jobs are
+# picked up again after a restart, by any server process (see "Worker processes").
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+job_executor = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'], thread_name_prefix='log-job')
+local_jobs = set()  # ids submitted to this process's job_executor and not finished
+local_jobs_lock = threading.Lock()
+
+JOB_PROGRESS_COLUMNS = ['stage', 'bytes_done', 'bytes_total', 'plots_done', 'plots_total']
+
+class JobProgress:
+    # Per-job progress, written to the job's row at most every `interval` seconds so
+    # any request (or worker process) can report it
+    def __init__(self, job_id, interval=0.5):
+        self.job_id = job_id
+        self.interval = interval
+        self.last_write = 0.0
+        self.values = {}
+
+    def update(self, force=False, **values):
+        self.values.update(values)
+        now = time.monotonic()
+        if not force and now - self.last_write < self.interval:
+            return
+        self.last_write = now
+        assignments = ', '.join(f'{column} = ?' for column in self.values)
+        with db_connection() as conn:
+            conn.execute(f'UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ?',
+                         (*self.values.values(), datetime.utcnow(), self.job_id))
+            conn.commit()
+
+    def parse_callback(self, bytes_done, bytes_total):
+        self.update(bytes_done=bytes_done, bytes_total=bytes_total)
+
+    def plot_callback(self, plots_done, plots_total):
+        self.update(plots_done=plots_done, plots_total=plots_total)
+
+def set_job_status(job_id, status, error=None):
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute('UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?',
+                  (status, error, datetime.utcnow(), job_id))
+        conn.commit()
+
+def run_job(job_id):
+    with db_connection() as conn:
+        c = conn.cursor()
+        # Claim the job atomically so it is never processed twice
+        c.execute('''UPDATE jobs SET status = 'running', worker = ?, updated_at = ?
+                     WHERE status = 'queued' AND id = ?''', (current_worker(), datetime.utcnow(), job_id))
+        conn.commit()
+        if c.rowcount != 1:
+            return
+        c.execute('''SELECT s.id, s.log_file, s.messages, j.created_at, j.timings
+                     FROM jobs j JOIN sessions s ON s.id = j.session_id WHERE j.id = ?''', (job_id,))
+        session_id, log_file, messages, created_at, upload_timings = c.fetchone()
+    message_types = session_message_types(messages)
+    # The breakdown starts with the upload's stages, recorded when the job was queued
+    timings = StageTimings(json.loads(upload_timings) if upload_timings else None)
+    job_stages = len(timings.stages)
+    timings.add('queue', (datetime.utcnow() - datetime.fromisoformat(str(created_at))).total_seconds())
+    progress = JobProgress(job_id)
+    status, error = 'done', None
+    start = time.perf_counter()
+    with profiler.profile(f'job-{job_id}') if profiler else nullcontext():
+        try:
+            progress.update(force=True, stage='parsing', bytes_total=os.path.getsize(log_file))
+            with timings.stage('parse'):
+                data = load_parsed_log(log_file, message_types, progress_callback=progress.parse_callback,
+                                       timings=timings)
+            with timings.stage('summary'):
+                summary = compute_flight_summary(data)
+            with timings.stage('db.summary'):
+                store_flight_summary(session_id, summary)
+            with timings.stage('analytics'):
+                analytics = compute_flight_analytics(data)
+            with timings.stage('db.analytics'):
+                store_flight_analytics(session_id, analytics)
+            progress.update(force=True, stage='plotting')
+            with timings.stage('plots'):
+                ensure_plots(log_file, message_types, progress_callback=progress.plot_callback, timings=timings)
+            progress.update(force=True)
+        except Exception as e:
+            app.logger.exception("Job %s failed", job_id)
+            status, error = 'failed', str(e)
+    timings.add('job', time.perf_counter() - start)
+    record_job_timings(job_id, status, timings, job_stages)
+    set_job_status(job_id, status, error)
+
+def record_job_timings(job_id, status, timings, job_stages):
+    # Store the breakdown on the job row, log it as one JSON line and add the stages this
+    # job ran (upload stages were counted when the upload finished) to /metrics
+    stages = timings.as_list()
+    with db_connection() as conn:
+        conn.execute('UPDATE jobs SET timings = ? WHERE id = ?', (json.dumps(stages), job_id))
+        conn.commit()
+    observe_stages(stages[job_stages:])
+    job_duration.observe(timings.total('job'), status=status)
+    app.logger.info("Job timings %s", json.dumps({'job_id': job_id, 'status': status, 'stages': stages}))
+
+def enqueue_job(session_id, user_id, timings=None):
+    now = datetime.utcnow()
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute('''INSERT INTO jobs (session_id, user_id, status, created_at, updated_at, timings, worker)
+                     VALUES (?, ?, 'queued', ?, ?, ?, ?)''',
+                  (session_id, user_id, now, now, json.dumps(timings.as_list()) if timings else None,
+                   current_worker()))
+        conn.commit()
+        job_id = c.lastrowid
+    submit_job(job_id)
+    return job_id
+
+def submit_job(job_id):
+    with local_jobs_lock:
+        if job_id in local_jobs:
+            return
+        local_jobs.add(job_id)
+    job_executor.submit(run_local_job, job_id)
+
+def run_local_job(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        with local_jobs_lock:
+            local_jobs.discard(job_id)
+
+# Worker processes. Under gunicorn (gunicorn.conf.py) several processes serve the app,
+# each with its own job, video and fleet threads, so everything they share lives in
+# SQLite or on disk. Each process registers in the workers table on its first request,
+# and a maintenance thread then heartbeats every WORKER_HEARTBEAT_SECONDS, writes the
+# process's metrics snapshot and recovers jobs. A job's row names the worker holding
+# it; a job whose worker died (no heartbeat for WORKER_TIMEOUT_SECONDS, or its pid is
+# gone on this host, so a restarted server resumes at once) is re-queued and run here,
+# and a job left queued for WORKER_TIMEOUT_SECONDS behind a busy worker's backlog is
+# taken over by whichever worker claims it first.
+app.config['WORKER_HEARTBEAT_SECONDS'] = float(os.environ.get('WORKER_HEARTBEAT_SECONDS', 10))
+app.config['WORKER_TIMEOUT_SECONDS'] = float(os.environ.get('WORKER_TIMEOUT_SECONDS', 60))
+WORKER_RETENTION = timedelta(days=1)  # rows of workers gone this long are deleted
+worker_state = {'pid': None, 'id': None}
+worker_lock = threading.Lock()
+
+def current_worker():
+    # This process's worker id, registering the process on first use (and again in a
+    # forked child, which inherits the parent's state but none of its threads)
+    with worker_lock:
+        if worker_state['pid'] == os.getpid():
+            return worker_state['id']
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{os.urandom(4).hex()}"
+        now = datetime.utcnow()
+        with db_connection() as conn:
+            conn.execute('INSERT INTO workers (id, host, pid, started_at, heartbeat_at) VALUES (?, ?, ?, ?, ?)',
+                         (worker_id, socket.gethostname(), os.getpid(), now, now))
+            conn.commit()
+        worker_state.update(pid=os.getpid(), id=worker_id)
+    threading.Thread(target=worker_maintenance, args=(worker_id,), name='worker-maintenance', daemon=True).start()
+    return worker_id
+
+def worker_alive(host, pid, heartbeat_at, cutoff):
+    if host is None or datetime.fromisoformat(str(heartbeat_at)) < cutoff:
+        return False
+    if host == socket.gethostname() and pid != os.getpid():
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass  # alive, under another user
+    return True
+
+def recover_jobs():
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=app.config['WORKER_TIMEOUT_SECONDS'])
+    job_ids = []
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute('''SELECT j.id, j.status, j.updated_at, w.host, w.pid, w.heartbeat_at
+                     FROM jobs j LEFT JOIN workers w ON w.id = j.worker
+                     WHERE j.status IN ('queued', 'running') ORDER BY j.id''')
+        for job_id, status, updated_at, host, pid, heartbeat_at in c.fetchall():
+            if not worker_alive(host, pid, heartbeat_at, cutoff):
+                if status == 'running':
+                    app.logger.warning("Re-queueing job %s: its worker is gone", job_id)
+                    c.execute('''UPDATE jobs SET status = 'queued', updated_at = ?
+                                 WHERE status = 'running' AND id = ?''', (now, job_id))
+                job_ids.append(job_id)
+            elif status == 'queued' and datetime.fromisoformat(str(updated_at)) < cutoff:
+                job_ids.append(job_id)
+        conn.commit()
+    for job_id in job_ids:
+        submit_job(job_id)
+
+def worker_maintenance(worker_id):
+    while True:
+        try:
+            now = datetime.utcnow()
+            with db_connection() as conn:
+                conn.execute('UPDATE workers SET heartbeat_at = ? WHERE id = ?', (now, worker_id))
+                conn.execute('DELETE FROM workers WHERE heartbeat_at < ?', (now - WORKER_RETENTION,))
+                conn.commit()
+            metrics.write_snapshot()
+            recover_jobs()
+            touch_thumbnail_claims()
+            expire_chunked_uploads()
+        except Exception:
+            app.logger.exception("Worker maintenance failed")
+        time.sleep(app.config['WORKER_HEARTBEAT_SECONDS'])
+
+@app.before_request
+def start_worker():
+    # Deferred to the first request so the dev server's reloader process never runs jobs
+    current_worker()
+
+atexit.register(metrics.write_snapshot)
+
+def get_session_job(session_id):
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute('SELECT id, status, error FROM jobs WHERE session_id = ? ORDER BY id DESC LIMIT 1', (session_id,))
+        return c.fetchone()
+
+# Seconds a client is asked to wait (Retry-After) while a session's evicted parse cache
+# is rebuilt by a job
+PROCESSING_RETRY_SECONDS = 5
+
+def reprocess_session(session_id, user_id):
+    # Response for a request that needs the session's parse cache when it has been
+    # evicted: the log is decoded again by a job (unless one is already under way),
+    # never inside the request, and the client retries once it has run
+    job = get_session_job(session_id)
+    if job and job[1] == 'failed':
+        return f"Log processing failed: {job[2]}", 500
+    if not job or job[1] == 'done':
+        enqueue_job(session_id, user_id)
+    return Response("Log is being processed, retry shortly", 503,
+                    headers={'Retry-After': str(PROCESSING_RETRY_SECONDS)})
+
+# Chunked, resumable uploads. The browser sends a log in UPLOAD_CHUNK_BYTES pieces;
+# each piece is streamed straight from the request body onto a partial file, hashed,
+# and for .BIN logs indexed by an incremental DataFlash scan, so indexing overlaps the
+# transfer. The log is decoded by its job, never in a chunk's request: committing the
+# upload hands the finished index over to the job (see uploaded_indexes). A partial
+# upload survives a dropped connection or a restart: the client asks how many bytes
+# arrived and continues from there. Chunks may reach different server processes; each
+# process keeps its own hash and index of the upload and, holding the upload's file
+# lock, first catches up with the bytes others appended (see sync). Uploads that
+# receive nothing for CHUNKED_UPLOAD_TTL_SECONDS are abandoned and deleted, and logs
+# larger than MAX_UPLOAD_BYTES are refused up front.
+app.config['PARTIAL_UPLOAD_FOLDER'] = os.path.join(UPLOAD_FOLDER, 'partial')
+app.config['CHUNKED_UPLOAD_TTL_SECONDS'] = float(os.environ.get('CHUNKED_UPLOAD_TTL_SECONDS', 24 * 3600))
+app.config['MAX_UPLOAD_BYTES'] = int(os.environ.get('MAX_UPLOAD_BYTES', 16 * 1024 ** 3))
+os.makedirs(app.config['PARTIAL_UPLOAD_FOLDER'], exist_ok=True)
+UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+UPLOAD_STREAM_BUFFER = 1024 * 1024
+chunked_uploads = {}
+chunked_uploads_lock = threading.Lock()
+
+class ChunkedUpload:
+    def __init__(self, upload_id, user_id, filename, size):
+        self.id = upload_id
+        self.user_id = user_id
+        self.filename = filename
+        self.size = size
+        folder = app.config['PARTIAL_UPLOAD_FOLDER']
+        self.path = os.path.join(folder, f'{upload_id}.part')
+        self.meta_path = os.path.join(folder, f'{upload_id}.json')
+        self.lock_path = os.path.join(folder, f'{upload_id}.lock')
+        self.lock = threading.Lock()
+        self.sha = hashlib.sha256()
+        self.received = 0
+        self.digest = None
+        self.scanner = None
+        self.opened = False
+
+    def open(self):
+        # Attach to the partial file (on first sync); bytes received before a restart
+        # (or by another process) are then hashed and indexed once
+        open(self.path, 'ab').close()
+        if self.filename.endswith('.BIN') and PARSE_ENGINE == 'dataflash':
+            self.scanner = DataFlashLog(self.path, incremental=True)
+        self.opened = True
+
+    def close(self):
+        if self.scanner:
+            self.scanner.close()
+            self.scanner = None
+
+    @contextmanager
+    def locked(self):
+        # Exclusive access across threads and server processes, synced with the partial
+        # file; yields False if the upload has been committed meanwhile
+        with self.lock, file_lock(self.lock_path):
+            yield self.sync()
+
+    def sync(self):
+        # Hash and index the bytes appended since this process last looked
+        if not os.path.exists(self.meta_path):
+            return False
+        if not self.opened:
+            self.open()
+        with open(self.path, 'rb') as f:
+            f.seek(self.received)
+            for chunk in iter(lambda: f.read(UPLOAD_STREAM_BUFFER), b''):
+                self.sha.update(chunk)
+                self.received += len(chunk)
+        if self.scanner:
+            self.scanner.feed()
+        if self.received == self.size and self.digest is None:
+            self.complete()
+        return True
+
+    def append(self, stream):
+        with open(self.path, 'ab') as f:
+            for chunk in iter(lambda: stream.read(UPLOAD_STREAM_BUFFER), b''):
+                if self.received + len(chunk) > self.size:
+                    raise ValueError("Upload is larger than announced")
+                f.write(chunk)
+                self.sha.update(chunk)
+                self.received += len(chunk)
+        if self.scanner:
+            self.scanner.feed()
+        if self.received == self.size:
+            self.complete()
+
+    def complete(self):
+        self.digest = self.sha.hexdigest()
+        if self.scanner:
+            self.scanner.finish()
+
+    def commit(self, path):
+        # Move the finished log into place and forget the partial upload (hold locked()).
+        # The index stays valid across the rename and goes to the log's job.
+        os.replace(self.path, path)
+        remember_digest(path, self.digest)
+        if self.scanner:
+            hand_over_index(self.digest, self.scanner)
+            self.scanner = None
+        os.remove(self.meta_path)
+        os.remove(self.lock_path)
+        with chunked_uploads_lock:
+            chunked_uploads.pop(self.id, None)
+
+    def state(self):
+        return {'id': self.id, 'filename': self.filename, 'size': self.size, 'received': self.received,
+                'complete': self.digest is not None, 'chunk_size': UPLOAD_CHUNK_BYTES}
+
+def create_chunked_upload(user_id, filename, size):
+    upload = ChunkedUpload(os.urandom(16).hex(), user_id, filename, size)
+    with open(upload.meta_path, 'w') as f:
+        json.dump({'user_id': user_id, 'filename': filename, 'size': size}, f)
+    with upload.locked():
+        pass  # creates the partial file (an empty log is complete straight away)
+    with chunked_uploads_lock:
+        chunked_uploads[upload.id] = upload
+    return upload
+
+def get_chunked_upload(upload_id):
+    # The upload synced with its partial file, or None if unknown, committed or expired.
+    # A partial file new to this process is hashed under the upload's own lock (in
+    # sync), not the registry lock, so other uploads aren't held up meanwhile.
+    if not re.fullmatch(r'[0-9a-f]{32}', upload_id):
+        return None
+    with chunked_uploads_lock:
+        upload = chunked_uploads.get(upload_id)
+        if upload is None:
+            # Not seen by this process since it started; pick it up from its metadata file
+            try:
+                with open(os.path.join(app.config['PARTIAL_UPLOAD_FOLDER'], f'{upload_id}.json')) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                return None
+            upload = ChunkedUpload(upload_id, meta['user_id'], meta['filename'], meta['size'])
+            chunked_uploads[upload_id] = upload
+    with upload.locked() as current:
+        if current:
+            return upload
+        upload.close()
+    with chunked_uploads_lock:
+        chunked_uploads.pop(upload_id, None)
+    return None
+
+def expire_chunked_uploads():
+    # Delete partial uploads whose files have gone untouched for CHUNKED_UPLOAD_TTL_SECONDS,
+    # and forget (closing their partial file index) uploads another process expired.
+    # Runs in every server process from worker_maintenance.
+    folder = app.config['PARTIAL_UPLOAD_FOLDER']
+    cutoff = time.time() - app.config['CHUNKED_UPLOAD_TTL_SECONDS']
+    upload_ids = {name.rsplit('.', 1)[0] for name in os.listdir(folder)
+                  if name.endswith(('.part', '.json', '.lock'))}
+
+    def last_activity(upload_id, exts=('part', 'json', 'lock')):
+        # Appends touch the .part file; an upload without any files left counts as stale
+        times = []
+        for ext in exts:
+            try:
+                times.append(os.path.getmtime(os.path.join(folder, f'{upload_id}.{ext}')))
+            except FileNotFoundError:
+                pass
+        return max(times, default=0)
+
+    for upload_id in upload_ids:
+        if last_activity(upload_id) >= cutoff:
+            continue
+        with chunked_uploads_lock:
+            upload = chunked_uploads.get(upload_id)
+        lock_path = os.path.join(folder, f'{upload_id}.lock')
+        with upload.lock if upload else nullcontext(), file_lock(lock_path):
+            if last_activity(upload_id, ('part', 'json')) >= cutoff:
+                continue  # a chunk arrived meanwhile (taking the lock may have created .lock)
+            for ext in ('part', 'json', 'lock'):
                 try:
-                    for field_name, index in fields.items():
-                        if len(parts) > index:
-                            parts[index] = "0"
-                    line = ','.join(parts) + '\n'
-                except IndexError:
+                    os.remove(os.path.join(folder, f'{upload_id}.{ext}'))
+                except FileNotFoundError:
                     pass
-                break  # don't process the same line more than once
-        output_lines.append(line)
+            if upload:
+                upload.close()
+        app.logger.info("Expired chunked upload %s", upload_id)
+
+    with chunked_uploads_lock:
+        uploads = list(chunked_uploads.values())
+    for upload in uploads:
+        with upload.lock:
+            if os.path.exists(upload.meta_path):
+                continue
+            upload.close()
+        with chunked_uploads_lock:
+            if chunked_uploads.get(upload.id) is upload:
+                del chunked_uploads[upload.id]
 
-    with open(output_path, 'w') as f:
-        f.writelines(output_lines)
-    
 # Routes
 @app.route('/login')
 def login():
@@ -457,7 +1408,7 @@ def authorize():
     github_id = str(user_info['id'])
     username = user_info['login']
 
-    with sqlite3.connect(DATABASE) as conn:
+    with db_connection() as conn:
         c = conn.cursor()
         c.execute('SELECT id FROM users WHERE github_id = ?', (github_id,))
         user = c.fetchone()
@@ -467,6 +1418,8 @@ def authorize():
             c.execute('SELECT id FROM users WHERE github_id = ?', (github_id,))
             user = c.fetchone()
         user_id = user[0]
+        with user_cache_lock:
+            user_cache.pop(str(user_id), None)
         login_user(User(user_id, github_id, username))
     return redirect(url_for('upload_file'))
 
@@ -494,40 +1447,74 @@ def logout_confirmation():
 @app.route('/', methods=['GET', 'POST'])
 @login_required
 def upload_file():
-    global progress_tracker
-    progress_tracker = {'progress': 0, 'total_steps': 5}  # Reset progress
-
     if request.method == 'POST':
         uploaded_files = {'log': None, 'markdown': None, 'videos': []}
-        markdown_content = None
         anonymized_file_path = None
+        timings = StageTimings()
+
+        # The form's message checkboxes (marked by message_filter) pick the message types
+        # to decode and plot; stored as NULL when all of them are chosen
+        messages = None
+        if 'message_filter' in request.form:
+            try:
+                message_types = select_message_types(request.form.getlist('messages'))
+            except ValueError as e:
+                return str(e), 400
+            if message_types != PLOT_MESSAGE_TYPES:
+                messages = ','.join(message_types)
 
-        # Step 1: Handle log file
-        if 'file' in request.files:
+        # Step 1: Handle log file, either sent in chunks beforehand or with the form
+        log_filename = None
+        if request.form.get('log_upload_id'):
+            upload = get_chunked_upload(request.form['log_upload_id'])
+            if upload is None or upload.user_id != current_user.id or upload.digest is None:
+                return "Log upload incomplete", 400
+            log_filename = upload.filename
+            log_filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{current_user.id}_{log_filename}")
+            with timings.stage('upload.log'), upload.locked() as current:
+                if not current:
+                    return "Log upload incomplete", 400  # committed by a concurrent request
+                upload.commit(log_filepath)
+        elif 'file' in request.files:
             log_file = request.files['file']
             if log_file.filename.endswith(('.BIN', '.log')):  # Accept both .BIN and .log files
-                log_filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{current_user.id}_{log_file.filename}")
-                log_file.save(log_filepath)
-                uploaded_files['log'] = log_filepath
-                progress_tracker['progress'] += 1  # Increment progress
-
-                # Anonymize the log file if requested
-                if 'anonymize' in request.form and log_file.filename.endswith('.log'):
-                    output_file_name = request.form.get('output_file_name', 'anonymized.log')
-                    anonymized_file_path = os.path.join(app.config['UPLOAD_FOLDER'], output_file_name)
-                    anonymize_gps_log(log_filepath, anonymized_file_path)
-                    uploaded_files['log'] = anonymized_file_path  # Replace with anonymized file
+                log_filename = log_file.filename
+                log_filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{current_user.id}_{log_filename}")
+                with timings.stage('upload.log'):
+                    log_file.save(log_filepath)
+        if log_filename:
+            uploaded_files['log'] = log_filepath
+
+            # Anonymize the log file if requested. The copy is named after the user and
+            # the original's digest, so concurrent uploads never write to the same file,
+            # and is written under a temporary name until complete.
+            if 'anonymize' in request.form:
+                extension = os.path.splitext(log_filename)[1]
+                output_file_name = (secure_filename(request.form.get('output_file_name', ''))
+                                    or f'anonymized{extension}')
+                if not output_file_name.endswith(extension):
+                    output_file_name += extension  # the parser picks the format by extension
+                anonymized_file_path = os.path.join(
+                    app.config['UPLOAD_FOLDER'],
+                    f"{current_user.id}_{file_digest(log_filepath)[:16]}_{output_file_name}")
+                tmp_path = f"{anonymized_file_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+                with timings.stage('upload.anonymize'):
+                    try:
+                        anonymize_gps_log(log_filepath, tmp_path)
+                        os.replace(tmp_path, anonymized_file_path)
+                    finally:
+                        if os.path.exists(tmp_path):
+                            os.remove(tmp_path)
+                uploaded_files['log'] = anonymized_file_path  # Replace with anonymized file
 
         # Step 2: Handle markdown file
         if 'markdown' in request.files:
             markdown_file = request.files['markdown']
             if markdown_file.filename.endswith('.md'):
                 markdown_filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{current_user.id}_{markdown_file.filename}")
-                markdown_file.save(markdown_filepath)
+                with timings.stage('upload.markdown'):
+                    markdown_file.save(markdown_filepath)
                 uploaded_files['markdown'] = markdown_filepath
-                with open(markdown_filepath, 'r') as f:
-                    markdown_content = markdown.markdown(f.read(), extensions=['fenced_code', 'tables'])
-                progress_tracker['progress'] += 1  # Increment progress
 
         # Step 3: Handle video files
         if 'videos' in request.files:
@@ -535,83 +1522,446 @@ def upload_file():
             for video_file in video_files:
                 if video_file.filename:
                     video_filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{current_user.id}_{video_file.filename}")
-                    video_file.save(video_filepath)
+                    with timings.stage('upload.video'):
+                        video_file.save(video_filepath)
                     uploaded_files['videos'].append(video_filepath)
-            progress_tracker['progress'] += 1  # Increment progress
 
         # Step 4: Save session to database
-        with sqlite3.connect(DATABASE) as conn:
+        with timings.stage('db.session'), db_connection() as conn:
             c = conn.cursor()
             videos_str = ','.join(uploaded_files['videos']) if uploaded_files['videos'] else None
-            c.execute('''INSERT INTO sessions (user_id, log_file, markdown_file, videos, created_at)
-                         VALUES (?, ?, ?, ?, ?)''',
-                      (current_user.id, uploaded_files['log'], uploaded_files['markdown'], videos_str, datetime.utcnow()))
+            airframe = request.form.get('airframe', '').strip() or None
+            c.execute('''INSERT INTO sessions (user_id, log_file, markdown_file, videos, created_at, airframe, messages)
+                         VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                      (current_user.id, uploaded_files['log'], uploaded_files['markdown'], videos_str, datetime.utcnow(),
+                       airframe, messages))
             conn.commit()
-        progress_tracker['progress'] += 1  # Increment progress
+            session_id = c.lastrowid
 
-        # Step 5: Process log file if present
-        plot_files = {}
+        # Step 5: Queue the log and the videos' thumbnails for background processing
+        for video_path in uploaded_files['videos']:
+            request_thumbnails(video_path)
+        observe_stages(timings.as_list())
         if uploaded_files['log']:
-            data = parse_log(uploaded_files['log'])
-            plot_files = generate_plots(*data, app.config['PLOT_FOLDER'])
-            progress_tracker['progress'] += 1  # Increment progress
+            job_id = enqueue_job(session_id, current_user.id, timings)
+            return redirect(url_for('view_job', job_id=job_id))
 
-        return render_template('results.html', plot_files=plot_files, uploaded_files=uploaded_files, markdown_content=markdown_content)
+        return redirect(url_for('view_session', session_id=session_id))
 
-    # Fetch user sessions
-    with sqlite3.connect(DATABASE) as conn:
+    # Fetch user sessions with their flight summaries (one query on the user/date index)
+    with db_connection() as conn:
         c = conn.cursor()
-        c.execute('SELECT id, log_file, markdown_file, videos, created_at FROM sessions WHERE user_id = ? ORDER BY created_at DESC', (current_user.id,))
+        c.execute(f'''SELECT s.id, s.log_file, s.markdown_file, s.videos, s.created_at, s.airframe, f.session_id,
+                             {', '.join(f'f.{column}' for column in FLIGHT_SUMMARY_COLUMNS)}
+                      FROM sessions s LEFT JOIN flight_summaries f ON f.session_id = s.id
+                      WHERE s.user_id = ? ORDER BY s.created_at DESC''', (current_user.id,))
         sessions = c.fetchall()
         sessions = [{
             'id': s[0],
             'log_file': s[1],
             'markdown_file': s[2],
             'videos': s[3].split(',') if s[3] else [],
-            'created_at': s[4]
+            'created_at': s[4],
+            'airframe': s[5],
+            'summary': dict(zip(FLIGHT_SUMMARY_COLUMNS, s[7:])) if s[6] is not None else None
         } for s in sessions]
-    return render_template('upload.html', sessions=sessions)
+    return render_template('upload.html', sessions=sessions, messages=MESSAGES)
 
 from flask import jsonify
 
-progress_tracker = {'progress': 0, 'total_steps': 5}  # Global variable to track progress
+@app.route('/uploads/chunked', methods=['POST'])
+@login_required
+def start_chunked_upload():
+    # Body: {"filename": ..., "size": ...}; returns the upload's state including its id
+    body = request.get_json(silent=True) or {}
+    filename = os.path.basename(str(body.get('filename', '')))
+    size = body.get('size')
+    if not filename.endswith(('.BIN', '.log')) or not isinstance(size, int) or size < 0:
+        return "Unsupported upload", 400
+    if size > app.config['MAX_UPLOAD_BYTES']:
+        return f"Log is larger than the {app.config['MAX_UPLOAD_BYTES']} byte limit", 413
+    return jsonify(create_chunked_upload(current_user.id, filename, size).state()), 201
+
+@app.route('/uploads/chunked/<upload_id>', methods=['GET', 'PUT'])
+@login_required
+def chunked_upload(upload_id):
+    # GET reports how many bytes arrived; PUT appends the request body (at most
+    # UPLOAD_CHUNK_BYTES) at the Upload-Offset header, which must equal the bytes
+    # received so far (409 otherwise)
+    upload = get_chunked_upload(upload_id)
+    if upload is None or upload.user_id != current_user.id:
+        return "Not Found", 404
+    if request.method == 'PUT':
+        if (request.content_length or 0) > UPLOAD_CHUNK_BYTES:
+            return f"Chunks are limited to {UPLOAD_CHUNK_BYTES} bytes", 413
+        with upload.locked() as current:
+            if not current:
+                return "Not Found", 404
+            if request.headers.get('Upload-Offset', type=int) != upload.received or upload.digest is not None:
+                return jsonify(upload.state()), 409
+            try:
+                upload.append(request.stream)
+            except ValueError as e:
+                return str(e), 400
+    return jsonify(upload.state())
+
+@app.route('/cache/stats', methods=['GET'])
+@login_required
+def get_cache_stats():
+    entries = _cache_entries(app.config['PARSE_CACHE_FOLDER'])
+    counts = metrics.collect()[parse_cache_events.name]
+    stats = {event: counts.get((event,), 0) for event in PARSE_CACHE_EVENTS}
+    stats.update(entries=len(entries), bytes=sum(size for _, size, _ in entries),
+                 max_bytes=app.config['PARSE_CACHE_MAX_BYTES'])
+    return jsonify(stats)
+
+@app.route('/metrics')
+def get_metrics():
+    # Open to scrapers unless METRICS_TOKEN is set, then "Authorization: Bearer <token>"
+    token = app.config['METRICS_TOKEN']
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return "Unauthorized", 401
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
-@app.route('/progress', methods=['GET'])
+@app.route('/fleet/query')
 @login_required
-def get_progress():
-    return jsonify(progress_tracker)
+def query_fleet():
+    # ?where=clip_count>10&where=...&metric=BAT.Volt:range&metric=...&airframe=&since=&last=
+    # over the current user's flights
+    try:
+        filters = [fleet.parse_fleet_filter(text) for text in request.args.getlist('where')]
+        metrics = [fleet.parse_fleet_metric(text) for text in request.args.getlist('metric')]
+    except ValueError as e:
+        return str(e), 400
+    return jsonify(fleet_query(filters, metrics, airframe=request.args.get('airframe'), user_id=current_user.id,
+                               since=request.args.get('since'), last=request.args.get('last', type=int)))
+
+@app.route('/jobs/<int:job_id>')
+@login_required
+def view_job(job_id):
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute('SELECT user_id, session_id FROM jobs WHERE id = ?', (job_id,))
+        job = c.fetchone()
+    if not job or job[0] != current_user.id:
+        return "Unauthorized", 403
+    return render_template('processing.html', job_id=job_id, session_id=job[1])
+
+@app.route('/jobs/<int:job_id>/status')
+@login_required
+def get_job_status(job_id):
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute('SELECT user_id, session_id, status, error, timings FROM jobs WHERE id = ?', (job_id,))
+        job = c.fetchone()
+    if not job or job[0] != current_user.id:
+        return "Unauthorized", 403
+    return jsonify({'id': job_id, 'session_id': job[1], 'status': job[2], 'error': job[3],
+                    'timings': json.loads(job[4]) if job[4] else None})
+
+def read_job_state(job_id):
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute(f"SELECT status, error, {', '.join(JOB_PROGRESS_COLUMNS)} FROM jobs WHERE id = ?", (job_id,))
+        row = c.fetchone()
+    return dict(zip(['status', 'error'] + JOB_PROGRESS_COLUMNS, row)) if row else None
+
+@app.route('/jobs/<int:job_id>/events')
+@login_required
+def stream_job_events(job_id):
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute('SELECT user_id FROM jobs WHERE id = ?', (job_id,))
+        job = c.fetchone()
+    if not job or job[0] != current_user.id:
+        return "Unauthorized", 403
+
+    # Server-Sent Events: push the job's progress whenever its row changes
+    def events():
+        last_state = None
+        while True:
+            state = read_job_state(job_id)
+            if state != last_state:
+                yield f"data: {json.dumps(state)}\n\n"
+                last_state = state
+            if state is None or state['status'] in ('done', 'failed'):
+                return
+            time.sleep(0.5)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/session/<int:session_id>')
 @login_required
 def view_session(session_id):
-    with sqlite3.connect(DATABASE) as conn:
+    with db_connection() as conn:
         c = conn.cursor()
-        c.execute('SELECT user_id, log_file, markdown_file, videos FROM sessions WHERE id = ?', (session_id,))
+        c.execute('SELECT user_id, log_file, markdown_file, videos, messages, video_offset FROM sessions WHERE id = ?',
+                  (session_id,))
         session_data = c.fetchone()
         if not session_data or session_data[0] != current_user.id:
             return "Unauthorized", 403
+        message_types = select_message_types(session_message_types(session_data[4]))
         uploaded_files = {
             'log': session_data[1],
             'markdown': session_data[2],
             'videos': session_data[3].split(',') if session_data[3] else []
         }
+        job = get_session_job(session_id)
+        if job and job[1] in ('queued', 'running'):
+            return redirect(url_for('view_job', job_id=job[0]))
         markdown_content = None
         if uploaded_files['markdown']:
-            with open(uploaded_files['markdown'], 'r') as f:
+            with timed_stage('markdown'), open(uploaded_files['markdown'], 'r') as f:
                 markdown_content = markdown.markdown(f.read(), extensions=['fenced_code', 'tables'])
-        plot_files = {}
-        if uploaded_files['log']:
-            data = parse_log(uploaded_files['log'])
-            plot_files = generate_plots(*data, app.config['PLOT_FOLDER'])
-        return render_template('results.html', plot_files=plot_files, uploaded_files=uploaded_files, markdown_content=markdown_content)
+        plot_id, plots, streams, analytics = None, [], {}, None
+        job_error = job[2] if job and job[1] == 'failed' else None
+        if uploaded_files['log'] and not job_error:
+            # Only the job renders and parses: if the plots, parse cache, summary or
+            # analytics have since been evicted (or predate the feature), process the
+            # log again in the background rather than inside this request
+            plot_id = plot_set_id(file_digest(uploaded_files['log']), message_types)
+            plot_dir = os.path.join(app.config['PLOT_FOLDER'], plot_id)
+            plot_files = read_plot_manifest(plot_dir)
+            _, manifest = cached_series_index(uploaded_files['log'], message_types)
+            c.execute('SELECT 1 FROM flight_summaries WHERE session_id = ?', (session_id,))
+            has_summary = c.fetchone() is not None
+            analytics = read_flight_analytics(session_id)
+            if plot_files is None or manifest is None or not has_summary or analytics is None:
+                return redirect(url_for('view_job', job_id=enqueue_job(session_id, current_user.id)))
+            os.utime(plot_dir)  # mark as recently used for LRU eviction
+            # (key, tab title) in registry order for the figures this log produced
+            plots = [(key, title) for key, title in plot_titles(message_types).items() if key in plot_files]
+            streams = {name: spec['fields'] for name, spec in manifest['streams'].items()
+                       if spec['samples'] and name.split('.')[0] in message_types}
+        return render_template('results.html', session_id=session_id, plot_id=plot_id, plots=plots,
+                               streams=streams, analytics=analytics, uploaded_files=uploaded_files,
+                               video_offset=session_data[5] or 0, export_formats=export_formats(),
+                               markdown_content=markdown_content, job_error=job_error)
+
+@app.route('/session/<int:session_id>/analytics')
+@login_required
+def get_session_analytics(session_id):
+    # compute_flight_analytics output for the session's log, including full spectra
+    with db_connection() as conn:
+        row = conn.execute('SELECT user_id FROM sessions WHERE id = ?', (session_id,)).fetchone()
+    if not row or row[0] != current_user.id:
+        return "Unauthorized", 403
+    analytics = read_flight_analytics(session_id)
+    if analytics is None:
+        return "Not Found", 404
+    return jsonify(analytics)
+
+def export_formats():
+    # (format, label) of the export formats this server can produce, for the session page
+    labels = {'parquet': 'Parquet', 'csv': 'CSV', 'hdf5': 'HDF5'}
+    return [(fmt, labels[fmt]) for fmt in EXPORT_FORMATS if format_available(fmt)]
+
+@app.route('/session/<int:session_id>/export/<fmt>')
+@login_required
+def export_session(session_id, fmt):
+    # The session's decoded messages as a Parquet, CSV (zip) or HDF5 download, streamed
+    # in chunks from the memory-mapped parse cache: ?messages=ATT,RATE (default all of
+    # the session's types). A log evicted from the cache is decoded again by a job.
+    if fmt not in EXPORT_FORMATS:
+        return "Not Found", 404
+    if not format_available(fmt):
+        return f"{fmt} export is not available on this server (needs {EXPORT_FORMATS[fmt][2]})", 501
+    with db_connection() as conn:
+        row = conn.execute('SELECT user_id, log_file, messages FROM sessions WHERE id = ?', (session_id,)).fetchone()
+    if not row or row[0] != current_user.id:
+        return "Unauthorized", 403
+    if not row[1]:
+        return "Not Found", 404
+    session_types = select_message_types(session_message_types(row[2]))
+    requested = request.args.get('messages')
+    message_types = requested.split(',') if requested else session_types
+    if any(name not in session_types for name in message_types):
+        return "Unknown message type", 400
+    message_types = select_message_types(message_types)
+    with timed_stage('export.load'):
+        data = read_parse_cache(file_digest(row[1]), message_types)
+    if data is None:
+        return reprocess_session(session_id, current_user.id)
+    chunks = export_chunks(fmt, ((name, data[name]) for name in message_types), message_types)
+    filename = os.path.splitext(os.path.basename(row[1]))[0] + EXPORT_FORMATS[fmt][1]
+    return Response(chunks, mimetype=EXPORT_FORMATS[fmt][0],
+                    headers={'Content-Disposition': f"attachment; filename*=UTF-8''{quote(filename)}",
+                             'X-Accel-Buffering': 'no'})
+
+# Upper bound on the ?points= resolution a client may request from the series API
+SERIES_MAX_POINTS = 5000
+
+def query_number(name, convert=float, default=None):
+    # Query parameter `name` converted with `convert`; unlike request.args.get(type=...),
+    # a value that doesn't parse (or isn't finite) is a ValueError, not the default
+    text = request.args.get(name)
+    if text is None:
+        return default
+    try:
+        value = convert(text)
+    except ValueError:
+        value = None
+    if value is None or not np.isfinite(value):
+        raise ValueError(f"Invalid {name}: {text!r}")
+    return value
+
+@app.route('/session/<int:session_id>/series/<stream>')
+@login_required
+def get_session_series(session_id, stream):
+    # JSON window of one parsed stream (e.g. ATT, BARO.0, ESC.2) for the interactive chart:
+    # ?fields=Roll,DesRoll&t0=<s>&t1=<s>&points=<buckets>
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute('SELECT user_id, log_file, messages FROM sessions WHERE id = ?', (session_id,))
+        session_data = c.fetchone()
+    if not session_data or session_data[0] != current_user.id:
+        return "Unauthorized", 403
+    message_types = select_message_types(session_message_types(session_data[2]))
+    if not session_data[1] or stream.split('.')[0] not in message_types:
+        return "Not Found", 404
+    entry, manifest = cached_series_index(session_data[1], message_types)
+    if manifest is None:
+        return reprocess_session(session_id, current_user.id)
+    if stream not in manifest['streams']:
+        return "Not Found", 404
+    available = manifest['streams'][stream]['fields']
+    fields = request.args.get('fields')
+    fields = fields.split(',') if fields else available
+    if any(field not in available for field in fields):
+        return "Unknown field", 400
+    try:
+        points = min(max(query_number('points', int, 1000), 1), SERIES_MAX_POINTS)
+        t0, t1 = query_number('t0'), query_number('t1')
+    except ValueError as e:
+        return str(e), 400
+    if t0 is not None and t1 is not None and t0 > t1:
+        return "t0 is after t1", 400
+    try:
+        window = read_series_window(entry, manifest, stream, fields, t0, t1, points)
+    except OSError:
+        # Entry evicted between lookup and read
+        return "Series unavailable, retry", 503
+    return jsonify(window)
+
+def read_session_videos(session_id):
+    # (video paths, offset) of one of the current user's sessions, or None
+    with db_connection() as conn:
+        row = conn.execute('SELECT user_id, videos, video_offset FROM sessions WHERE id = ?', (session_id,)).fetchone()
+    if not row or row[0] != current_user.id:
+        return None
+    return (row[1].split(',') if row[1] else []), row[2] or 0
+
+@app.route('/session/<int:session_id>/videos/<int:index>')
+@login_required
+def get_video_index(session_id, index):
+    # Video URL, sync offset and thumbnail index of one of the session's videos:
+    # {"status": "ready"|"pending"|"failed"|"unavailable", "offset": s, "interval": s,
+    #  "duration": s, "thumbnails": [{"video_time": s, "log_time": s, "url": ...}, ...]}
+    # ?log_time=<s> adds "nearest": the position of the thumbnail closest to that log time
+    session_videos = read_session_videos(session_id)
+    if session_videos is None:
+        return "Unauthorized", 403
+    videos, offset = session_videos
+    if index >= len(videos):
+        return "Not Found", 404
+    status, key, thumbnail_index = request_thumbnails(videos[index])
+    result = {'video': url_for('serve_uploaded_file', filename=os.path.basename(videos[index])),
+              'status': status, 'offset': offset, 'interval': None, 'duration': None, 'thumbnails': []}
+    if status == 'failed':
+        result['error'] = read_thumbnail_error(key)
+    if thumbnail_index is not None:
+        interval = thumbnail_index['interval']
+        result.update(interval=interval, duration=thumbnail_index['duration'])
+        result['thumbnails'] = [{'video_time': i * interval,
+                                 'log_time': videoindex.video_to_log_time(i * interval, offset),
+                                 'url': url_for('serve_thumbnail', key=key, filename=name)}
+                                for i, name in enumerate(thumbnail_index['thumbnails'])]
+        log_time = request.args.get('log_time', type=float)
+        if log_time is not None:
+            result['nearest'] = videoindex.nearest_thumbnail(thumbnail_index,
+                                                             videoindex.log_to_video_time(log_time, offset))
+    return jsonify(result)
+
+@app.route('/session/<int:session_id>/video_offset', methods=['POST'])
+@login_required
+def set_video_offset(session_id):
+    # Body: {"offset": seconds}, where log time = video time + offset
+    if read_session_videos(session_id) is None:
+        return "Unauthorized", 403
+    offset = (request.get_json(silent=True) or {}).get('offset')
+    if isinstance(offset, bool) or not isinstance(offset, (int, float)) or not np.isfinite(offset):
+        return "offset must be a number of seconds", 400
+    with db_connection() as conn:
+        conn.execute('UPDATE sessions SET video_offset = ? WHERE id = ?', (float(offset), session_id))
+        conn.commit()
+    return jsonify({'offset': float(offset)})
+
+@app.route('/static/thumbnails/<key>/<filename>')
+def serve_thumbnail(key, filename):
+    if not re.fullmatch(r'[0-9a-f]{64}', key):
+        return "Not Found", 404
+    response = send_from_directory(os.path.abspath(os.path.join(app.config['THUMBNAIL_FOLDER'], key)), filename)
+    # The key changes whenever the video or the extraction settings do
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    response.cache_control.max_age = 365 * 24 * 3600
+    response.cache_control.immutable = True
+    return response
 
-@app.route('/static/plots/<filename>')
-def serve_plot(filename):
-    return send_from_directory(app.config['PLOT_FOLDER'], filename)
+@app.route('/static/plots/<plot_id>/<filename>')
+def serve_plot(plot_id, filename):
+    if not re.fullmatch(r'[0-9a-f]{64}(-[0-9a-f]{8})?', plot_id):
+        return "Not Found", 404
+    response = send_from_directory(os.path.join(app.config['PLOT_FOLDER'], plot_id), filename)
+    # Plot folders are content-addressed, so a URL always refers to the same image
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    response.cache_control.max_age = 365 * 24 * 3600
+    response.cache_control.immutable = True
+    return response
+
+# Uploaded videos and logs. Responses carry an ETag and Last-Modified, so a revisit
+# revalidates with a 304 instead of re-downloading, and honour Range requests, so video
+# players can seek without fetching the whole file. Full responses go through the WSGI
+# server's file wrapper (sendfile under gunicorn). UPLOAD_OFFLOAD hands the bytes to a
+# front proxy instead, keeping app threads free for log processing:
+#   x-accel-redirect  nginx; UPLOAD_ACCEL_PREFIX is an internal location aliased to uploads/
+#   x-sendfile        Apache mod_xsendfile or lighttpd; the header carries the file's path
+app.config['UPLOAD_OFFLOAD'] = os.environ.get('UPLOAD_OFFLOAD', 'off')
+app.config['UPLOAD_ACCEL_PREFIX'] = os.environ.get('UPLOAD_ACCEL_PREFIX', '/protected-uploads').rstrip('/')
+if app.config['UPLOAD_OFFLOAD'] not in ('off', 'x-accel-redirect', 'x-sendfile'):
+    raise ValueError(f"Unknown UPLOAD_OFFLOAD: {app.config['UPLOAD_OFFLOAD']}")
+
+def offload_upload(path, filename):
+    # Headers-only response telling the proxy which file to send; conditional requests
+    # are still answered here, and the proxy handles ranges itself
+    stat = os.stat(path)
+    response = Response(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+    response.last_modified = stat.st_mtime
+    response.set_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+    response.cache_control.no_cache = True
+    response = response.make_conditional(request)
+    if response.status_code == 304:
+        return response  # some proxies send the file anyway if the header is present
+    if app.config['UPLOAD_OFFLOAD'] == 'x-sendfile':
+        response.headers['X-Sendfile'] = path
+    else:
+        response.headers['X-Accel-Redirect'] = f"{app.config['UPLOAD_ACCEL_PREFIX']}/{quote(filename)}"
+    return response
 
 @app.route('/uploads/<filename>')
 def serve_uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    path = safe_join(os.path.abspath(app.config['UPLOAD_FOLDER']), filename)
+    if path is None or not os.path.isfile(path):
+        return "Not Found", 404
+    if app.config['UPLOAD_OFFLOAD'] != 'off':
+        return offload_upload(path, filename)
+    response = send_file(path, conditional=True, max_age=0)
+    # no-cache: cache, but revalidate, since a new upload can reuse the name
+    response.cache_control.no_cache = True
+    return response
 
 if __name__ == "__main__":
+    # Single-process development server; serve production with gunicorn.conf.py
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# Headless batch analysis of a directory of logs, without the web app:
+#
+#   python batch.py path/to/logs --output batch_output --workers 8
+#
+# Each log is parsed and plotted in its own worker process; results go to
+# <output>/<log name>/ (one PNG per plot plus summary.json) and throughput is
+# printed at the end.
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from loganalysis import PARSE_ENGINE, parse_log, select_message_types, generate_plots, compute_flight_summary
+
+LOG_EXTENSIONS = ('.BIN', '.log')
+
+
+def find_logs(directory, recursive=False):
+    if not recursive:
+        return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                      if name.endswith(LOG_EXTENSIONS) and os.path.isfile(os.path.join(directory, name)))
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(directory)
+                  for name in names if name.endswith(LOG_EXTENSIONS))
+
+
+def process_log(logfile, output_dir, engine=PARSE_ENGINE, message_types=None):
+    # Runs in a worker process; plots are rendered in-process since the pool already
+    # spreads logs over the CPUs
+    start = time.perf_counter()
+    data = parse_log(logfile, message_types, engine=engine)
+    parsed = time.perf_counter()
+    plot_files = generate_plots(data, output_dir, workers=1)
+    summary = compute_flight_summary(data)
+    with open(os.path.join(output_dir, 'summary.json'), 'w') as f:
+        json.dump({'log': os.path.abspath(logfile), 'summary': summary,
+                   'plots': sorted(os.path.basename(path) for path in plot_files.values())}, f, indent=2)
+    return {'parse_seconds': parsed - start, 'plot_seconds': time.perf_counter() - parsed, 'plots': len(plot_files)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse and plot every .BIN/.log file in a directory")
+    parser.add_argument('directory')
+    parser.add_argument('--output', default='batch_output', help="folder for per-log results")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument('--engine', default=PARSE_ENGINE, choices=['dataflash', 'pymavlink'])
+    parser.add_argument('--recursive', action='store_true', help="also search subdirectories")
+    parser.add_argument('--messages', help="comma-separated message types to decode and plot (default all)")
+    args = parser.parse_args()
+    message_types = None
+    if args.messages:
+        try:
+            message_types = select_message_types(args.messages.split(','))
+        except ValueError as e:
+            parser.error(str(e))
+
+    logs = find_logs(args.directory, args.recursive)
+    if not logs:
+        print(f"No {'/'.join(LOG_EXTENSIONS)} files in {args.directory}", file=sys.stderr)
+        return 1
+
+    def output_dir(logfile):
+        name = os.path.relpath(logfile, args.directory)
+        return os.path.join(args.output, name.replace(os.sep, '__'))
+
+    total_bytes = sum(os.path.getsize(logfile) for logfile in logs)
+    failures = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(process_log, logfile, output_dir(logfile), args.engine, message_types): logfile for logfile in logs}
+        for future in as_completed(futures):
+            logfile = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"FAILED  {logfile}: {e}", file=sys.stderr)
+                continue
+            print(f"ok      {logfile}: {os.path.getsize(logfile) / 1e6:.1f} MB, parse {result['parse_seconds']:.2f} s, "
+                  f"{result['plots']} plots {result['plot_seconds']:.2f} s")
+    elapsed = time.perf_counter() - start
+
+    done = len(logs) - failures
+    print(f"\n{done}/{len(logs)} logs in {elapsed:.1f} s: {total_bytes / 1e6 / elapsed:.1f} MB/s, "
+          f"{done / elapsed * 60:.1f} logs/min ({args.workers} workers)")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# Request latency under parallel uploads. Uploader threads create sessions (a markdown
+# file each, so every request is a SQLite write) while reader threads load the session
+# list; per-request latencies are reported as percentiles.
+#
+#   python benchmarks/db_concurrency.py                 # pooled connections, WAL
+#   python benchmarks/db_concurrency.py --legacy        # a connection per query, rollback journal, no user cache
+#
+# Runs against a throwaway database in a temporary directory.
+import argparse
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentiles(samples):
+    if not samples:
+        return 'no requests'
+    ms = np.array(samples) * 1000
+    return (f"n={len(ms)} p50={np.percentile(ms, 50):.1f} ms p95={np.percentile(ms, 95):.1f} ms "
+            f"p99={np.percentile(ms, 99):.1f} ms max={ms.max():.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--uploaders', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--legacy', action='store_true', help="disable pooling, WAL and the user cache")
+    args = parser.parse_args()
+
+    if args.legacy:
+        os.environ.update(SQLITE_JOURNAL_MODE='DELETE', DB_POOL_SIZE='0', USER_CACHE_TTL='0')
+    os.chdir(tempfile.mkdtemp(prefix='db-bench-'))
+    sys.path.insert(0, ROOT)
+    import LogAnalyserApp
+
+    app = LogAnalyserApp.app
+    with LogAnalyserApp.db_connection() as conn:
+        conn.execute("INSERT INTO users (github_id, username) VALUES ('bench', 'bench')")
+        user_id = conn.execute('SELECT id FROM users').fetchone()[0]
+
+    latencies = {'upload': [], 'list': []}
+    errors = []
+    deadline = time.monotonic() + args.seconds
+
+    def worker(kind):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        samples = []
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            if kind == 'upload':
+                response = client.post('/', data={'markdown': (io.BytesIO(b'# notes'), 'notes.md')},
+                                       content_type='multipart/form-data')
+                ok = response.status_code == 302
+            else:
+                response = client.get('/')
+                ok = response.status_code == 200
+            samples.append(time.perf_counter() - start)
+            if not ok:
+                errors.append(f"{kind}: HTTP {response.status_code}")
+        latencies[kind] += samples
+
+    threads = ([threading.Thread(target=worker, args=('upload',)) for _ in range(args.uploaders)] +
+               [threading.Thread(target=worker, args=('list',)) for _ in range(args.readers)])
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    mode = 'legacy (connection per query, rollback journal)' if args.legacy else 'pooled, WAL'
+    print(f"{mode}: {args.uploaders} uploaders, {args.readers} readers, {args.seconds:.0f} s")
+    print(f"  uploads:      {percentiles(latencies['upload'])}")
+    print(f"  session list: {percentiles(latencies['list'])}")
+    print(f"  errors: {len(errors)}" + (f" (first: {errors[0]})" if errors else ''))
+
+
+if __name__ == '__main__':
+    main()
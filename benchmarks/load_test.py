@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# Throughput of the production server (gunicorn with gunicorn.conf.py) as its worker
+# count grows. For each --workers value a server is started on a throwaway database and
+# folders, and then:
+#
+#   views    --clients threads load a processed session's page for --seconds
+#   uploads  --clients threads upload --uploads distinct synthetic logs between them
+#            and wait for each log's job to finish
+#
+# Reported: views/s and uploads (processed logs) per minute, with latency percentiles.
+#
+#   python benchmarks/load_test.py --workers 1 2 4
+#   python benchmarks/load_test.py --workers 1 4 --scenario uploads --uploads 32 --duration 60
+#
+# Plots are rendered in-process (PLOT_WORKERS=1, see --plot-workers), so log processing
+# scales with the server's worker processes rather than each worker's plot pool.
+import argparse
+import http.client
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+from flask import Flask
+from flask.sessions import SecureCookieSessionInterface
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthlog import generate_log
+
+STARTUP_TIMEOUT = 60
+JOB_TIMEOUT = 600
+SECRET_KEY = os.urandom(16).hex()
+
+
+def percentiles(samples):
+    if not samples:
+        return 'no requests'
+    ms = np.array(samples) * 1000
+    return f"p50={np.percentile(ms, 50):.0f} ms p95={np.percentile(ms, 95):.0f} ms max={ms.max():.0f} ms"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def session_cookie(user_id):
+    # A Flask-Login session for user_id, signed with the server's secret key
+    app = Flask(__name__)
+    app.secret_key = SECRET_KEY
+    serializer = SecureCookieSessionInterface().get_signing_serializer(app)
+    return 'session=' + serializer.dumps({'_user_id': str(user_id), '_fresh': True})
+
+
+class Client:
+    # One keep-alive connection to the server, logged in
+    def __init__(self, port, cookie):
+        self.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=JOB_TIMEOUT)
+        self.cookie = cookie
+
+    def request(self, method, path, body=None, headers=None):
+        self.connection.request(method, path, body, {'Cookie': self.cookie, **(headers or {})})
+        response = self.connection.getresponse()
+        return response, response.read()
+
+    def close(self):
+        # Idle keep-alive connections would hold up the server's graceful shutdown
+        self.connection.close()
+
+    def upload(self, path):
+        # POST the upload form with one log; returns the job id
+        boundary = os.urandom(16).hex()
+        with open(path, 'rb') as f:
+            body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; '
+                    f'filename="{os.path.basename(path)}"\r\nContent-Type: application/octet-stream\r\n\r\n'
+                    ).encode() + f.read() + f'\r\n--{boundary}--\r\n'.encode()
+        response, _ = self.request('POST', '/', body, {'Content-Type': f'multipart/form-data; boundary={boundary}'})
+        location = response.getheader('Location') or ''
+        if response.status != 302 or '/jobs/' not in location:
+            raise RuntimeError(f"upload failed: HTTP {response.status}")
+        return int(location.rstrip('/').rsplit('/', 1)[1])
+
+    def wait_for_job(self, job_id):
+        deadline = time.monotonic() + JOB_TIMEOUT
+        while time.monotonic() < deadline:
+            _, body = self.request('GET', f'/jobs/{job_id}/status')
+            state = json.loads(body)
+            if state['status'] == 'done':
+                return
+            if state['status'] == 'failed':
+                raise RuntimeError(f"job {job_id} failed: {state['error']}")
+            time.sleep(0.1)
+        raise RuntimeError(f"job {job_id} timed out")
+
+
+class Server:
+    # gunicorn with gunicorn.conf.py in a fresh directory, with one user
+    def __init__(self, workers, threads, plot_workers):
+        self.workdir = tempfile.mkdtemp(prefix='load-test-')
+        self.port = free_port()
+        env = dict(os.environ, BIND=f'127.0.0.1:{self.port}', WEB_CONCURRENCY=str(workers),
+                   GUNICORN_THREADS=str(threads), PLOT_WORKERS=str(plot_workers), FLASK_SECRET_KEY=SECRET_KEY,
+                   METRICS_FOLDER=os.path.join(self.workdir, 'metrics'))
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+             '--pythonpath', ROOT, 'LogAnalyserApp:app'],
+            cwd=self.workdir, env=env, stdout=subprocess.DEVNULL, stderr=open(os.path.join(self.workdir, 'server.log'), 'w'))
+        self.wait_until_ready()
+        with sqlite3.connect(os.path.join(self.workdir, 'users.db'), timeout=30) as conn:
+            conn.execute("INSERT INTO users (github_id, username) VALUES ('load-test', 'load-test')")
+            user_id = conn.execute("SELECT id FROM users WHERE github_id = 'load-test'").fetchone()[0]
+        self.cookie = session_cookie(user_id)
+
+    def wait_until_ready(self):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"server exited, see {self.workdir}/server.log")
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=5)
+                connection.request('GET', '/metrics')
+                if connection.getresponse().status == 200:
+                    return
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError("server did not start")
+
+    def client(self):
+        return Client(self.port, self.cookie)
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait(timeout=STARTUP_TIMEOUT)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def run_threads(count, target):
+    errors = []
+
+    def run(i):
+        try:
+            target(i)
+        except Exception as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+def bench_views(server, log, args):
+    # Session page loads per second once the session's log has been processed
+    client = server.client()
+    job_id = client.upload(log)
+    client.wait_for_job(job_id)
+    client.close()
+    with sqlite3.connect(os.path.join(server.workdir, 'users.db')) as conn:
+        session_id = conn.execute('SELECT session_id FROM jobs WHERE id = ?', (job_id,)).fetchone()[0]
+    latencies = [[] for _ in range(args.clients)]
+    deadline = time.monotonic() + args.seconds
+
+    def view(i):
+        client = server.client()
+        try:
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                response, _ = client.request('GET', f'/session/{session_id}')
+                if response.status != 200:
+                    raise RuntimeError(f"session view: HTTP {response.status}")
+                latencies[i].append(time.perf_counter() - start)
+        finally:
+            client.close()
+
+    start = time.perf_counter()
+    errors = run_threads(args.clients, view)
+    elapsed = time.perf_counter() - start
+    samples = [sample for client_samples in latencies for sample in client_samples]
+    return {'views_per_second': len(samples) / elapsed, 'latency': percentiles(samples), 'errors': errors}
+
+
+def bench_uploads(server, logs, args):
+    # Uploads per minute, each counted once its job has processed the log
+    latencies = []
+    queue = list(logs)
+    lock = threading.Lock()
+
+    def upload(i):
+        client = server.client()
+        try:
+            while True:
+                with lock:
+                    if not queue:
+                        return
+                    log = queue.pop()
+                start = time.perf_counter()
+                client.wait_for_job(client.upload(log))
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+        finally:
+            client.close()
+
+    start = time.perf_counter()
+    errors = run_threads(args.clients, upload)
+    elapsed = time.perf_counter() - start
+    return {'uploads_per_minute': len(latencies) / elapsed * 60, 'latency': percentiles(latencies), 'errors': errors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the gunicorn server at several worker counts")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=8, help="request threads per worker")
+    parser.add_argument('--scenario', choices=['views', 'uploads'], action='append',
+                        help="default both")
+    parser.add_argument('--clients', type=int, default=16, help="concurrent client threads")
+    parser.add_argument('--seconds', type=float, default=10, help="length of the views run")
+    parser.add_argument('--uploads', type=int, default=16, help="logs uploaded per uploads run")
+    parser.add_argument('--duration', type=float, default=60, help="synthetic log length in seconds")
+    parser.add_argument('--plot-workers', type=int, default=1, help="PLOT_WORKERS of the server")
+    args = parser.parse_args()
+    scenarios = args.scenario or ['views', 'uploads']
+
+    # Throughput can only grow with workers up to the number of cores
+    print(f"{os.cpu_count()} CPU(s), {args.clients} clients, {args.threads} threads per worker")
+    logdir = tempfile.mkdtemp(prefix='load-test-logs-')
+    try:
+        # Distinct logs (by seed), so every upload is parsed and plotted afresh
+        print(f"Writing {args.uploads + 1} synthetic {args.duration:.0f} s logs")
+        logs = [os.path.join(logdir, f'flight{seed}.BIN') for seed in range(args.uploads + 1)]
+        for seed, log in enumerate(logs):
+            generate_log(log, args.duration, seed=seed)
+
+        results = []
+        for workers in args.workers:
+            server = Server(workers, args.threads, args.plot_workers)
+            try:
+                result = {'workers': workers}
+                if 'views' in scenarios:
+                    result['views'] = bench_views(server, logs[-1], args)
+                if 'uploads' in scenarios:
+                    result['uploads'] = bench_uploads(server, logs[:-1], args)
+            finally:
+                server.stop()
+            results.append(result)
+            line = f"{workers} worker(s):"
+            if 'views' in result:
+                line += f"  {result['views']['views_per_second']:7.1f} views/s ({result['views']['latency']})"
+            if 'uploads' in result:
+                line += f"  {result['uploads']['uploads_per_minute']:6.1f} uploads/min ({result['uploads']['latency']})"
+            print(line)
+            for scenario in scenarios:
+                for error in result[scenario]['errors'][:3]:
+                    print(f"  {scenario} error: {error}")
+    finally:
+        shutil.rmtree(logdir, ignore_errors=True)
+
+    base = results[0]
+    for result in results[1:]:
+        speedups = []
+        if 'views' in result and base['views']['views_per_second']:
+            speedups.append(f"views x{result['views']['views_per_second'] / base['views']['views_per_second']:.2f}")
+        if 'uploads' in result and base['uploads']['uploads_per_minute']:
+            speedups.append(f"uploads x{result['uploads']['uploads_per_minute'] / base['uploads']['uploads_per_minute']:.2f}")
+        print(f"{result['workers']} vs {base['workers']} worker(s): {', '.join(speedups)}")
+
+
+if __name__ == '__main__':
+    main()
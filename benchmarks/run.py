@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# Benchmark suite: times parsing, plotting, anonymization and the upload route on
+# synthetic logs (see synthlog.py) and saves the results as JSON so runs can be
+# compared across commits:
+#
+#   python benchmarks/run.py                             # 10-minute synthetic flight, all stages
+#   python benchmarks/run.py --duration 3600 --stage parse --stage plots
+#   python benchmarks/run.py --log path/to/flight.BIN    # a real log instead
+#   python benchmarks/run.py --compare benchmarks/results/<earlier run>.json
+#
+# Every measurement runs in a fresh process so peak RSS belongs to that stage alone
+# and no cache (parse cache, plot cache, page cache aside) carries over between runs.
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+RESULTS_FOLDER = os.path.join(ROOT, 'benchmarks', 'results')
+STAGES = ['parse', 'plots', 'anonymize', 'upload', 'upload_chunked']
+UPLOAD_TIMEOUT = 3600
+
+
+def rss_kib():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def count_records(path):
+    if path.endswith('.BIN'):
+        from dataflash import DataFlashLog
+        with DataFlashLog(path) as log:
+            return int(sum(len(offsets) for offsets in log.offsets.values()))
+    with open(path, 'rb') as f:
+        return sum(1 for line in f if not line.startswith(b'FMT'))
+
+
+# Stage bodies. Each runs in its own worker process, does any setup untimed, and
+# returns the seconds spent in the measured operation.
+
+def bench_parse(path, workdir, engine):
+    from loganalysis import parse_log
+    start = time.perf_counter()
+    parse_log(path, engine=engine)
+    return time.perf_counter() - start
+
+
+def bench_plots(path, workdir, engine):
+    from loganalysis import parse_log, generate_plots
+    data = parse_log(path, engine=engine)
+    start = time.perf_counter()
+    generate_plots(data, os.path.join(workdir, 'plots'))
+    return time.perf_counter() - start
+
+
+def bench_anonymize(path, workdir, engine):
+    from loganalysis import anonymize_gps_log
+    start = time.perf_counter()
+    anonymize_gps_log(path, os.path.join(workdir, 'anonymized' + os.path.splitext(path)[1]))
+    return time.perf_counter() - start
+
+
+def _upload_client(workdir, engine):
+    # A fresh app instance (database, uploads, caches) in `workdir` with a logged-in client
+    os.environ['LOG_PARSE_ENGINE'] = engine
+    os.chdir(workdir)
+    import LogAnalyserApp
+    with LogAnalyserApp.db_connection() as conn:
+        conn.execute("INSERT INTO users (github_id, username) VALUES ('bench', 'bench')")
+        user_id = conn.execute('SELECT id FROM users').fetchone()[0]
+    client = LogAnalyserApp.app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return LogAnalyserApp, client
+
+
+def _wait_for_job(app_module, response):
+    # The upload redirects to /jobs/<id>; the log is analysed once the job is done
+    if response.status_code != 302 or '/jobs/' not in response.headers['Location']:
+        raise RuntimeError(f"upload failed: HTTP {response.status_code}")
+    job_id = int(response.headers['Location'].rstrip('/').rsplit('/', 1)[1])
+    deadline = time.monotonic() + UPLOAD_TIMEOUT
+    while time.monotonic() < deadline:
+        state = app_module.read_job_state(job_id)
+        if state['status'] == 'done':
+            return
+        if state['status'] == 'failed':
+            raise RuntimeError(f"job failed: {state['error']}")
+        time.sleep(0.01)
+    raise RuntimeError("job timed out")
+
+
+def bench_upload(path, workdir, engine):
+    app_module, client = _upload_client(workdir, engine)
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        response = client.post('/', data={'file': (f, os.path.basename(path))},
+                               content_type='multipart/form-data')
+    _wait_for_job(app_module, response)
+    return time.perf_counter() - start
+
+
+def bench_upload_chunked(path, workdir, engine):
+    # The browser's path: resumable chunks parsed as they arrive, then the form
+    app_module, client = _upload_client(workdir, engine)
+    start = time.perf_counter()
+    state = client.post('/uploads/chunked', json={'filename': os.path.basename(path),
+                                                  'size': os.path.getsize(path)}).get_json()
+    with open(path, 'rb') as f:
+        while not state['complete']:
+            chunk = f.read(state['chunk_size'])
+            response = client.put(f"/uploads/chunked/{state['id']}", data=chunk,
+                                  headers={'Upload-Offset': str(state['received'])})
+            if response.status_code != 200:
+                raise RuntimeError(f"chunk upload failed: HTTP {response.status_code}")
+            state = response.get_json()
+    response = client.post('/', data={'log_upload_id': state['id']}, content_type='multipart/form-data')
+    _wait_for_job(app_module, response)
+    return time.perf_counter() - start
+
+
+BENCHMARKS = {'parse': bench_parse, 'plots': bench_plots, 'anonymize': bench_anonymize,
+              'upload': bench_upload, 'upload_chunked': bench_upload_chunked}
+
+
+def measure(stage, path, engine):
+    # Worker process entry point: one timed run plus this process's memory high-water
+    # marks. Children covers plot worker processes.
+    workdir = tempfile.mkdtemp(prefix=f'bench-{stage}-')
+    try:
+        baseline = rss_kib()
+        seconds = BENCHMARKS[stage](path, workdir, engine)
+        return {'seconds': seconds,
+                'baseline_rss_mb': baseline / 1024,
+                'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                'children_peak_rss_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_case(stage, path, engine, repeat):
+    runs = []
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+            runs.append(pool.submit(measure, stage, os.path.abspath(path), engine).result())
+    seconds = [run['seconds'] for run in runs]
+    size = os.path.getsize(path)
+    records = count_records(path)
+    best = min(seconds)
+    return {'stage': stage, 'log': os.path.basename(path), 'engine': engine, 'bytes': size, 'records': records,
+            'seconds': seconds, 'best_seconds': best, 'median_seconds': float(np.median(seconds)),
+            'mb_per_s': size / 1e6 / best, 'records_per_s': records / best,
+            'peak_rss_mb': max(run['peak_rss_mb'] for run in runs),
+            'baseline_rss_mb': min(run['baseline_rss_mb'] for run in runs),
+            'children_peak_rss_mb': max(run['children_peak_rss_mb'] for run in runs)}
+
+
+def cases(stages, logs, engines):
+    # (stage, log, engine) combinations; text logs can only be read by pymavlink, and
+    # anonymization doesn't parse at all
+    for stage in stages:
+        for path in logs:
+            if stage == 'anonymize':
+                yield stage, path, None
+                continue
+            for engine in engines if path.endswith('.BIN') else ['pymavlink']:
+                yield stage, path, engine
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def case_key(result):
+    return result['stage'], result['log'], result['engine'] or '-'
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {case_key(result): result for result in baseline['results']}
+    matched = [(result, previous[case_key(result)]) for result in results if case_key(result) in previous]
+    print(f"\nCompared with {baseline.get('commit') or 'unknown commit'} ({baseline_path}):")
+    if not matched:
+        print("  no cases in common (same stages, logs and engines are needed)")
+    for result, old in matched:
+        print(f"  {'/'.join(case_key(result)):<44} time x{result['best_seconds'] / old['best_seconds']:.2f}"
+              f"  peak RSS x{result['peak_rss_mb'] / old['peak_rss_mb']:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parsing, plotting, anonymization and uploads")
+    parser.add_argument('--stage', action='append', choices=STAGES, help="stage to run (repeatable; default all)")
+    parser.add_argument('--log', action='append', default=[], help="benchmark this log instead of synthetic ones")
+    parser.add_argument('--duration', type=float, default=600, help="synthetic flight length in seconds")
+    parser.add_argument('--format', action='append', choices=['BIN', 'log'],
+                        help="synthetic log formats (default both)")
+    parser.add_argument('--engine', action='append', choices=['dataflash', 'pymavlink'],
+                        help=".BIN parse engines (default dataflash)")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per case; the best time is reported")
+    parser.add_argument('--output', help="results file (default benchmarks/results/<commit>-<time>.json)")
+    parser.add_argument('--compare', metavar='RESULTS', help="print time and memory ratios against an earlier run")
+    args = parser.parse_args()
+    stages = args.stage or STAGES
+    engines = args.engine or ['dataflash']
+
+    datadir = tempfile.mkdtemp(prefix='bench-logs-')
+    try:
+        logs = args.log
+        if not logs:
+            from synthlog import generate_log
+            for extension in args.format or ['BIN', 'log']:
+                path = os.path.join(datadir, f'synthetic-{args.duration:g}s.{extension}')
+                generate_log(path, args.duration)
+                logs.append(path)
+
+        results = []
+        for stage, path, engine in cases(stages, logs, engines):
+            result = run_case(stage, path, engine, args.repeat)
+            results.append(result)
+            print(f"{stage:<15} {result['log']:<24} {engine or '-':<10} {result['best_seconds']:8.3f} s "
+                  f"{result['mb_per_s']:8.1f} MB/s {result['records_per_s']:12,.0f} rec/s "
+                  f"peak RSS {result['peak_rss_mb']:7.1f} MB", flush=True)
+    finally:
+        shutil.rmtree(datadir, ignore_errors=True)
+
+    commit, dirty = git_revision()
+    report = {'commit': commit, 'dirty': dirty, 'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+              'python': platform.python_version(), 'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+              'duration': None if args.log else args.duration, 'repeat': args.repeat,
+              'environment': {name: os.environ[name] for name in ('PLOT_WORKERS', 'PLOT_POINTS', 'JOB_WORKERS')
+                              if name in os.environ},
+              'results': results}
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_FOLDER, exist_ok=True)
+        stamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_FOLDER, f"{(commit or 'unknown')[:10]}{'-dirty' if dirty else ''}-{stamp}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
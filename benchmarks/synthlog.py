@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# Synthetic ArduPilot DataFlash logs for benchmarking. Writes a binary .BIN log or a
+# text .log (chosen by extension) of the given duration with the message types the
+# analyser plots, at typical Copter logging rates:
+#
+#   python benchmarks/synthlog.py flight.BIN --duration 600
+#   python benchmarks/synthlog.py flight.log --duration 60 --rate ATT=50 --rate ESC=10
+#
+# Signals are smooth sinusoids plus noise, so decimated plots look like a flight
+# rather than static. Records are built per message type as NumPy structured arrays
+# and interleaved by timestamp, so an hour-long log takes seconds to write.
+import argparse
+import os
+import sys
+import zlib
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataflash import FORMAT_TO_DTYPE, FMT_DTYPE, FMT_LENGTH, FMT_TYPE, HEAD1, HEAD2
+
+# name -> (type id, format, columns, default rate in Hz, instances). GPS uses the
+# pre-instance layout the text anonymizer's field indexes refer to.
+MESSAGES = {
+    'ATT':  (129, 'QccccCCCCB', 'TimeUS,DesRoll,Roll,DesPitch,Pitch,DesYaw,Yaw,ErrRP,ErrYaw,AEKF', 400, 1),
+    'RATE': (130, 'Qffffffffffff', 'TimeUS,RDes,R,ROut,PDes,P,POut,YDes,Y,YOut,ADes,A,AOut', 400, 1),
+    'ESC':  (131, 'QBeeffcfcf', 'TimeUS,Instance,RPM,RawRPM,Volt,Curr,Temp,CTot,MotTemp,Err', 40, 4),
+    'BAT':  (132, 'QBfffffcfB', 'TimeUS,Inst,Volt,VoltR,Curr,CurrTot,EnrgTot,Temp,Res,RemPct', 10, 1),
+    'BARO': (133, 'QBffcfIffB', 'TimeUS,I,Alt,Press,Temp,CRt,SMS,Offset,GndTemp,Health', 20, 2),
+    'VIBE': (134, 'QBfffI', 'TimeUS,IMU,VibeX,VibeY,VibeZ,Clip', 10, 1),
+    'RCIN': (135, 'QHHHHHHHHHHHHHH', 'TimeUS,C1,C2,C3,C4,C5,C6,C7,C8,C9,C10,C11,C12,C13,C14', 25, 1),
+    'RCOU': (136, 'QHHHHHHHHHHHHHH', 'TimeUS,C1,C2,C3,C4,C5,C6,C7,C8,C9,C10,C11,C12,C13,C14', 400, 1),
+    'XKF4': (137, 'QBcccccfffHBIHb', 'TimeUS,C,SV,SP,SH,SM,SVT,errRP,errYaw,errHV,SS,GPS,FS,TS,PI', 25, 1),
+    'GPA':  (138, 'QCCCCfBIH', 'TimeUS,VDop,HAcc,VAcc,SAcc,YAcc,VV,SMS,Delta', 5, 1),
+    'GPS':  (139, 'QBIHBcLLeffffB', 'TimeUS,Status,GMS,GWk,NSats,HDop,Lat,Lng,Alt,Spd,GCrs,VZ,Yaw,U', 5, 1),
+}
+
+# Column -> (mean, amplitude) in the units pymavlink reports; other columns swing
+# around zero. Instance columns take the instance number.
+SIGNALS = {
+    'Roll': (0, 15), 'DesRoll': (0, 15), 'Pitch': (0, 10), 'DesPitch': (0, 10),
+    'Yaw': (180, 170), 'DesYaw': (180, 170),
+    'RPM': (6000, 2000), 'RawRPM': (6000, 2000), 'Volt': (22.2, 1.5), 'Curr': (20, 15),
+    'Temp': (45, 10), 'MotTemp': (50, 10), 'VoltR': (22.5, 1.5), 'RemPct': (60, 30),
+    'Alt': (50, 40), 'Press': (101000, 400), 'GndTemp': (20, 1),
+    'VibeX': (10, 5), 'VibeY': (10, 5), 'VibeZ': (15, 8),
+    'HAcc': (1.5, 0.5), 'VAcc': (2.5, 0.5), 'SAcc': (0.4, 0.2), 'VDop': (1.2, 0.3),
+    'SV': (0.3, 0.2), 'SP': (0.3, 0.2), 'SH': (0.2, 0.1), 'SM': (0.1, 0.05), 'SVT': (0.2, 0.1),
+    'Status': (3, 0), 'NSats': (14, 2), 'HDop': (0.8, 0.2), 'Lat': (-35.3632, 0.001), 'Lng': (149.1652, 0.001),
+}
+SIGNALS.update({f'C{i}': (1500, 400) for i in range(1, 15)})
+INSTANCE_COLUMNS = {'Instance', 'Inst', 'I', 'IMU', 'C'}
+TIME_START_US = 1_000_000
+
+
+def message_dtype(fmt, columns):
+    return np.dtype([('head1', 'u1'), ('head2', 'u1'), ('type', 'u1')] +
+                    [(column, FORMAT_TO_DTYPE[char][0]) for column, char in zip(columns, fmt)])
+
+
+def signal(column, t, rng, instance):
+    mean, amplitude = SIGNALS.get(column, (0, 10))
+    phase = (zlib.crc32(column.encode()) % 628) / 100 + instance
+    values = mean + amplitude * np.sin(2 * np.pi * t / 20 + phase)
+    return values + rng.standard_normal(len(t)) * amplitude * 0.02
+
+
+def message_records(name, duration, rate, rng):
+    # Every record of one message type, all instances, as a structured array and
+    # the matching TimeUS column
+    type_id, fmt, columns, _, instances = MESSAGES[name]
+    columns = columns.split(',')
+    dtype = message_dtype(fmt, columns)
+    count = int(duration * rate)
+    t = np.arange(count) / rate
+    records = np.zeros(count * instances, dtype=dtype)
+    records['head1'], records['head2'], records['type'] = HEAD1, HEAD2, type_id
+    for instance in range(instances):
+        rows = records[instance::instances]
+        rows['TimeUS'] = TIME_START_US + (t * 1e6).astype(np.int64) + instance
+        for column, char in zip(columns[1:], fmt[1:]):
+            if column in INSTANCE_COLUMNS and char == 'B':
+                rows[column] = instance
+                continue
+            values = signal(column, t, rng, instance)
+            multiplier = FORMAT_TO_DTYPE[char][1]
+            if multiplier is not None:
+                values = values / multiplier
+            target = rows.dtype[column]
+            if target.kind in 'iu':
+                info = np.iinfo(target)
+                values = np.clip(np.rint(values), info.min, info.max)
+            rows[column] = values
+    return records
+
+
+def fmt_record(name):
+    type_id, fmt, columns, _, _ = MESSAGES[name]
+    record = np.zeros(1, dtype=[('head1', 'u1'), ('head2', 'u1'), ('type', 'u1')] + FMT_DTYPE.descr)
+    record['head1'], record['head2'], record['type'] = HEAD1, HEAD2, FMT_TYPE
+    record['Type'], record['Length'] = type_id, message_dtype(fmt, columns.split(',')).itemsize
+    record['Name'], record['Format'], record['Columns'] = name.encode(), fmt.encode(), columns.encode()
+    assert record.itemsize == FMT_LENGTH
+    return record.tobytes()
+
+
+def interleave(streams):
+    # Order records of all types by timestamp; returns (stream index, row) per record
+    times = np.concatenate([records['TimeUS'] for records in streams])
+    which = np.concatenate([np.full(len(records), i) for i, records in enumerate(streams)])
+    rows = np.concatenate([np.arange(len(records)) for records in streams])
+    order = np.argsort(times, kind='stable')
+    return which[order], rows[order]
+
+
+def write_bin(path, streams, names):
+    header = b''.join(fmt_record(name) for name in names)
+    which, rows = interleave(streams)
+    lengths = np.array([records.itemsize for records in streams])[which]
+    starts = len(header) + np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    out = np.empty(len(header) + int(lengths.sum()), dtype=np.uint8)
+    out[:len(header)] = np.frombuffer(header, dtype=np.uint8)
+    for i, records in enumerate(streams):
+        # Scatter this type's records, in time order, to their byte positions
+        positions = starts[which == i][:, None] + np.arange(records.itemsize)
+        out[positions] = records[rows[which == i]].view(np.uint8).reshape(-1, records.itemsize)
+    out.tofile(path)
+
+
+def text_lines(name, records):
+    # One "NAME, v1, v2, ..." line per record, with scaled fields in physical units
+    _, fmt, columns, _, _ = MESSAGES[name]
+    template = ', '.join([name] + ['%.7f' if char == 'L' else '%g' if FORMAT_TO_DTYPE[char][1] is not None
+                                   or np.dtype(FORMAT_TO_DTYPE[char][0]).kind == 'f' else '%d'
+                                   for char in fmt]) + '\n'
+    values = []
+    for column, char in zip(columns.split(','), fmt):
+        multiplier = FORMAT_TO_DTYPE[char][1]
+        values.append((records[column] * multiplier if multiplier is not None else records[column]).tolist())
+    return [template % row for row in zip(*values)]
+
+
+def write_text(path, streams, names):
+    which, rows = interleave(streams)
+    lines = [text_lines(name, records) for name, records in zip(names, streams)]
+    with open(path, 'w') as f:
+        f.write('FMT, 128, 89, FMT, BBnNZ, Type,Length,Name,Format,Columns\n')
+        for name in names:
+            type_id, fmt, columns, _, _ = MESSAGES[name]
+            f.write(f'FMT, {type_id}, {message_dtype(fmt, columns.split(",")).itemsize}, {name}, {fmt}, {columns}\n')
+        f.writelines(lines[i][row] for i, row in zip(which.tolist(), rows.tolist()))
+
+
+def generate_log(path, duration, rates=None, seed=0):
+    # Write a synthetic log to `path` (.BIN or .log); returns the number of records
+    if not path.endswith(('.BIN', '.log')):
+        raise ValueError("Synthetic logs must end in .BIN or .log")
+    rates = {**{name: spec[3] for name, spec in MESSAGES.items()}, **(rates or {})}
+    unknown = set(rates) - set(MESSAGES)
+    if unknown:
+        raise ValueError(f"Unknown message types: {', '.join(sorted(unknown))}")
+    rng = np.random.default_rng(seed)
+    names = [name for name in MESSAGES if rates[name] > 0]
+    streams = [message_records(name, duration, rates[name], rng) for name in names]
+    (write_bin if path.endswith('.BIN') else write_text)(path, streams, names)
+    return sum(len(records) for records in streams)
+
+
+def parse_rate(value):
+    name, _, rate = value.partition('=')
+    try:
+        return name, float(rate)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected MSG=HZ, got {value!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic ArduPilot DataFlash log")
+    parser.add_argument('path', help="output file, .BIN or .log")
+    parser.add_argument('--duration', type=float, default=600, help="flight length in seconds")
+    parser.add_argument('--rate', type=parse_rate, action='append', default=[], metavar='MSG=HZ',
+                        help="override a message rate (0 drops the message); repeatable")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    try:
+        records = generate_log(args.path, args.duration, dict(args.rate), args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"{args.path}: {records} records, {os.path.getsize(args.path) / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# Memory-mapped, vectorised reader for ArduPilot DataFlash (.BIN) logs.
+#
+# The log is mapped into memory once, FMT records are scanned to learn every
+# message's layout, and the record chain is resolved with NumPy into an offset
+# index per message type. Whole message types are then decoded in bulk with
+# structured dtypes instead of unpacking one record at a time.
+import mmap
+import os
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+HEAD1 = 0xA3
+HEAD2 = 0x95
+FMT_TYPE = 0x80
+FMT_LENGTH = 89
+
+# Header search is done in windows of this many bytes to bound temporary memory
+SCAN_CHUNK = 64 * 1024 * 1024
+
+# DataFlash format character -> (NumPy dtype, multiplier applied by pymavlink)
+FORMAT_TO_DTYPE = {
+    'a': (('<i2', (32,)), None),
+    'b': ('i1', None),
+    'B': ('u1', None),
+    'g': ('<f2', None),
+    'h': ('<i2', None),
+    'H': ('<u2', None),
+    'i': ('<i4', None),
+    'I': ('<u4', None),
+    'f': ('<f4', None),
+    'd': ('<f8', None),
+    'n': ('S4', None),
+    'N': ('S16', None),
+    'Z': ('S64', None),
+    'c': ('<i2', 0.01),
+    'C': ('<u2', 0.01),
+    'e': ('<i4', 0.01),
+    'E': ('<u4', 0.01),
+    'L': ('<i4', 1.0e-7),
+    'M': ('i1', None),
+    'q': ('<i8', None),
+    'Q': ('<u8', None),
+}
+
+FMT_DTYPE = np.dtype([('Type', 'u1'), ('Length', 'u1'), ('Name', 'S4'),
+                      ('Format', 'S16'), ('Columns', 'S64')])
+
+
+class DataFlashFormat:
+    def __init__(self, type, name, length, format, columns):
+        self.type = type
+        self.name = name
+        self.length = length
+        self.format = format
+        self.columns = columns
+        self.dtype = np.dtype([(column, FORMAT_TO_DTYPE[char][0]) for column, char in zip(columns, format)])
+        self.multipliers = {column: FORMAT_TO_DTYPE[char][1] for column, char in zip(columns, format)
+                            if FORMAT_TO_DTYPE[char][1] is not None}
+
+
+def _format_chars_known(record):
+    # pymavlink drops an FMT record whose format (up to the first NUL) has a character
+    # it can't decode, and resyncs on the bytes after its header
+    format = record['Format'].split(b'\0', 1)[0]
+    return all(chr(byte) in FORMAT_TO_DTYPE for byte in format)
+
+
+def _parse_format(record):
+    # Validate a candidate FMT record; payload bytes can contain a fake header
+    try:
+        name = record['Name'].rstrip(b'\0').decode('ascii')
+        format = record['Format'].rstrip(b'\0').decode('ascii')
+        columns = record['Columns'].rstrip(b'\0').decode('ascii').split(',')
+    except UnicodeDecodeError:
+        return None
+    if not name.isalnum() or len(columns) != len(format):
+        return None
+    if any(char not in FORMAT_TO_DTYPE for char in format) or len(set(columns)) != len(columns):
+        return None
+    fmt = DataFlashFormat(int(record['Type']), name, int(record['Length']), format, columns)
+    if fmt.dtype.itemsize + 3 != fmt.length:
+        return None
+    return fmt
+
+
+class DataFlashLog:
+    def __init__(self, path, progress_callback=None, writable=False, incremental=False):
+        # writable=True maps the file read-write so records can be edited in place.
+        # incremental=True indexes a file that is still being written: call feed() as
+        # bytes are appended and finish() once it is complete.
+        self.path = path
+        self.progress_callback = progress_callback
+        self.writable = writable
+        self._file = open(path, 'r+b' if writable else 'rb')
+        self._map = None
+        self.data = np.zeros(0, dtype=np.uint8)
+        self.size = 0
+        self.formats = {FMT_TYPE: DataFlashFormat(FMT_TYPE, 'FMT', FMT_LENGTH, 'BBnNZ',
+                                                  ['Type', 'Length', 'Name', 'Format', 'Columns'])}
+        self.position = 0  # next byte to index
+        self._chunks = {}  # message type -> offset arrays, one per scanned range
+        self.offsets = {}
+        self.name_to_type = {}
+        if not incremental:
+            self.finish()
+
+    def _remap(self):
+        size = os.fstat(self._file.fileno()).st_size
+        if size == self.size and self._map is not None:
+            return
+        self.data = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self.size = size
+        if size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_WRITE if self.writable else mmap.ACCESS_READ)
+            self.data = np.frombuffer(self._map, dtype=np.uint8)
+        else:
+            self.data = np.zeros(0, dtype=np.uint8)
+
+    def feed(self):
+        # Index the complete records among the bytes appended since the last call; a
+        # record cut off by the current end of file is picked up on the next call
+        self._remap()
+        self.position = self._scan(self.position, self.size, final=False)
+
+    def finish(self):
+        self._remap()
+        self.position = self._scan(self.position, self.size, final=True)
+        for msg_type, chunks in self._chunks.items():
+            self.offsets[msg_type] = np.concatenate(chunks)
+        self.name_to_type = {fmt.name: fmt.type for fmt in self.formats.values()}
+        if self.progress_callback:
+            self.progress_callback(self.size, self.size)
+
+    def _find_headers(self, start, stop):
+        chunks = []
+        pos = start
+        end = stop - 2
+        while pos < end:
+            chunk_end = min(pos + SCAN_CHUNK, end)
+            window = self.data[pos:chunk_end + 1]
+            chunks.append(np.flatnonzero((window[:-1] == HEAD1) & (window[1:] == HEAD2)) + pos)
+            pos = chunk_end
+            if self.progress_callback:
+                self.progress_callback(pos, self.size)
+        if not chunks:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(chunks)
+
+    def _records(self, offsets, length):
+        # Copy the payload of each record at `offsets` into one contiguous block
+        if len(offsets) == 0 or length <= 3:
+            return np.zeros(0, dtype=np.uint8).reshape(0, max(length - 3, 0))
+        windows = sliding_window_view(self.data, length - 3)
+        return windows[offsets + 3]
+
+    def _scan(self, start, stop, final):
+        # Index the records in data[start:stop]; returns the offset to resume from
+        candidates = self._find_headers(start, stop)
+        types = self.data[candidates + 2]
+
+        # Learn message layouts from every plausible FMT record
+        fmt_index = np.flatnonzero((types == FMT_TYPE) & (candidates + FMT_LENGTH <= stop))
+        fmt_records = self._records(candidates[fmt_index], FMT_LENGTH).view(FMT_DTYPE).ravel()
+        for record in fmt_records:
+            fmt = _parse_format(record)
+            if fmt is not None and fmt.type != FMT_TYPE:
+                self.formats[fmt.type] = fmt
+
+        lengths = np.zeros(256, dtype=np.int64)
+        for fmt in self.formats.values():
+            lengths[fmt.type] = fmt.length
+        record_lengths = lengths[types]
+        unreadable = [not _format_chars_known(record) for record in fmt_records]
+        record_lengths[fmt_index[np.array(unreadable, dtype=bool)]] = 0
+        valid = (record_lengths > 0) & (candidates + record_lengths <= stop)
+        # Before the end of the log, a known record running past `stop` is not bad data
+        # but not yet written; the chain stops there and resumes from it next time
+        truncated = (record_lengths > 0) & ~valid if not final else np.zeros(len(candidates), dtype=bool)
+
+        # Each record points at the first header at or after its end; a bad header
+        # resyncs on the next candidate, mirroring pymavlink's byte-wise skip
+        count = len(candidates)
+        index_type = np.int32 if count < 2 ** 31 - 1 else np.int64
+        targets = np.where(valid, candidates + record_lengths, candidates + 1)
+        step = np.append(np.searchsorted(candidates, targets), count).astype(index_type)
+        step[:count][truncated] = count
+
+        # Records actually in the log are the chain reachable from the first header.
+        # Pointer doubling resolves it in O(log n) vectorised passes.
+        reached = np.zeros(count + 1, dtype=bool)
+        reached[0] = True
+        for _ in range(max(int(count).bit_length(), 1)):
+            reached[step[reached]] = True
+            step = step[step]
+        on_chain = reached[:count] & valid
+
+        offsets = candidates[on_chain]
+        chain_types = types[on_chain]
+        order = np.argsort(chain_types, kind='stable')
+        split = np.flatnonzero(np.diff(chain_types[order])) + 1
+        for group in np.split(order, split):
+            if len(group):
+                self._chunks.setdefault(int(chain_types[group[0]]), []).append(offsets[group])
+
+        chain = np.flatnonzero(reached[:count])
+        if final:
+            return stop
+        if not len(chain):
+            return max(start, stop - 2)
+        if truncated[chain[-1]]:
+            return int(candidates[chain[-1]])
+        # The last header search came up empty; a header may straddle `stop`
+        return max(int(targets[chain[-1]]), stop - 2)
+
+    def count(self, name):
+        msg_type = self.name_to_type.get(name)
+        return len(self.offsets.get(msg_type, ())) if msg_type is not None else 0
+
+    def read(self, name):
+        # Decode every record of one message type into a dict of column arrays,
+        # applying the same scaling as pymavlink (centi-units, 1e-7 degrees)
+        msg_type = self.name_to_type.get(name)
+        if msg_type is None:
+            return {}
+        fmt = self.formats[msg_type]
+        offsets = self.offsets.get(msg_type, np.zeros(0, dtype=np.int64))
+        records = np.frombuffer(self._records(offsets, fmt.length), dtype=fmt.dtype)
+        columns = {}
+        for column in fmt.columns:
+            values = records[column]
+            if column in fmt.multipliers:
+                values = values / (1.0 / fmt.multipliers[column])
+            columns[column] = values
+        return columns
+
+    def zero_columns(self, name, columns):
+        # Overwrite `columns` of every `name` record with zero bytes in the mapped file;
+        # returns the number of records changed. Requires writable=True.
+        msg_type = self.name_to_type.get(name)
+        offsets = self.offsets.get(msg_type) if msg_type is not None else None
+        if offsets is None or len(offsets) == 0:
+            return 0
+        fmt = self.formats[msg_type]
+        for column in columns:
+            if column not in fmt.dtype.names:
+                continue
+            field_dtype, field_offset = fmt.dtype.fields[column][:2]
+            for byte in range(3 + field_offset, 3 + field_offset + field_dtype.itemsize):
+                self.data[offsets + byte] = 0
+        return len(offsets)
+
+    def flush(self):
+        if self._map is not None:
+            self._map.flush()
+
+    def close(self):
+        self.data = None
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
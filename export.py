@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# Export decoded telemetry as files, from the command line or the web app's
+# /session/<id>/export/<format> endpoint:
+#
+#   python export.py flight.BIN --format parquet
+#   python export.py flight.BIN --format csv --messages ATT,RATE --output attitude.zip
+#
+# Formats:
+#   parquet  one table with columns stream, Time and the union of the exported fields
+#            (null where a stream has no such field); each chunk of a stream is its own
+#            row group, so readers can skip streams by row-group statistics. Needs pyarrow.
+#   csv      a zip with one <stream>.csv per stream (ATT.csv, ESC.0.csv, ...)
+#   hdf5     one group per stream with a dataset per column. Needs h5py.
+#
+# Every format is produced as a generator of byte chunks that reads EXPORT_CHUNK_ROWS
+# rows of one stream at a time, so the web app can stream an export straight from the
+# memory-mapped parse cache and nothing holds a whole log in memory. HDF5 can only be
+# written to a seekable file, so it is assembled in a temporary file first.
+import argparse
+import importlib.util
+import io
+import os
+import sys
+import tempfile
+import time
+import zipfile
+import numpy as np
+from loganalysis import MESSAGES, PARSE_ENGINE, iter_streams, parse_log, read_dataflash_series, select_message_types
+
+EXPORT_CHUNK_ROWS = 65536
+FILE_BLOCK_BYTES = 1024 * 1024
+
+# format -> (MIME type, file extension, required module or None)
+EXPORT_FORMATS = {
+    'parquet': ('application/vnd.apache.parquet', '.parquet', 'pyarrow'),
+    'csv': ('application/zip', '.zip', None),
+    'hdf5': ('application/x-hdf5', '.h5', 'h5py'),
+}
+
+
+def format_available(fmt):
+    module = EXPORT_FORMATS[fmt][2]
+    return module is None or importlib.util.find_spec(module) is not None
+
+
+class ChunkSink:
+    # Write-only file object that buffers what a writer produces until drained, so a
+    # writer can be driven as a generator of byte chunks
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def iter_message_data(logfile, message_types=None, engine=PARSE_ENGINE):
+    # (message type, parsed value) per requested type. With the bulk decoder, .BIN logs
+    # are indexed once and decoded one type at a time, so only that type's columns are
+    # in memory; other logs are parsed in one pass.
+    names = select_message_types(message_types)
+    if engine == 'dataflash' and logfile.endswith('.BIN'):
+        from dataflash import DataFlashLog
+        with DataFlashLog(logfile) as log:
+            for name in names:
+                yield name, read_dataflash_series(log, [name])[name]
+    else:
+        yield from parse_log(logfile, names, engine=engine).items()
+
+
+def _streams(message_data):
+    for name, value in message_data:
+        yield from iter_streams({name: value})
+
+
+def _chunks(series):
+    # (row count, {column: array}) over consecutive EXPORT_CHUNK_ROWS rows of a series
+    columns = ['Time'] + series.fields
+    for start in range(0, len(series), EXPORT_CHUNK_ROWS):
+        chunk = {column: np.asarray(series[column][start:start + EXPORT_CHUNK_ROWS]) for column in columns}
+        yield len(chunk['Time']), chunk
+
+
+def export_fields(message_types=None):
+    # Union of the exported fields in registry order (the Parquet schema's columns)
+    fields = []
+    for name in select_message_types(message_types):
+        fields += [field for field in MESSAGES[name].fields if field not in fields]
+    return fields
+
+
+def parquet_chunks(message_data, message_types=None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    fields = export_fields(message_types)
+    schema = pa.schema([('stream', pa.dictionary(pa.int32(), pa.string())), ('Time', pa.float64())] +
+                       [(field, pa.float64()) for field in fields])
+    sink = ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for stream, series in _streams(message_data):
+        for rows, chunk in _chunks(series):
+            arrays = [pa.DictionaryArray.from_arrays(pa.array(np.zeros(rows, dtype=np.int32)), pa.array([stream])),
+                      pa.array(chunk['Time'], type=pa.float64())]
+            arrays += [pa.array(chunk[field], type=pa.float64()) if field in chunk else pa.nulls(rows, pa.float64())
+                       for field in fields]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def csv_chunks(message_data, message_types=None):
+    sink = ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for stream, series in _streams(message_data):
+            with archive.open(f'{stream}.csv', 'w', force_zip64=True) as member:
+                member.write((','.join(['Time'] + series.fields) + '\n').encode())
+                for rows, chunk in _chunks(series):
+                    text = io.StringIO()
+                    np.savetxt(text, np.column_stack([chunk[column] for column in ['Time'] + series.fields]),
+                               fmt='%.10g', delimiter=',')
+                    member.write(text.getvalue().encode())
+                    yield sink.drain()
+    yield sink.drain()
+
+
+def hdf5_chunks(message_data, message_types=None):
+    import h5py
+    handle, path = tempfile.mkstemp(suffix='.h5')
+    os.close(handle)
+    try:
+        with h5py.File(path, 'w') as f:
+            for stream, series in _streams(message_data):
+                group = f.create_group(stream)
+                group.attrs['message'] = stream.split('.')[0]
+                datasets = {column: group.create_dataset(column, shape=(len(series),),
+                                                         dtype=np.asarray(series[column][:0]).dtype)
+                            for column in ['Time'] + series.fields}
+                for start, (rows, chunk) in zip(range(0, len(series), EXPORT_CHUNK_ROWS), _chunks(series)):
+                    for column, values in chunk.items():
+                        datasets[column][start:start + rows] = values
+        with open(path, 'rb') as f:
+            yield from iter(lambda: f.read(FILE_BLOCK_BYTES), b'')
+    finally:
+        os.remove(path)
+
+
+EXPORT_WRITERS = {'parquet': parquet_chunks, 'csv': csv_chunks, 'hdf5': hdf5_chunks}
+
+
+def export_chunks(fmt, message_data, message_types=None):
+    # Byte chunks of `message_data` ((message type, parsed value) pairs for the
+    # requested types, in registry order) exported as `fmt`
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if not format_available(fmt):
+        raise RuntimeError(f"{fmt} export needs {EXPORT_FORMATS[fmt][2]} (pip install {EXPORT_FORMATS[fmt][2]})")
+    return EXPORT_WRITERS[fmt](message_data, message_types)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export decoded log messages to Parquet, CSV or HDF5")
+    parser.add_argument('log', help=".BIN or .log file")
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='parquet')
+    parser.add_argument('--output', help="output file (default: the log's name with the format's extension)")
+    parser.add_argument('--messages', help="comma-separated message types (default all)")
+    parser.add_argument('--engine', default=PARSE_ENGINE, choices=['dataflash', 'pymavlink'])
+    args = parser.parse_args()
+    try:
+        message_types = select_message_types(args.messages.split(',') if args.messages else None)
+        chunks = export_chunks(args.format, iter_message_data(args.log, message_types, args.engine), message_types)
+    except (ValueError, RuntimeError) as e:
+        parser.error(str(e))
+    output = args.output or os.path.splitext(args.log)[0] + EXPORT_FORMATS[args.format][1]
+
+    start = time.perf_counter()
+    with open(output, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    print(f"{output}: {os.path.getsize(output) / 1e6:.1f} MB in {time.perf_counter() - start:.1f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# Fleet queries over every processed flight, from the command line or the web app's
+# /fleet/query endpoint, e.g.
+#
+#   python fleet.py --where "clip_count > 10"
+#   python fleet.py --airframe X8-02 --last 100 --metric min_battery_voltage --metric BAT.Volt:range
+#
+# Filters apply to the per-flight summaries; metrics are summary columns or
+# STREAM.FIELD[:min|max|mean|range|p5|p95] over the decoded log columns.
+#
+# Filters on flight summary columns are pushed down into SQL, so flights that fail them
+# never have their logs opened; metrics over decoded columns are then computed for the
+# remaining flights (in parallel, in the web app, straight from its memory-mapped parse
+# cache) and stored in flight_metrics so later queries don't have to decode the log
+# again. A flight whose metrics can't be computed is still listed, with null metrics and
+# the error. Importing this module has no side effects: the caller supplies the database
+# connections and the way a flight's log is decoded.
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+from loganalysis import FLIGHT_SUMMARY_COLUMNS, MESSAGES, iter_streams, parse_log
+
+FLEET_REDUCERS = {
+    'min': np.fmin.reduce,
+    'max': np.fmax.reduce,
+    'mean': np.nanmean,
+    'range': lambda values: np.fmax.reduce(values) - np.fmin.reduce(values),
+    'p5': lambda values: np.nanpercentile(values, 5),
+    'p95': lambda values: np.nanpercentile(values, 95),
+}
+
+logger = logging.getLogger(__name__)
+
+
+def parse_fleet_filter(text):
+    # "clip_count > 10" -> ('clip_count', '>', 10.0); only summary columns can be filtered
+    match = re.fullmatch(r'\s*(\w+)\s*(<=|>=|!=|=|<|>)\s*(\S+)\s*', text)
+    if not match or match.group(1) not in FLIGHT_SUMMARY_COLUMNS:
+        raise ValueError(f"Invalid filter: {text!r}")
+    try:
+        return match.group(1), match.group(2), float(match.group(3))
+    except ValueError:
+        raise ValueError(f"Invalid filter value: {text!r}")
+
+
+def parse_fleet_metric(text):
+    # Either a summary column ("min_battery_voltage"), answered without opening the log,
+    # or STREAM.FIELD[:REDUCER] over decoded columns ("BAT.Volt:range", "ESC.2.Temp:p95").
+    # Streams and fields are checked against the message registry, so a typo is an error
+    # rather than a null stored for every log.
+    if text in FLIGHT_SUMMARY_COLUMNS:
+        return text, None, None
+    stream_field, _, reducer = text.partition(':')
+    stream, _, field = stream_field.rpartition('.')
+    reducer = reducer or 'max'
+    if not stream or not field or reducer not in FLEET_REDUCERS:
+        raise ValueError(f"Invalid metric: {text!r}")
+    spec = MESSAGES.get(stream.split('.')[0])
+    if spec is None:
+        raise ValueError(f"Unknown message type in metric: {text!r}")
+    streams = [f"{spec.name}.{instance}" for instance in spec.instances] if spec.instance_field else [spec.name]
+    if stream not in streams:
+        raise ValueError(f"Unknown stream in metric {text!r}; {spec.name} has {', '.join(streams)}")
+    if field not in spec.fields:
+        raise ValueError(f"Unknown field in metric {text!r}; {spec.name} has {', '.join(spec.fields)}")
+    return stream, field, reducer
+
+
+def metric_name(metric):
+    stream, field, reducer = metric
+    return stream if field is None else f"{stream}.{field}:{reducer}"
+
+
+def compute_metrics(read_column, metrics):
+    # {metric name: value} of STREAM.FIELD metrics; read_column(stream, field) returns the
+    # decoded column, or None if the log has no such stream
+    results = {}
+    for stream, field, reducer in metrics:
+        values = read_column(stream, field)
+        value = float(FLEET_REDUCERS[reducer](values)) if values is not None and len(values) else None
+        results[metric_name((stream, field, reducer))] = value if value is not None and np.isfinite(value) else None
+    return results
+
+
+def stored_flight_metrics(connect, digest, metrics, compute):
+    # Metrics of the log with this digest, answered from the flight_metrics table where
+    # possible; the rest come from compute(missing metrics) and are stored
+    names = [metric_name(metric) for metric in metrics]
+    with connect() as conn:
+        rows = conn.execute(f'''SELECT metric, value FROM flight_metrics
+                                WHERE digest = ? AND metric IN ({', '.join('?' for _ in names)})''',
+                            (digest, *names)).fetchall()
+    results = dict(rows)
+    missing = [metric for metric, name in zip(metrics, names) if name not in results]
+    if missing:
+        computed = compute(missing)
+        now = datetime.utcnow()
+        with connect() as conn:
+            conn.executemany('INSERT OR REPLACE INTO flight_metrics (digest, metric, value, computed_at) VALUES (?, ?, ?, ?)',
+                             [(digest, name, value, now) for name, value in computed.items()])
+            conn.commit()
+        results.update(computed)
+    return {name: results[name] for name in names}
+
+
+def fleet_trend(flights, names):
+    # Least-squares slope of each metric per flight, oldest flight first
+    trend = {}
+    for name in names:
+        points = [(i, flight['metrics'][name]) for i, flight in enumerate(flights) if flight['metrics'][name] is not None]
+        slope = float(np.polyfit(*np.array(points, dtype=np.float64).T, 1)[0]) if len(points) >= 2 else None
+        trend[name] = {'flights': len(points), 'slope_per_flight': slope,
+                       'first': points[0][1] if points else None, 'last': points[-1][1] if points else None}
+    return trend
+
+
+def fleet_query(connect, flight_metrics, filters=(), metrics=(), airframe=None, user_id=None, since=None, last=None,
+                map=map):
+    # filters: (summary column, operator, value); metrics: parse_fleet_metric() tuples.
+    # connect() is a context manager yielding a database connection, and
+    # flight_metrics(log file, metrics) computes one flight's STREAM.FIELD metrics;
+    # `map` runs it over the matching flights.
+    where, params = ['s.log_file IS NOT NULL'], []
+    for column, operator, value in filters:
+        where.append(f'f.{column} {operator} ?')
+        params.append(value)
+    for column, value in [('s.user_id', user_id), ('s.airframe', airframe)]:
+        if value is not None:
+            where.append(f'{column} = ?')
+            params.append(value)
+    if since is not None:
+        where.append('s.created_at >= ?')
+        params.append(since)
+    sql = f'''SELECT s.id, s.airframe, s.created_at, s.log_file, {', '.join(f'f.{column}' for column in FLIGHT_SUMMARY_COLUMNS)}
+              FROM sessions s JOIN flight_summaries f ON f.session_id = s.id
+              WHERE {' AND '.join(where)} ORDER BY s.created_at DESC'''
+    if last is not None:
+        sql += ' LIMIT ?'
+        params.append(last)
+    with connect() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    rows.reverse()  # oldest first, so trends run forwards in time
+
+    flights = [{'session_id': row[0], 'airframe': row[1], 'created_at': row[2],
+                'log_file': os.path.basename(row[3]), 'summary': dict(zip(FLIGHT_SUMMARY_COLUMNS, row[4:])),
+                'metrics': {}} for row in rows]
+    column_metrics = [metric for metric in metrics if metric[1] is not None]
+    for flight in flights:
+        flight['metrics'] = {name: flight['summary'][name] for name, field, _ in metrics if field is None}
+
+    def row_metrics(row):
+        # (metric values, None), or (null values, error message)
+        try:
+            return flight_metrics(row[3], column_metrics), None
+        except Exception as e:
+            logger.exception("Fleet metrics failed for session %s", row[0])
+            return {metric_name(metric): None for metric in column_metrics}, str(e) or type(e).__name__
+
+    if column_metrics:
+        for flight, (values, error) in zip(flights, map(row_metrics, rows)):
+            flight['metrics'].update(values)
+            if error is not None:
+                flight['error'] = error
+    names = [metric_name(metric) for metric in metrics]
+    return {'flights': flights, 'trend': fleet_trend(flights, names)}
+
+
+def database(path):
+    # connect() for fleet_query over the web app's SQLite database at `path`
+    @contextmanager
+    def connect():
+        conn = sqlite3.connect(path, timeout=30)
+        try:
+            yield conn
+        finally:
+            conn.close()
+    return connect
+
+
+def file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def decoded_flight_metrics(connect):
+    # flight_metrics for the command line: stored values, else decoded from the log
+    def flight_metrics(log_file, metrics):
+        def compute(missing):
+            streams = dict(iter_streams(parse_log(log_file, {stream.split('.')[0] for stream, _, _ in missing})))
+            return compute_metrics(lambda stream, field: np.asarray(streams[stream][field]) if stream in streams else None,
+                                   missing)
+        return stored_flight_metrics(connect, file_digest(log_file), metrics, compute)
+    return flight_metrics
+
+
+def format_value(value):
+    return '-' if value is None else f'{value:.6g}' if isinstance(value, float) else str(value)
+
+
+def print_table(result):
+    names = list(result['trend'])
+    header = ['session', 'airframe', 'created_at', 'log_file'] + names
+    rows = [[flight['session_id'], flight['airframe'], flight['created_at'], flight['log_file']] +
+            [flight['metrics'][name] for name in names] for flight in result['flights']]
+    rows = [[format_value(value) for value in row] for row in rows]
+    widths = [max([len(column)] + [len(row[i]) for row in rows]) for i, column in enumerate(header)]
+    print('  '.join(column.ljust(width) for column, width in zip(header, widths)))
+    for row in rows:
+        print('  '.join(value.ljust(width) for value, width in zip(row, widths)))
+    print(f"\n{len(rows)} flight(s)")
+    for flight in result['flights']:
+        if 'error' in flight:
+            print(f"session {flight['session_id']}: metrics failed: {flight['error']}")
+    for name, trend in result['trend'].items():
+        print(f"trend {name}: {format_value(trend['slope_per_flight'])} per flight over {trend['flights']} flight(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query flight summaries and decoded columns across the fleet")
+    parser.add_argument('--where', action='append', default=[], help="summary filter, e.g. 'clip_count > 10'")
+    parser.add_argument('--metric', action='append', default=[], help="summary column or STREAM.FIELD[:reducer]")
+    parser.add_argument('--airframe')
+    parser.add_argument('--user-id', type=int)
+    parser.add_argument('--since', help="only flights created at or after this timestamp")
+    parser.add_argument('--last', type=int, help="only the most recent N matching flights")
+    parser.add_argument('--database', default='users.db', help="the web app's database (default: users.db)")
+    parser.add_argument('--json', action='store_true', help="print the raw JSON result")
+    args = parser.parse_args()
+
+    try:
+        filters = [parse_fleet_filter(text) for text in args.where]
+        metrics = [parse_fleet_metric(text) for text in args.metric]
+    except ValueError as e:
+        parser.error(str(e))
+    if not os.path.isfile(args.database):
+        parser.error(f"No database at {args.database}; run from the web app's directory or pass --database")
+    connect = database(args.database)
+    result = fleet_query(connect, decoded_flight_metrics(connect), filters, metrics, airframe=args.airframe,
+                         user_id=args.user_id, since=args.since, last=args.last)
+    if args.json:
+        print(json.dumps(result, indent=2, default=str))
+    else:
+        print_table(result)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
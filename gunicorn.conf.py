@@ -0,0 +1,38 @@
+# Production serving with several worker processes:
+#
+#   gunicorn -c gunicorn.conf.py LogAnalyserApp:app
+#
+# Settings come from the environment: BIND (default 0.0.0.0:5000), WEB_CONCURRENCY
+# worker processes (default one per CPU) and GUNICORN_THREADS request threads in each.
+# Threaded workers keep long requests (uploads, exports, the job progress event stream)
+# from tying up a whole process. Every worker also runs JOB_WORKERS log processing
+# threads, so up to WEB_CONCURRENCY * JOB_WORKERS logs are processed at once, and its
+# own pool of PLOT_WORKERS plot processes. PLOT_WORKERS defaults to the CPUs shared out
+# among the workers, rather than the single-process default of one per CPU in each.
+#
+# Workers share state only through SQLite and the upload, cache, plot and thumbnail
+# folders, so they can be started, killed and replaced independently; a killed
+# worker's jobs are picked up by the others (see "Worker processes" in LogAnalyserApp.py).
+import multiprocessing
+import os
+import shutil
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+# Seconds a worker may go without checking in before it is restarted. gthread workers
+# check in between requests, not per request, so this doesn't cap request time.
+timeout = 120
+graceful_timeout = 60
+accesslog = os.environ.get('ACCESS_LOG')  # '-' for stdout
+os.environ.setdefault('PLOT_WORKERS', str(max(1, multiprocessing.cpu_count() // workers)))
+
+# Workers write their metrics snapshots here and /metrics adds them up; stale
+# snapshots from an earlier run are cleared when the server starts
+os.environ.setdefault('METRICS_FOLDER', 'metrics')
+
+
+def on_starting(server):
+    shutil.rmtree(os.environ['METRICS_FOLDER'], ignore_errors=True)
+    os.makedirs(os.environ['METRICS_FOLDER'])
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# Timing, memory and profiling instrumentation for the processing pipeline. No import-
+# time side effects and no dependencies beyond the standard library (pyinstrument is
+# used only if installed and asked for), so loganalysis and plot worker processes can
+# use it freely.
+#
+# StageTimings records how long each named stage of one job took; MetricsRegistry
+# aggregates stage and request durations across jobs into histograms rendered in the
+# Prometheus text format, optionally summed over several server processes; Profiler
+# optionally profiles a block and keeps the dump only when the block was slow.
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def max_rss_mb():
+    # Process memory high-water mark, or None where the platform doesn't report it
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StageTimings:
+    # Per-job breakdown: one record per stage with wall and CPU seconds, how far the
+    # stage raised the process's peak RSS and, while tracemalloc is tracing (e.g. run
+    # with PYTHONTRACEMALLOC=1), the peak of Python allocations during the stage.
+    # Both memory figures are process-wide, so concurrent jobs can inflate each other's.
+    # Stage names are dotted paths: 'parse', 'parse.decode.ATT', 'plots.attitude'.
+    def __init__(self, stages=None):
+        self.stages = list(stages or [])
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def add(self, name, seconds, **values):
+        record = {'stage': name, 'seconds': round(seconds, 6)}
+        record.update({key: round(value, 6) if isinstance(value, float) else value
+                       for key, value in values.items() if value is not None})
+        with self.lock:
+            self.stages.append(record)
+        return record
+
+    @contextmanager
+    def stage(self, name, **values):
+        # Time the enclosed block as stage `name`; extra values are stored with it
+        frames = self.local.__dict__.setdefault('frames', [])
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            for frame in frames:
+                frame['peak'] = max(frame['peak'], peak)
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            frame = {'start': current, 'peak': current}
+            frames.append(frame)
+        rss_before = max_rss_mb()
+        cpu_start = time.thread_time()
+        start = time.perf_counter()
+        try:
+            yield values
+        finally:
+            seconds = time.perf_counter() - start
+            cpu_seconds = time.thread_time() - cpu_start
+            rss_after = max_rss_mb()
+            if tracing:
+                peak = tracemalloc.get_traced_memory()[1]
+                frames.pop()
+                for outer in frames:
+                    outer['peak'] = max(outer['peak'], peak)
+                values['traced_peak_mb'] = (max(frame['peak'], peak) - frame['start']) / 1024 ** 2
+            if rss_before is not None:
+                values['max_rss_growth_mb'] = rss_after - rss_before
+            self.add(name, seconds, cpu_seconds=cpu_seconds, **values)
+
+    def total(self, name):
+        with self.lock:
+            return sum(record['seconds'] for record in self.stages if record['stage'] == name)
+
+    def as_list(self):
+        with self.lock:
+            return [dict(record) for record in self.stages]
+
+
+# Default histogram buckets in seconds, from a fast cached request to a long job
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(label, '')) for label in self.labels)
+        with self.lock:
+            counts = self.series.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def snapshot(self):
+        with self.lock:
+            return {key: list(counts) for key, counts in self.series.items()}
+
+    @staticmethod
+    def add(total, counts):
+        return [a + b for a, b in zip(total, counts)] if total is not None else list(counts)
+
+    def render(self, series=None):
+        # series: label values -> counts to render instead of this process's own
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        series = self.snapshot() if series is None else series
+        for key, counts in sorted(series.items()):
+            labels = [f'{label}="{_escape(value)}"' for label, value in zip(self.labels, key)]
+            for bound, count in zip(self.buckets + ('+Inf',), counts[:-1]):
+                bucket_labels = ','.join(labels + [f'le="{bound}"'])
+                lines.append(f'{self.name}_bucket{{{bucket_labels}}} {count}')
+            suffix = f'{{{",".join(labels)}}}' if labels else ''
+            lines.append(f'{self.name}_sum{suffix} {counts[-1]}')
+            lines.append(f'{self.name}_count{suffix} {counts[-2]}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(label, '')) for label in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.values)
+
+    @staticmethod
+    def add(total, value):
+        return (total or 0) + value
+
+    def render(self, values=None):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        values = self.snapshot() if values is None else values
+        for key, value in sorted(values.items()):
+            labels = ','.join(f'{label}="{_escape(label_value)}"' for label, label_value in zip(self.labels, key))
+            lines.append(f'{self.name}{{{labels}}} {value}' if labels else f'{self.name} {value}')
+        return lines
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry:
+    # With a folder, several server processes share one set of metrics: each writes a
+    # snapshot of its own with write_snapshot(), and collect()/render() add this
+    # process's live values to the latest snapshot of every other one, so counts outlive
+    # the worker that made them. The folder must be emptied when the server starts.
+    def __init__(self, folder=None):
+        self.metrics = []
+        self.folder = folder
+        self.snapshot_pid = None
+        self.snapshot_name = None
+
+    def histogram(self, name, help, labels=(), buckets=DURATION_BUCKETS):
+        metric = Histogram(name, help, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def _snapshot_name(self):
+        # Named per process (and again in a forked child); the random part keeps a
+        # reused pid from overwriting a dead worker's snapshot
+        if self.snapshot_pid != os.getpid():
+            self.snapshot_pid = os.getpid()
+            self.snapshot_name = f'{os.getpid()}-{os.urandom(4).hex()}.json'
+        return self.snapshot_name
+
+    def write_snapshot(self):
+        if self.folder is None:
+            return
+        snapshot = {metric.name: [[list(key), value] for key, value in metric.snapshot().items()]
+                    for metric in self.metrics}
+        path = os.path.join(self.folder, self._snapshot_name())
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(f'{path}.tmp', path)
+
+    def _other_snapshots(self):
+        if self.folder is None:
+            return []
+        own = self._snapshot_name()
+        snapshots = []
+        for name in os.listdir(self.folder):
+            if name.endswith('.json') and name != own:
+                try:
+                    with open(os.path.join(self.folder, name)) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue  # replaced while listing
+        return snapshots
+
+    def collect(self):
+        # {metric name: {label values: value}} summed over every process
+        others = self._other_snapshots()
+        merged = {}
+        for metric in self.metrics:
+            series = metric.snapshot()
+            for snapshot in others:
+                for key, value in snapshot.get(metric.name, []):
+                    key = tuple(key)
+                    series[key] = metric.add(series.get(key), value)
+            merged[metric.name] = series
+        return merged
+
+    def render(self):
+        # Prometheus text exposition format (version 0.0.4)
+        merged = self.collect()
+        return '\n'.join(line for metric in self.metrics for line in metric.render(merged[metric.name])) + '\n'
+
+
+class Profiler:
+    # Opt-in profiling of a block (a job or a request). mode is 'cprofile' or
+    # 'pyinstrument' (falls back to cProfile if it isn't installed); a dump is written
+    # to `folder` only when the block ran for at least `slow_seconds`.
+    def __init__(self, mode, folder, slow_seconds, logger=None):
+        self.mode = mode
+        self.folder = folder
+        self.slow_seconds = slow_seconds
+        self.logger = logger
+
+    @contextmanager
+    def profile(self, name):
+        profiler = self._start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            if profiler is not None:
+                self._finish(profiler, name, seconds)
+
+    def _start(self):
+        if self.mode == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler as PyinstrumentProfiler
+            except ImportError:
+                if self.logger:
+                    self.logger.warning("pyinstrument is not installed; profiling with cProfile")
+                self.mode = 'cprofile'
+            else:
+                profiler = PyinstrumentProfiler()
+                profiler.start()
+                return profiler
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ allows one cProfile at a time; another job or request has it
+            return None
+        return profiler
+
+    def _finish(self, profiler, name, seconds):
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        else:
+            profiler.stop()
+        if seconds < self.slow_seconds:
+            return
+        os.makedirs(self.folder, exist_ok=True)
+        base = os.path.join(self.folder, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}")
+        if isinstance(profiler, cProfile.Profile):
+            # Binary stats for snakeviz/pstats plus the top functions as text
+            profiler.dump_stats(f'{base}.prof')
+            text = io.StringIO()
+            pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(40)
+            with open(f'{base}.txt', 'w') as f:
+                f.write(text.getvalue())
+            path = f'{base}.prof'
+        else:
+            path = f'{base}.html'
+            with open(path, 'w') as f:
+                f.write(profiler.output_html())
+        if self.logger:
+            self.logger.info("Profile of %s (%.1f s) written to %s", name, seconds, path)
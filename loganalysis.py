@@ -0,0 +1,777 @@
+#!/usr/bin/env python3
+# Log parsing, plotting, flight summaries and anonymization. This module has no
+# import-time side effects (no database, folders or web app), so the Flask app, the
+# batch CLI and plot worker processes can all import it cheaply.
+import multiprocessing
+import os
+import re
+import shutil
+import threading
+import time
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from array import array
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from dataflash import DataFlashLog
+from instrumentation import StageTimings
+
+def get_time_from_msg(msg):
+    if hasattr(msg, 'time_boot_ms'):
+        return msg.time_boot_ms / 1000.0
+    if hasattr(msg, 'TimeUS'):
+        return msg.TimeUS / 1e6
+    return None
+
+# Parsing engine for .BIN logs: 'dataflash' (memory-mapped bulk decoder) or 'pymavlink'
+# (message-at-a-time). Text .log files are always read with pymavlink.
+PARSE_ENGINE = os.environ.get('LOG_PARSE_ENGINE', 'dataflash')
+
+class TelemetrySeries:
+    # Columnar store for one message stream: a float64 'Time' column plus one float32
+    # column per field, kept in typed growable arrays while the log is parsed (or in
+    # NumPy arrays when decoded in bulk). Indexing returns a NumPy view over the column
+    # buffer, so plotting consumes the samples without converting or copying them.
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self.columns = {'Time': array('d')}
+        for field in self.fields:
+            self.columns[field] = array('f')
+        self.paths = {}  # column -> .npy file for columns memory-mapped from the parse cache
+
+    def append(self, t, *values):
+        self.columns['Time'].append(t)
+        for field, value in zip(self.fields, values):
+            self.columns[field].append(value)
+
+    @classmethod
+    def from_columns(cls, fields, time, values):
+        series = cls(fields)
+        series.columns['Time'] = np.asarray(time, dtype=np.float64)
+        for field, column in zip(series.fields, values):
+            series.columns[field] = np.asarray(column, dtype=np.float32)
+        return series
+
+    def __getitem__(self, key):
+        return np.asarray(self.columns[key])
+
+    def __len__(self):
+        return len(self.columns['Time'])
+
+    # Columns memory-mapped from the parse cache are pickled as their file paths, so plot
+    # worker processes map the same pages instead of receiving copies of the samples
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['columns'] = {name: column for name, column in self.columns.items() if name not in self.paths}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for name, path in self.paths.items():
+            self.columns[name] = np.load(path, mmap_mode='r')
+
+# Message registry. Each entry is a log message type the analyser decodes: the fields it
+# keeps (renamed where the log's column name differs) and, for multi-instance sensors,
+# the column that tells instances apart. Parsing, the parse cache, flight summaries and
+# figures (PLOTS below) all work from this table, so supporting a new message type is
+# one entry here plus any figures that show it. Parsed data is a dict keyed by message
+# type holding a TelemetrySeries, or {instance: TelemetrySeries} for instanced types.
+class MessageSpec:
+    def __init__(self, name, fields, sources=None, instance_field=None, instances=None, description=''):
+        self.name = name
+        self.fields = list(fields)
+        self.sources = list(sources or fields)  # log column for each field
+        self.instance_field = instance_field
+        self.instances = list(instances) if instance_field else None
+        self.description = description
+
+    def empty(self):
+        if self.instance_field is None:
+            return TelemetrySeries(self.fields)
+        return {instance: TelemetrySeries(self.fields) for instance in self.instances}
+
+    def from_columns(self, columns):
+        # Series from a dict of decoded log columns; records with a zero timestamp are
+        # dropped, as in the message-by-message parser
+        required = ['TimeUS'] + self.sources + ([self.instance_field] if self.instance_field else [])
+        if any(name not in columns for name in required):
+            return self.empty()
+        time = columns['TimeUS'] / 1e6
+        keep = time != 0
+
+        def select(rows):
+            return TelemetrySeries.from_columns(self.fields, time[rows], [columns[source][rows] for source in self.sources])
+
+        if self.instance_field is None:
+            return select(keep)
+        return {instance: select(keep & (columns[self.instance_field] == instance)) for instance in self.instances}
+
+MESSAGES = {spec.name: spec for spec in [
+    MessageSpec('ATT', ['Roll', 'Pitch', 'Yaw', 'DesRoll', 'DesPitch', 'DesYaw'], description="Attitude"),
+    MessageSpec('RATE', ['R', 'P', 'Y', 'RDes', 'PDes', 'YDes'], description="Body rates"),
+    MessageSpec('BARO', ['Alt'], instance_field='I', instances=range(2), description="Barometer altitude"),
+    MessageSpec('ESC', ['RPM', 'RawRPM', 'Voltage', 'Current', 'Temp'], sources=['RPM', 'RawRPM', 'Volt', 'Curr', 'Temp'],
+                instance_field='Instance', instances=range(4), description="ESC telemetry"),
+    MessageSpec('BAT', ['Volt', 'Curr', 'Temp'], description="Battery"),
+    MessageSpec('GPA', ['HAcc', 'SAcc', 'VAcc'], description="GPS accuracy"),
+    MessageSpec('VIBE', ['VibeX', 'VibeY', 'VibeZ', 'Clip'], description="Vibration and clipping"),
+    MessageSpec('RCIN', ['C1', 'C2', 'C3', 'C4'], description="RC input"),
+    MessageSpec('RCOU', ['C1', 'C2', 'C3', 'C4'], description="RC output"),
+    MessageSpec('XKF4', ['SV', 'SP', 'SH', 'SM', 'SVT'], description="EKF innovations"),
+]}
+
+# Message types decoded by default. Every other record in the log (IMU, GPS, PARM, ...)
+# is skipped without being unpacked: the bulk decoder reads only the requested types'
+# columns from its offset index, and the pymavlink reader jumps between the requested
+# types' records through its own index (see parse_log).
+PLOT_MESSAGE_TYPES = list(MESSAGES)
+
+def select_message_types(message_types=None):
+    # Registry-ordered list of the requested types (None = all); unknown names are an error
+    if message_types is None:
+        return list(PLOT_MESSAGE_TYPES)
+    unknown = set(message_types) - set(MESSAGES)
+    if unknown:
+        raise ValueError(f"Unknown message types: {', '.join(sorted(unknown))}")
+    return [name for name in MESSAGES if name in message_types]
+
+def iter_streams(data):
+    # (stream name, series) for every series in parsed data: 'ATT', 'BARO.0', 'ESC.2', ...
+    for name, value in data.items():
+        if isinstance(value, dict):
+            for instance, series in value.items():
+                yield f"{name}.{instance}", series
+        else:
+            yield name, value
+
+def parse_dataflash_log(logfile, message_types=None, progress_callback=None, timings=None):
+    timings = timings or StageTimings()
+    with timings.stage('parse.index'):
+        log = DataFlashLog(logfile, progress_callback=progress_callback)
+    with log:
+        return read_dataflash_series(log, message_types, timings)
+
+def read_dataflash_series(log, message_types=None, timings=None):
+    # Decode the requested message types from an indexed DataFlashLog; each type's
+    # decode is timed as stage parse.decode.<type>
+    timings = timings or StageTimings()
+    data = {}
+    for name in select_message_types(message_types):
+        with timings.stage(f'parse.decode.{name}', records=log.count(name)):
+            data[name] = MESSAGES[name].from_columns(log.read(name))
+    return data
+
+def parse_log(logfile, message_types=None, engine=PARSE_ENGINE, progress_callback=None, timings=None):
+    # Parsed data for the requested message types (None = all in the registry).
+    # progress_callback(bytes_parsed, bytes_total) is called as the log is read; stage
+    # timings are recorded into `timings` (a StageTimings) when given.
+    if engine not in ('dataflash', 'pymavlink'):
+        raise ValueError(f"Unknown parse engine: {engine}")
+    names = select_message_types(message_types)
+    if not names:
+        return {}
+    if engine == 'dataflash' and logfile.endswith('.BIN'):
+        return parse_dataflash_log(logfile, names, progress_callback, timings)
+
+    from pymavlink import DFReader, mavutil  # imported on first use; the bulk decoder doesn't need it
+    timings = timings or StageTimings()
+
+    # Check file extension to determine parsing method
+    with timings.stage('parse.index'):
+        if logfile.endswith('.BIN'):
+            mav = mavutil.mavlink_connection(logfile, robust_parsing=True, dialect='ardupilotmega')
+        elif logfile.endswith('.log'):
+            mav = mavutil.mavlink_connection(logfile, robust_parsing=True, dialect='ardupilotmega')  # Adjust if needed for .log files
+        else:
+            raise ValueError("Unsupported file format")
+
+    # Dispatch table: message type -> (spec, series or {instance: series})
+    data = {name: MESSAGES[name].empty() for name in names}
+    handlers = {name: (MESSAGES[name], data[name]) for name in names}
+
+    # Messages arrive interleaved, so decoding is timed as a whole (parse.decode). With
+    # type=, pymavlink jumps from one requested record to the next through its offset
+    # index and unpacks nothing else. A .BIN index stops at the first record of an
+    # unknown type (a corrupt header), so past that point the rest of the log is read
+    # record by record and picked out by the dispatch table. A .log that isn't a
+    # DataFlash text log is opened as a telemetry log, which has no index to jump
+    # through and would wait for more data at its end if read blocking, so it is read
+    # record by record, without blocking, from the start.
+    indexed = isinstance(mav, DFReader.DFReader)
+    indexed_end = _pymavlink_indexed_end(mav)
+    msg_count = 0
+    with timings.stage('parse.decode') as stage:
+        while True:
+            if not indexed:
+                msg = mav.recv_match()
+            elif indexed_end is not None and mav.offset >= indexed_end:
+                msg = mav.recv_match(blocking=True)
+            else:
+                msg = mav.recv_match(type=list(handlers), blocking=True, strict=True)
+                if msg is None and indexed_end is not None and indexed_end < mav.data_len:
+                    mav.offset, mav.remaining = indexed_end, mav.data_len - indexed_end
+                    continue
+            if msg is None:
+                break
+            msg_count += 1
+            if progress_callback and msg_count % 5000 == 0:
+                progress_callback(mav.offset, mav.data_len)
+            t = get_time_from_msg(msg) or (mav.time if hasattr(mav, 'time') else None)
+            if t is None:
+                continue
+            handler = handlers.get(msg.get_type())
+            if handler is None:
+                continue
+            spec, series = handler
+            if spec.instance_field:
+                series = series.get(getattr(msg, spec.instance_field, None))
+                if series is None:
+                    continue
+            try:
+                values = [getattr(msg, source) for source in spec.sources]
+            except AttributeError:
+                continue  # written by firmware without this field (e.g. BARO without Alt)
+            series.append(t, *values)
+        stage['records'] = msg_count
+
+    if progress_callback:
+        progress_callback(mav.data_len, mav.data_len)
+    return data
+
+def _pymavlink_indexed_end(mav):
+    # Offset just past the last record a pymavlink .BIN reader indexed, or None for
+    # text logs, whose index covers every line
+    if not isinstance(getattr(mav, 'offsets', None), list):
+        return None
+    end = 0
+    for msg_type, offsets in enumerate(mav.offsets):
+        if len(offsets) and msg_type in mav.formats:
+            end = max(end, offsets[-1] + mav.formats[msg_type].len)
+    return end
+
+def _reduce_fields(series_list, fields, reduce=np.fmax.reduce):
+    # Reduce the named fields of every non-empty series to one number, ignoring NaNs
+    partials = [reduce(series[field]) for series in series_list if len(series) for field in fields]
+    if not partials:
+        return None
+    value = float(reduce(np.array(partials, dtype=np.float64)))
+    return value if np.isfinite(value) else None
+
+def _message_series(data, name):
+    # Every series of one message type in parsed data; none if it wasn't parsed
+    value = data.get(name)
+    if value is None:
+        return []
+    return list(value.values()) if isinstance(value, dict) else [value]
+
+# Per-flight summary statistics, computed once when a log is processed and stored in
+# the web app's flight_summaries table (one column each), so the session list and fleet
+# queries never reparse
+FLIGHT_SUMMARY_COLUMNS = ['duration', 'max_altitude', 'min_battery_voltage', 'max_battery_current',
+                          'max_vibration', 'clip_count', 'max_esc_temp',
+                          'max_innov_sv', 'max_innov_sp', 'max_innov_sh', 'max_innov_sm', 'max_innov_svt']
+
+def compute_flight_summary(data):
+    # One NumPy reduction per column over the parsed (memory-mapped) series; values
+    # whose message type wasn't parsed are None
+    streams = [series for _, series in iter_streams(data)]
+    start = _reduce_fields(streams, ['Time'], np.fmin.reduce)
+    end = _reduce_fields(streams, ['Time'])
+    summary = {
+        'duration': end - start if start is not None else None,
+        'max_altitude': _reduce_fields(_message_series(data, 'BARO'), ['Alt']),
+        'min_battery_voltage': _reduce_fields(_message_series(data, 'BAT'), ['Volt'], np.fmin.reduce),
+        'max_battery_current': _reduce_fields(_message_series(data, 'BAT'), ['Curr']),
+        'max_vibration': _reduce_fields(_message_series(data, 'VIBE'), ['VibeX', 'VibeY', 'VibeZ']),
+        'clip_count': _reduce_fields(_message_series(data, 'VIBE'), ['Clip']),  # the log's counter is cumulative
+        'max_esc_temp': _reduce_fields(_message_series(data, 'ESC'), ['Temp']),
+    }
+    for field in ['SV', 'SP', 'SH', 'SM', 'SVT']:
+        summary[f'max_innov_{field.lower()}'] = _reduce_fields(_message_series(data, 'XKF4'), [field])
+    return summary
+
+# Flight analytics: derived signals for judging a tune, computed with whole-array NumPy
+# operations over the parsed columns (no per-sample Python), so an hour of 400 Hz
+# ATT/RATE data takes a fraction of a second per signal. compute_flight_analytics
+# returns a JSON-ready dict:
+#   tracking  RMS and peak error between each measured axis and its setpoint (ATT, RATE)
+#   spectra   Welch power spectra of body rates and vibration, with the peak frequency,
+#             for placing notch filters
+#   esc       RPM imbalance across motors and each motor's mean deviation from the rest
+#   events    anomalies as time ranges: fixed limits (ANOMALY_LIMITS) and robust z-score
+#             outliers (|x - median| > ANOMALY_ZSCORE * 1.4826 * MAD) of ZSCORE_SIGNALS
+TRACKING_AXES = {
+    'ATT': [('Roll', 'DesRoll'), ('Pitch', 'DesPitch'), ('Yaw', 'DesYaw')],
+    'RATE': [('R', 'RDes'), ('P', 'PDes'), ('Y', 'YDes')],
+}
+SPECTRUM_FIELDS = {'RATE': ['R', 'P', 'Y'], 'VIBE': ['VibeX', 'VibeY', 'VibeZ']}
+SPECTRUM_SEGMENT = 1024      # samples per FFT segment (halved overlap, Hann window)
+SPECTRUM_MAX_SEGMENTS = 4096  # longer logs average a stride of segments, bounding memory
+# (message, field, limit, description): values above the limit are events. Vibration
+# above 30 m/s/s degrades position estimates (ArduPilot's guidance); an EKF test ratio
+# above 1 means the measurement was rejected.
+ANOMALY_LIMITS = [
+    ('VIBE', 'VibeX', 30.0, "X vibration above 30 m/s/s"),
+    ('VIBE', 'VibeY', 30.0, "Y vibration above 30 m/s/s"),
+    ('VIBE', 'VibeZ', 30.0, "Z vibration above 30 m/s/s"),
+    ('XKF4', 'SV', 1.0, "EKF velocity innovation rejected"),
+    ('XKF4', 'SP', 1.0, "EKF position innovation rejected"),
+    ('XKF4', 'SH', 1.0, "EKF height innovation rejected"),
+    ('XKF4', 'SM', 1.0, "EKF magnetometer innovation rejected"),
+]
+# Signals checked for outliers: (message, field) of a parsed series, or a tracking
+# error named by its measured axis
+ZSCORE_SIGNALS = [('ATT', 'Roll'), ('ATT', 'Pitch'), ('RATE', 'R'), ('RATE', 'P'), ('RATE', 'Y'),
+                  ('BAT', 'Curr'), ('ESC', 'Temp')]
+ANOMALY_ZSCORE = float(os.environ.get('ANOMALY_ZSCORE', 8))
+ESC_IMBALANCE_LIMIT = 50.0   # percent spread between fastest and slowest motor
+EVENT_MERGE_SECONDS = 1.0    # events of one signal closer than this are merged
+MAX_EVENTS_PER_SIGNAL = 20   # the largest are kept
+
+def tracking_error(series, actual, desired):
+    # Measured minus setpoint; yaw wraps to [-180, 180) degrees
+    error = np.asarray(series[actual], dtype=np.float64) - np.asarray(series[desired], dtype=np.float64)
+    if actual == 'Yaw':
+        error = (error + 180.0) % 360.0 - 180.0
+    return error
+
+def _finite(value):
+    # A float for JSON output: NaN and infinities become None
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+def power_spectrum(time, values, segment=SPECTRUM_SEGMENT):
+    # Welch estimate: the mean periodogram of overlapping Hann-windowed segments, all
+    # transformed in one batched rfft. None if the series is too short, has fewer than
+    # two finite samples, or its timestamps give no positive sample interval.
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n < 64 or np.count_nonzero(np.isfinite(values)) < 2:
+        return None
+    interval = float(np.median(np.diff(np.asarray(time, dtype=np.float64))))
+    if not np.isfinite(interval) or interval <= 0:
+        return None
+    sample_rate = 1.0 / interval
+    segment = min(segment, 1 << int(np.log2(n)))
+    step = max(segment // 2, (n - segment) // SPECTRUM_MAX_SEGMENTS + 1)
+    frames = sliding_window_view(values, segment)[::step]
+    frames = np.nan_to_num(frames - np.nanmean(frames, axis=1, keepdims=True))
+    window = np.hanning(segment)
+    psd = (np.abs(np.fft.rfft(frames * window, axis=1)) ** 2).mean(axis=0) / (sample_rate * (window ** 2).sum())
+    psd[1:-1] *= 2  # one-sided
+    frequency = np.fft.rfftfreq(segment, 1.0 / sample_rate)
+    peak = int(np.argmax(psd[1:])) + 1  # ignore the DC bin
+    return {'sample_rate': sample_rate, 'segment': segment, 'segments': len(frames),
+            'frequency': frequency.round(4).tolist(), 'psd': [_finite(value) for value in psd.astype(np.float32)],
+            'peak_hz': float(frequency[peak]), 'peak_psd': _finite(psd[peak])}
+
+def esc_imbalance(esc_data):
+    # Motor RPMs resampled onto the first motor's timestamps; imbalance is the spread
+    # between the fastest and slowest motor as a percentage of their mean, over samples
+    # where the motors are spinning (mean above 10% of its maximum)
+    motors = [series for series in esc_data.values() if len(series)]
+    if len(motors) < 2:
+        return None, None
+    time = np.asarray(motors[0]['Time'])
+    rpm = np.vstack([np.interp(time, series['Time'], series['RPM']) for series in motors])
+    mean = rpm.mean(axis=0)
+    spinning = mean > 0.1 * np.nanmax(mean) if np.nanmax(mean) > 0 else np.zeros(len(mean), dtype=bool)
+    if not spinning.any():
+        return None, None
+    imbalance = np.zeros(len(mean))
+    imbalance[spinning] = (rpm[:, spinning].max(axis=0) - rpm[:, spinning].min(axis=0)) / mean[spinning] * 100
+    deviation = (rpm[:, spinning] / mean[spinning] - 1).mean(axis=1) * 100
+    summary = {'motors': len(motors), 'mean_imbalance_pct': float(imbalance[spinning].mean()),
+               'p95_imbalance_pct': float(np.percentile(imbalance[spinning], 95)),
+               'max_imbalance_pct': float(imbalance.max()), 'motor_deviation_pct': deviation.round(2).tolist(),
+               'worst_motor': int(np.argmax(np.abs(deviation)))}
+    return summary, (time, imbalance)
+
+def mask_events(time, mask, score, merge_seconds=EVENT_MERGE_SECONDS, limit=MAX_EVENTS_PER_SIGNAL):
+    # Runs of True in `mask` as (start time, end time, peak |score|), runs closer than
+    # merge_seconds joined; the `limit` runs with the largest peaks, in time order
+    if not mask.any():
+        return []
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    starts, ends = edges[::2], edges[1::2] - 1
+    keep = np.concatenate(([True], time[starts[1:]] - time[ends[:-1]] > merge_seconds))
+    last = np.concatenate((np.flatnonzero(keep)[1:] - 1, [len(ends) - 1]))
+    starts, ends = starts[keep], ends[last]
+    # Peak |score| of each merged run; samples outside the mask count as zero
+    peaks = np.fmax.reduceat(np.where(mask, np.abs(score), 0), starts)
+    order = np.sort(np.argsort(peaks)[::-1][:limit])
+    return [(float(time[starts[i]]), float(time[ends[i]]), float(peaks[i])) for i in order]
+
+def robust_zscore(values):
+    values = np.asarray(values, dtype=np.float64)
+    median = np.nanmedian(values)
+    mad = np.nanmedian(np.abs(values - median)) * 1.4826
+    if not np.isfinite(mad) or mad == 0:
+        return None
+    return (values - median) / mad
+
+def compute_flight_analytics(data):
+    # Analytics over whichever message types were parsed (see the comment above)
+    analytics = {'tracking': {}, 'spectra': {}, 'esc': None, 'events': []}
+    events = analytics['events']
+    errors = {}
+    for name, axes in TRACKING_AXES.items():
+        series = data.get(name)
+        if series is None or not len(series):
+            continue
+        analytics['tracking'][name] = {}
+        for actual, desired in axes:
+            error = tracking_error(series, actual, desired)
+            errors[name, actual] = error
+            analytics['tracking'][name][actual] = {'rms': _finite(np.sqrt(np.nanmean(error ** 2))),
+                                                   'max': _finite(np.nanmax(np.abs(error))),
+                                                   'unit': 'deg' if name == 'ATT' else 'deg/s'}
+
+    for name, fields in SPECTRUM_FIELDS.items():
+        series = data.get(name)
+        if series is None:
+            continue
+        for field in fields:
+            spectrum = power_spectrum(series['Time'], series[field])
+            if spectrum is not None:
+                analytics['spectra'][f"{name}.{field}"] = spectrum
+
+    def add_events(stream, field, time, mask, score, kind, message, limit=None):
+        for start, end, peak in mask_events(np.asarray(time), mask, score):
+            events.append({'start': start, 'end': end, 'stream': stream, 'field': field, 'kind': kind,
+                           'peak': peak, 'limit': limit, 'message': message})
+
+    if isinstance(data.get('ESC'), dict):
+        analytics['esc'], imbalance = esc_imbalance(data['ESC'])
+        if imbalance is not None:
+            time, percent = imbalance
+            add_events('ESC.0', 'RPM', time, percent > ESC_IMBALANCE_LIMIT, percent, 'limit',
+                       f"ESC RPM imbalance above {ESC_IMBALANCE_LIMIT:g}%", ESC_IMBALANCE_LIMIT)
+
+    for name, field, limit, message in ANOMALY_LIMITS:
+        series = data.get(name)
+        if series is not None and len(series):
+            values = np.asarray(series[field], dtype=np.float64)
+            add_events(name, field, series['Time'], values > limit, values, 'limit', message, limit)
+    series = data.get('VIBE')
+    if series is not None and len(series) > 1:
+        # The clip counter is cumulative; every increase is an accelerometer clipping
+        clips = np.diff(np.asarray(series['Clip'], dtype=np.float64), prepend=series['Clip'][0])
+        add_events('VIBE', 'Clip', series['Time'], clips > 0, clips, 'limit', "Accelerometer clipping", 0)
+
+    for name, field in ZSCORE_SIGNALS:
+        value = data.get(name)
+        for stream, series in ([(name, value)] if not isinstance(value, dict)
+                               else [(f"{name}.{i}", s) for i, s in (value or {}).items()]):
+            if series is None or len(series) < 2:
+                continue
+            tracking = (name, field) in errors
+            score = robust_zscore(errors[name, field] if tracking else series[field])
+            if score is None:
+                continue
+            label = f"{field} tracking error" if tracking else field
+            add_events(stream, field, series['Time'], np.abs(score) > ANOMALY_ZSCORE, score, 'zscore',
+                       f"{stream} {label} outlier (|z| > {ANOMALY_ZSCORE:g})")
+    events.sort(key=lambda event: event['start'])
+    return analytics
+
+# Plot rendering. Every figure is an independent task drawn with matplotlib's
+# object-oriented API (no pyplot global state), so the tasks can run concurrently in a
+# pool of PLOT_WORKERS processes. PLOT_WORKERS=1 renders in-process. The workers are
+# started by a forkserver (spawned where there is none) that has imported only this
+# module: forking the multithreaded web server itself could copy a lock some other
+# thread holds into the child, where it would stay locked forever.
+PLOT_WORKERS = int(os.environ.get('PLOT_WORKERS', os.cpu_count() or 1))
+# Lines are reduced to a min/max envelope of PLOT_POINTS buckets before drawing
+# (0 draws every sample). Figures are ~1200 px wide, so 2000 buckets are visually lossless.
+PLOT_POINTS = int(os.environ.get('PLOT_POINTS', 2000))
+plot_executor = None
+plot_executor_lock = threading.Lock()
+
+def get_plot_executor():
+    global plot_executor
+    with plot_executor_lock:
+        if plot_executor is None:
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload([__name__])
+            else:
+                context = multiprocessing.get_context('spawn')
+            plot_executor = ProcessPoolExecutor(max_workers=PLOT_WORKERS, mp_context=context)
+        return plot_executor
+
+def discard_plot_executor(executor):
+    # A worker died (OOM-killed, crashed), which breaks the whole pool; the next
+    # get_plot_executor starts a new one
+    global plot_executor
+    with plot_executor_lock:
+        if plot_executor is executor:
+            plot_executor = None
+    executor.shutdown(wait=False)
+
+def minmax_decimate(time, values, buckets):
+    # Split the samples into `buckets` equal runs and keep each run's minimum and
+    # maximum in time order, so spikes and transients survive the reduction
+    n = len(values)
+    if buckets <= 0 or n <= 2 * buckets:
+        return time, values
+    size = -(-n // buckets)
+    full = n // size
+    blocks = np.asarray(values[:full * size]).reshape(full, size)
+    starts = np.arange(full) * size
+    picks = np.stack([starts + blocks.argmin(axis=1), starts + blocks.argmax(axis=1)], axis=1)
+    if full * size < n:
+        tail = np.asarray(values[full * size:])
+        picks = np.vstack([picks, [full * size + tail.argmin(), full * size + tail.argmax()]])
+    index = np.sort(picks, axis=1).ravel()
+    return time[index], values[index]
+
+# Figure registry. A figure is a PlotSpec: the message type it shows, its size and a
+# stack of Panels (one subplot each), each drawing Lines of that message's fields.
+# Per-instance figures (ESC) are drawn once per instance, with '{instance}' in the key
+# and titles filled in. Figures whose lines are all empty are skipped, so a log (or an
+# upload restricted to some message types) only gets the figures it has data for.
+class Line:
+    def __init__(self, field, instance=None, **style):
+        self.field = field
+        self.instance = instance  # fixed instance of an instanced message (None = the figure's)
+        self.style = style        # matplotlib line style; label defaults to the field name
+
+class Panel:
+    def __init__(self, lines, ylabel, title):
+        self.lines = lines
+        self.ylabel = ylabel
+        self.title = title
+
+class PlotSpec:
+    def __init__(self, key, title, message, figsize, panels, per_instance=False):
+        self.key = key
+        self.title = title  # tab label in the results page
+        self.message = message
+        self.figsize = figsize
+        self.panels = panels
+        self.per_instance = per_instance
+
+    def figures(self, value):
+        # (key, tab title, [(ylabel, title, [(series, field, style)])]) per figure drawn
+        # from this message's parsed series
+        for instance, series in (value.items() if self.per_instance else [(None, value)]):
+            panels = []
+            for panel in self.panels:
+                lines = [(series if line.instance is None else series[line.instance], line.field, line.style)
+                         for line in panel.lines]
+                panels.append((panel.ylabel.format(instance=instance), panel.title.format(instance=instance), lines))
+            yield self.key.format(instance=instance), self.title.format(instance=instance), panels
+
+def _tracking_panels(axes, unit):
+    # One panel per axis comparing the measured value (solid) with its setpoint (dashed)
+    return [Panel([Line(actual, color=color), Line(desired, color=desired_color, linestyle='--')],
+                  f"{actual} ({unit})", f"{actual} and {desired} vs Time")
+            for actual, desired, color, desired_color in axes]
+
+def _single_panel(fields, ylabel, title, colors=None):
+    # Several fields on one set of axes; without colors lines take the default cycle
+    colors = colors or [None] * len(fields)
+    return [Panel([Line(field, **({'color': color} if color else {})) for field, color in zip(fields, colors)],
+                  ylabel, title)]
+
+PLOTS = [
+    PlotSpec('attitude', "Attitude", 'ATT', (12, 12), _tracking_panels(
+        [('Roll', 'DesRoll', 'red', 'black'), ('Pitch', 'DesPitch', 'green', 'blue'),
+         ('Yaw', 'DesYaw', 'orange', 'black')], 'Degrees')),
+    PlotSpec('rate', "Rate", 'RATE', (12, 12), _tracking_panels(
+        [('R', 'RDes', 'red', 'purple'), ('P', 'PDes', 'green', 'blue'), ('Y', 'YDes', 'orange', 'black')], 'Degrees/s')),
+    PlotSpec('altitude', "Altitude", 'BARO', (12, 10), [
+        Panel([Line('Alt', 0, label='Altitude0', color='black'), Line('Alt', 1, label='Altitude1', color='purple')],
+              "Altitude (m)", "Altitude vs Time")]),
+    PlotSpec('esc_{instance}', "ESC {instance}", 'ESC', (12, 12), [
+        Panel([Line(field, color=f'C{i}')], field, f"ESC{{instance}} {field} vs Time")
+        for i, field in enumerate(['RPM', 'RawRPM', 'Voltage', 'Current', 'Temp'], start=1)], per_instance=True),
+    PlotSpec('battery', "Battery", 'BAT', (10, 8), [
+        Panel([Line(field, label=label, color=color)], ylabel, f"Battery {label} vs Time")
+        for field, label, color, ylabel in [('Volt', 'Voltage', 'blue', "Voltage (V)"),
+                                            ('Curr', 'Current', 'green', "Current (A)"),
+                                            ('Temp', 'Temperature', 'red', "Temperature (°C)")]]),
+    PlotSpec('gpa', "GPS Accuracy", 'GPA', (10, 6),
+             _single_panel(['HAcc', 'SAcc', 'VAcc'], "Accuracy", "GPA Data vs Time", ['blue', 'green', 'red'])),
+    PlotSpec('vibe', "Vibration", 'VIBE', (10, 6),
+             _single_panel(['VibeX', 'VibeY', 'VibeZ', 'Clip'], "Vibration", "VIBE Data vs Time",
+                           ['blue', 'green', 'red', 'purple'])),
+    PlotSpec('rcin', "RC In", 'RCIN', (10, 6), _single_panel(['C1', 'C2', 'C3', 'C4'], "RCIN Channels", "RCIN Data vs Time")),
+    PlotSpec('rcou', "RC Out", 'RCOU', (10, 6), _single_panel(['C1', 'C2', 'C3', 'C4'], "RCOU Channels", "RCOU Data vs Time")),
+    PlotSpec('xkf4', "EKF Innovations", 'XKF4', (10, 6),
+             _single_panel(['SV', 'SP', 'SH', 'SM', 'SVT'], "XKF4 Values", "XKF4 Data vs Time")),
+]
+
+def _plot_line(ax, series, field, **style):
+    time, values = minmax_decimate(series['Time'], series[field], PLOT_POINTS)
+    style.setdefault('label', field)
+    ax.plot(time, values, **style)
+
+def draw_panels(fig, panels):
+    # Stack the panels of one figure, each a subplot with its lines, labels and legend
+    for i, (ylabel, title, lines) in enumerate(panels, start=1):
+        ax = fig.add_subplot(len(panels), 1, i)
+        for series, field, style in lines:
+            _plot_line(ax, series, field, **style)
+        ax.set_xlabel("Time (s)")
+        ax.set_ylabel(ylabel)
+        ax.set_title(title)
+        ax.legend()
+        ax.grid()
+
+def render_figure(path, figsize, draw, args):
+    fig = Figure(figsize=figsize)
+    draw(fig, *args)
+    fig.tight_layout()
+    fig.savefig(path)
+    return path
+
+def timed_render_figure(path, figsize, draw, args):
+    # render_figure plus the time it took in whichever process drew it
+    start, cpu_start = time.perf_counter(), time.thread_time()
+    render_figure(path, figsize, draw, args)
+    return path, time.perf_counter() - start, time.thread_time() - cpu_start
+
+def plot_figures(data):
+    # (key, tab title, figure size, panels) for every figure with data, in PLOTS order
+    for spec in PLOTS:
+        if spec.message not in data:
+            continue
+        for key, title, panels in spec.figures(data[spec.message]):
+            if any(len(series) for _, _, lines in panels for series, _, _ in lines):
+                yield key, title, spec.figsize, panels
+
+def plot_titles(message_types=None):
+    # {plot key: tab title} for every figure the given message types can produce
+    data = {name: MESSAGES[name].empty() for name in select_message_types(message_types)}
+    return {key: title for spec in PLOTS if spec.message in data
+            for key, title, _ in spec.figures(data[spec.message])}
+
+def figure_tasks(data):
+    # (plot key, figure size, draw function, draw arguments) for each figure to render
+    return [(key, figsize, draw_panels, (panels,)) for key, _, figsize, panels in plot_figures(data)]
+
+def generate_plots(data, plot_dir, progress_callback=None, workers=None, timings=None):
+    # Render the figures for parsed `data` (see parse_log) into plot_dir.
+    # progress_callback(figures_done, figures_total) is called as figures finish;
+    # workers=1 renders in-process whatever PLOT_WORKERS is set to. Each figure's render
+    # time is recorded as stage plots.render.<key> in `timings`; with several workers these
+    # overlap, so they add up to more than the wall time.
+    workers = PLOT_WORKERS if workers is None else workers
+    timings = timings or StageTimings()
+    if os.path.exists(plot_dir):
+        shutil.rmtree(plot_dir)
+    os.makedirs(plot_dir)
+
+    tasks = figure_tasks(data)
+    plot_files = {}
+
+    def finished(key, result):
+        path, seconds, cpu_seconds = result
+        timings.add(f'plots.render.{key}', seconds, cpu_seconds=cpu_seconds)
+        plot_files[key] = path
+        if progress_callback:
+            progress_callback(len(plot_files), len(tasks))
+
+    def render(key, figsize, draw, args):
+        return timed_render_figure(os.path.join(plot_dir, f'{key}.png'), figsize, draw, args)
+
+    if workers <= 1:
+        for task in tasks:
+            finished(task[0], render(*task))
+    else:
+        executor = get_plot_executor()
+        try:
+            futures = {executor.submit(timed_render_figure, os.path.join(plot_dir, f'{task[0]}.png'), *task[1:]): task
+                       for task in tasks}
+        except BrokenProcessPool:
+            # Broken since its last use; replace it and draw this set in-process
+            discard_plot_executor(executor)
+            futures = {}
+            for task in tasks:
+                finished(task[0], render(*task))
+        for future in as_completed(futures):
+            task = futures[future]
+            try:
+                result = future.result()
+            except OSError:
+                # A cache file vanished under the worker (evicted); draw from our own maps
+                result = render(*task)
+            except BrokenProcessPool:
+                # A worker died mid-render; finish in-process, later jobs get a new pool
+                discard_plot_executor(executor)
+                result = render(*task)
+            finished(task[0], result)
+
+    return plot_files
+
+# GPS position fields removed by anonymize_gps_log. Every message type declaring
+# ANONYMIZE_POSITION_COLUMNS in its FMT record has them zeroed, plus the other fields
+# ANONYMIZE_FIELDS lists for its prefix (GPS altitude). ANONYMIZE_FIELDS also gives the
+# fields' indexes in the comma-separated line for text logs without FMT lines.
+ANONYMIZE_FIELDS = {
+    "GPS":   {"Lat": 7, "Lng": 8, "Alt": 9},
+    "AHR2":  {"Lat": 6, "Lng": 7},
+    "EAHR":  {"Lat": 5, "Lng": 6},  # assumed
+    "POS":   {"Lat": 2, "Lng": 3},  # ✅ corrected
+    "TERR":  {"Lat": 3, "Lng": 4},  # ✅ corrected
+    "ORGN":  {"Lat": 3, "Lng": 4}
+}
+ANONYMIZE_POSITION_COLUMNS = {'Lat', 'Lng'}
+# One compiled dispatch instead of a startswith() per prefix per line; alternation order
+# keeps the first-listed prefix winning, as before
+ANONYMIZE_PREFIX = re.compile(r'\s*(' + '|'.join(re.escape(prefix) for prefix in ANONYMIZE_FIELDS) + ')')
+ANONYMIZE_BUFFER = 1024 * 1024
+
+def anonymize_columns(name, columns):
+    # The columns of message type `name` (declared as `columns`) to zero
+    match = ANONYMIZE_PREFIX.match(name)
+    listed = ANONYMIZE_FIELDS[match.group(1)] if match else {}
+    return [column for column in columns if column in ANONYMIZE_POSITION_COLUMNS or column in listed]
+
+def anonymize_gps_log(input_path, output_path):
+    if input_path.endswith('.BIN'):
+        return anonymize_dataflash_log(input_path, output_path)
+
+    # Stream line by line so memory stays constant whatever the log size. FMT lines
+    # (which precede the messages they describe) give each type's field indexes.
+    zero_indexes = {}  # message type -> indexes in the split line
+    with open(input_path, 'r', buffering=ANONYMIZE_BUFFER) as fin, \
+            open(output_path, 'w', buffering=ANONYMIZE_BUFFER) as fout:
+        for line in fin:
+            name = line[:line.find(',')].strip()
+            indexes = zero_indexes.get(name)
+            if name == 'FMT':
+                parts = [part.strip() for part in line.split(',')]
+                if len(parts) > 5:
+                    columns = parts[5:]
+                    zero_indexes[parts[3]] = [columns.index(column) + 1
+                                              for column in anonymize_columns(parts[3], columns)]
+            elif indexes is None:
+                match = ANONYMIZE_PREFIX.match(line)
+                if match:
+                    indexes = list(ANONYMIZE_FIELDS[match.group(1)].values())
+            if indexes:
+                parts = line.strip().split(',')
+                for index in indexes:
+                    if len(parts) > index:
+                        parts[index] = "0"
+                line = ','.join(parts) + '\n'
+            fout.write(line)
+
+def anonymize_dataflash_log(input_path, output_path):
+    # Binary logs are rewritten in place: the copy is memory-mapped read-write, the
+    # record index and FMT layouts give each position field's byte offset, and the
+    # fields are zeroed across all records of a type at once
+    if os.path.abspath(input_path) != os.path.abspath(output_path):
+        shutil.copyfile(input_path, output_path)
+    with DataFlashLog(output_path, writable=True) as log:
+        for fmt in log.formats.values():
+            columns = anonymize_columns(fmt.name, fmt.columns)
+            if columns:
+                log.zero_columns(fmt.name, columns)
+        log.flush()
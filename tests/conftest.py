@@ -0,0 +1,53 @@
+import os
+import sys
+import pytest
+
+# The app's modules, and synthlog's synthetic DataFlash logs from benchmarks/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+from synthlog import generate_log
+
+
+@pytest.fixture(scope='session')
+def synthetic_log(tmp_path_factory):
+    # synthetic_log(seconds, seed=0, extension='.BIN') -> path of a synthetic log,
+    # generated once per session and shared, so tests must not modify it (copy it
+    # first). The app's caches are keyed by log content: a test that needs a log no
+    # other test has processed picks a seed of its own.
+    folder = tmp_path_factory.mktemp('logs')
+
+    def make(seconds, seed=0, extension='.BIN'):
+        path = str(folder / f'{seconds}s-seed{seed}{extension}')
+        if not os.path.exists(path):
+            generate_log(path, seconds, seed=seed)
+        return path
+    return make
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    # The web app keeps its database and folders relative to the working directory,
+    # so it is imported once, in a throwaway directory the tests then run in
+    os.chdir(tmp_path_factory.mktemp('app'))
+    import LogAnalyserApp
+    return LogAnalyserApp
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def user_client(app_module, client):
+    # A test client logged in as a fresh user; the user's id is client.user_id
+    with app_module.db_connection() as conn:
+        github_id = os.urandom(8).hex()
+        conn.execute('INSERT INTO users (github_id, username) VALUES (?, ?)', (github_id, github_id))
+        conn.commit()
+        client.user_id = conn.execute('SELECT id FROM users WHERE github_id = ?', (github_id,)).fetchone()[0]
+    with client.session_transaction() as session:
+        session['_user_id'] = str(client.user_id)
+        session['_fresh'] = True
+    return client
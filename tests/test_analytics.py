@@ -0,0 +1,56 @@
+# Power spectra are only estimated from usable series, and never carry NaN or
+# infinity into the analytics JSON; the session page shows what is missing as n/a.
+import json
+import os
+import numpy as np
+import pytest
+
+from loganalysis import power_spectrum
+
+TIME = np.arange(512) / 100.0
+SIGNAL = np.sin(2 * np.pi * 12.5 * TIME)
+
+
+def test_spectrum_finds_peak():
+    spectrum = power_spectrum(TIME, SIGNAL)
+    assert spectrum['sample_rate'] == pytest.approx(100)
+    assert spectrum['peak_hz'] == pytest.approx(12.5, abs=0.5)
+
+
+@pytest.mark.parametrize('time, values', [
+    (np.zeros(512), SIGNAL),                                   # zero sample interval
+    (TIME[::-1], SIGNAL),                                      # time running backwards
+    (np.full(512, np.nan), SIGNAL),                            # no timestamps
+    (TIME, np.full(512, np.nan)),                              # no samples
+    (TIME, np.where(np.arange(512) == 7, 1.0, np.nan)),        # a single sample
+    (TIME[:32], SIGNAL[:32]),                                  # too short
+], ids=['zero-interval', 'backwards', 'nan-time', 'nan-values', 'one-sample', 'short'])
+def test_no_spectrum_from_unusable_series(time, values):
+    assert power_spectrum(time, values) is None
+
+
+@pytest.mark.filterwarnings('ignore:overflow encountered')
+def test_spectrum_is_valid_json():
+    # Sparse samples, and a PSD too large for the float32 it is stored as
+    sparse = np.where(np.arange(512) % 50 == 0, SIGNAL, np.nan)
+    for values in [sparse, SIGNAL * 1e30]:
+        json.dumps(power_spectrum(TIME, values), allow_nan=False)
+
+
+def test_session_page_renders_missing_tracking_error(app_module, user_client, synthetic_log, monkeypatch):
+    # Tracking error is None when every sample of an axis is NaN
+    path = synthetic_log(20, seed=3)
+    with app_module.db_connection() as conn:
+        session_id = conn.execute('INSERT INTO sessions (user_id, log_file, created_at) VALUES (?, ?, ?)',
+                                  (user_client.user_id, path, '2026-01-01')).lastrowid
+        conn.commit()
+    monkeypatch.setattr(app_module, 'submit_job', lambda job_id: None)
+    monkeypatch.setattr(app_module, 'generate_plots', lambda data, out_dir, **kwargs: os.makedirs(out_dir) or {})
+    app_module.run_job(app_module.enqueue_job(session_id, user_client.user_id))
+    analytics = app_module.read_flight_analytics(session_id)
+    analytics['tracking'] = {'ATT': {'Roll': {'rms': None, 'max': None, 'unit': 'deg'}}}
+    app_module.store_flight_analytics(session_id, analytics)
+
+    response = user_client.get(f'/session/{session_id}')
+    assert response.status_code == 200
+    assert b'n/a' in response.data
@@ -0,0 +1,76 @@
+# Anonymization zeroes the same fields in text and binary logs: Lat and Lng of every
+# message type declaring them, and the GPS altitude, leaving everything else intact.
+# Uploads write each anonymized copy to its own file inside the upload folder.
+import os
+import numpy as np
+import pytest
+
+import synthlog
+from dataflash import DataFlashLog
+from loganalysis import anonymize_gps_log
+
+# A position-carrying type no prefix in ANONYMIZE_FIELDS covers, with its own altitude
+EXTRA_TYPE = ('SIM', (140, 'QccCfLLf', 'TimeUS,Roll,Pitch,Yaw,Alt,Lat,Lng,Q1', 10, 1))
+ZEROED = {'GPS': {'Lat', 'Lng', 'Alt'}, 'SIM': {'Lat', 'Lng'}}
+
+
+def read_text_log(path):
+    # {type: {column: values}} from a text log's FMT and message lines
+    columns, values = {}, {}
+    for line in open(path):
+        parts = [part.strip() for part in line.split(',')]
+        if parts[0] == 'FMT':
+            columns[parts[3]] = parts[5:]
+        elif parts[0] in columns:
+            for column, value in zip(columns[parts[0]], parts[1:]):
+                values.setdefault(parts[0], {}).setdefault(column, []).append(float(value))
+    return {name: {column: np.array(v) for column, v in fields.items()} for name, fields in values.items()}
+
+
+def read_bin_log(path):
+    with DataFlashLog(path) as log:
+        return {name: {column: np.array(values, dtype=np.float64) for column, values in log.read(name).items()}
+                for name in log.name_to_type if name != 'FMT' and log.count(name)}
+
+
+@pytest.mark.parametrize('extension, read', [('.BIN', read_bin_log), ('.log', read_text_log)])
+def test_position_fields_zeroed(tmp_path, monkeypatch, extension, read):
+    monkeypatch.setitem(synthlog.MESSAGES, *EXTRA_TYPE)
+    original = str(tmp_path / f'flight{extension}')
+    anonymized = str(tmp_path / f'anonymized{extension}')
+    synthlog.generate_log(original, 5)
+    anonymize_gps_log(original, anonymized)
+
+    before, after = read(original), read(anonymized)
+    assert sorted(before) == sorted(after)
+    for name, columns in before.items():
+        for column, values in columns.items():
+            if column in ZEROED.get(name, ()):
+                assert np.any(values != 0), f"{name}.{column}"
+                assert np.all(after[name][column] == 0), f"{name}.{column}"
+            else:
+                np.testing.assert_array_equal(after[name][column], values, err_msg=f"{name}.{column}")
+
+
+def upload_anonymized(app_module, client, path, output_file_name):
+    with open(path, 'rb') as f:
+        response = client.post('/', data={'file': (f, 'flight.BIN'), 'anonymize': 'on',
+                                          'output_file_name': output_file_name})
+    assert response.status_code == 302
+    with app_module.db_connection() as conn:
+        return conn.execute('SELECT log_file FROM sessions WHERE user_id = ? ORDER BY id DESC LIMIT 1',
+                            (client.user_id,)).fetchone()[0]
+
+
+def test_upload_keeps_anonymized_logs_apart(app_module, user_client, synthetic_log, monkeypatch):
+    monkeypatch.setattr(app_module, 'submit_job', lambda job_id: None)
+    upload_folder = os.path.abspath(app_module.app.config['UPLOAD_FOLDER'])
+    paths = []
+    for seed, name in enumerate(['../../escaped', '', '']):
+        paths.append(upload_anonymized(app_module, user_client, synthetic_log(2, seed=seed), name))
+    # Names can't leave the upload folder, and logs anonymized under the same name
+    # don't overwrite each other
+    assert all(os.path.dirname(os.path.abspath(path)) == upload_folder for path in paths)
+    assert paths[0].endswith('escaped.BIN')
+    assert len(set(paths)) == 3 and all(os.path.exists(path) for path in paths)
+    assert not [name for name in os.listdir(upload_folder) if '.tmp-' in name]
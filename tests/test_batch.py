@@ -0,0 +1,60 @@
+# batch.py analyses a folder of logs without the web app: every log gets its plots and
+# summary.json under the output folder, nested logs only with --recursive, and the
+# exit status reports missing logs and bad options.
+import json
+import os
+import shutil
+import subprocess
+import sys
+import pytest
+
+import batch
+from batch import find_logs
+from loganalysis import compute_flight_summary, parse_log
+
+
+@pytest.fixture(scope='module')
+def log_folder(tmp_path_factory, synthetic_log):
+    folder = tmp_path_factory.mktemp('batch')
+    os.makedirs(folder / 'day2')
+    for seed, name in enumerate(['a.BIN', 'b.log', os.path.join('day2', 'c.BIN')]):
+        shutil.copy(synthetic_log(2, seed=20 + seed, extension=os.path.splitext(name)[1]), folder / name)
+    open(folder / 'notes.txt', 'w').close()
+    return str(folder)
+
+
+def run_batch(*args, cwd):
+    return subprocess.run([sys.executable, batch.__file__, *args],
+                          capture_output=True, text=True, cwd=cwd)
+
+
+def test_find_logs(log_folder):
+    assert [os.path.relpath(path, log_folder) for path in find_logs(log_folder)] == ['a.BIN', 'b.log']
+    assert [os.path.relpath(path, log_folder) for path in find_logs(log_folder, recursive=True)] == [
+        'a.BIN', 'b.log', os.path.join('day2', 'c.BIN')]
+
+
+def test_folder_is_analysed(log_folder, tmp_path):
+    output = str(tmp_path / 'out')
+    result = run_batch(log_folder, '--output', output, '--workers', '2', '--recursive', '--messages', 'ATT,BAT',
+                       cwd=str(tmp_path))
+    assert result.returncode == 0, result.stderr
+    assert '3/3 logs' in result.stdout
+    assert sorted(os.listdir(tmp_path)) == ['out']  # no database or upload folders
+    assert sorted(os.listdir(output)) == ['a.BIN', 'b.log', 'day2__c.BIN']
+
+    with open(os.path.join(output, 'a.BIN', 'summary.json')) as f:
+        result = json.load(f)
+    assert result['log'] == os.path.join(log_folder, 'a.BIN')
+    assert result['summary'] == compute_flight_summary(parse_log(os.path.join(log_folder, 'a.BIN'), ['ATT', 'BAT']))
+    assert result['plots'] and sorted(name for name in os.listdir(os.path.join(output, 'a.BIN'))
+                                      if name.endswith('.png')) == result['plots']
+
+
+def test_exit_status(log_folder, tmp_path):
+    empty = tmp_path / 'empty'
+    os.makedirs(empty)
+    result = run_batch(str(empty), cwd=str(tmp_path))
+    assert result.returncode == 1 and 'No .BIN/.log files' in result.stderr
+    result = run_batch(log_folder, '--messages', 'ATT,NOPE', cwd=str(tmp_path))
+    assert result.returncode == 2
@@ -0,0 +1,108 @@
+# Abandoned chunked uploads are deleted once they have received nothing for
+# CHUNKED_UPLOAD_TTL_SECONDS, in the process that held them and in any other. Oversized
+# uploads and chunks are refused, and a log is decoded by its job, from the index built
+# as it arrived, not by the request carrying its last chunk.
+import os
+import time
+import pytest
+
+
+@pytest.fixture(scope='module')
+def log_bytes(synthetic_log):
+    return open(synthetic_log(5), 'rb').read()
+
+
+def start_upload(client, data, received):
+    upload = client.post('/uploads/chunked', json={'filename': 'flight.BIN', 'size': len(data)}).get_json()
+    response = client.put(f"/uploads/chunked/{upload['id']}", data=data[:received], headers={'Upload-Offset': '0'})
+    assert response.get_json()['received'] == received
+    return upload['id']
+
+
+def upload_files(app_module, upload_id):
+    folder = app_module.app.config['PARTIAL_UPLOAD_FOLDER']
+    return sorted(name for name in os.listdir(folder) if name.startswith(upload_id))
+
+
+def age(app_module, upload_id, seconds):
+    for name in upload_files(app_module, upload_id):
+        path = os.path.join(app_module.app.config['PARTIAL_UPLOAD_FOLDER'], name)
+        then = time.time() - seconds
+        os.utime(path, (then, then))
+
+
+def test_upload_picked_up_by_another_process(app_module, user_client, log_bytes):
+    # A process that hasn't seen the upload hashes and indexes what has arrived so far
+    upload_id = start_upload(user_client, log_bytes, 4096)
+    app_module.chunked_uploads.pop(upload_id).close()
+    assert user_client.get(f'/uploads/chunked/{upload_id}').get_json()['received'] == 4096
+    response = user_client.put(f'/uploads/chunked/{upload_id}', data=log_bytes[4096:], headers={'Upload-Offset': '4096'})
+    state = response.get_json()
+    assert state['complete']
+    assert app_module.chunked_uploads[upload_id].digest == app_module.hashlib.sha256(log_bytes).hexdigest()
+
+
+def test_stale_upload_is_expired(app_module, user_client, log_bytes):
+    ttl = app_module.app.config['CHUNKED_UPLOAD_TTL_SECONDS']
+    stale = start_upload(user_client, log_bytes, 4096)
+    fresh = start_upload(user_client, log_bytes, 4096)
+    upload = app_module.chunked_uploads[stale]
+    assert upload.scanner is not None
+    age(app_module, stale, ttl + 60)
+    age(app_module, fresh, ttl - 60)
+
+    app_module.expire_chunked_uploads()
+    assert upload_files(app_module, stale) == []
+    assert stale not in app_module.chunked_uploads
+    assert upload.scanner is None  # index (mmap and descriptor) closed
+    assert user_client.get(f'/uploads/chunked/{stale}').status_code == 404
+
+    assert upload_files(app_module, fresh) == [f'{fresh}.json', f'{fresh}.lock', f'{fresh}.part']
+    response = user_client.put(f'/uploads/chunked/{fresh}', data=log_bytes[4096:], headers={'Upload-Offset': '4096'})
+    assert response.get_json()['complete']
+
+
+def test_upload_expired_by_another_process_is_forgotten(app_module, user_client, log_bytes):
+    upload_id = start_upload(user_client, log_bytes, 4096)
+    upload = app_module.chunked_uploads[upload_id]
+    for name in upload_files(app_module, upload_id):
+        os.remove(os.path.join(app_module.app.config['PARTIAL_UPLOAD_FOLDER'], name))
+
+    app_module.expire_chunked_uploads()
+    assert upload_id not in app_module.chunked_uploads
+    assert upload.scanner is None
+
+
+def test_upload_is_decoded_by_its_job(app_module, user_client, synthetic_log, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(app_module, 'submit_job', submitted.append)
+    monkeypatch.setattr(app_module, 'generate_plots', lambda data, out_dir, **kwargs: os.makedirs(out_dir) or {})
+    data = open(synthetic_log(5, seed=7), 'rb').read()
+    digest = app_module.hashlib.sha256(data).hexdigest()
+
+    upload_id = start_upload(user_client, data, len(data))
+    assert app_module.cached_message_types(digest) == set()  # nothing decoded yet
+    response = user_client.post('/', data={'log_upload_id': upload_id})
+    assert response.status_code == 302 and digest in app_module.uploaded_indexes
+
+    def parse_log(*args, **kwargs):
+        raise AssertionError("log indexed again")
+
+    monkeypatch.setattr(app_module, 'parse_log', parse_log)
+    app_module.run_job(submitted[0])
+    assert app_module.read_job_state(submitted[0])['status'] == 'done'
+    assert digest not in app_module.uploaded_indexes
+    assert app_module.cached_message_types(digest) == set(app_module.PLOT_MESSAGE_TYPES)
+
+
+def test_oversized_uploads_are_refused(app_module, user_client, log_bytes, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'MAX_UPLOAD_BYTES', len(log_bytes) - 1)
+    response = user_client.post('/uploads/chunked', json={'filename': 'flight.BIN', 'size': len(log_bytes)})
+    assert response.status_code == 413
+
+    monkeypatch.setitem(app_module.app.config, 'MAX_UPLOAD_BYTES', len(log_bytes))
+    monkeypatch.setattr(app_module, 'UPLOAD_CHUNK_BYTES', 1024)
+    upload = user_client.post('/uploads/chunked', json={'filename': 'flight.BIN', 'size': len(log_bytes)}).get_json()
+    url = f"/uploads/chunked/{upload['id']}"
+    assert user_client.put(url, data=log_bytes[:1025], headers={'Upload-Offset': '0'}).status_code == 413
+    assert user_client.put(url, data=log_bytes[:1024], headers={'Upload-Offset': '0'}).get_json()['received'] == 1024
@@ -0,0 +1,92 @@
+# The SQLite layer: pooled connections in WAL mode that commit or roll back as a unit
+# and aren't shared with a forked child, migrations that bring a database from the
+# original two tables to the current schema, the indexes behind the session list, and
+# the load_user cache.
+import sqlite3
+import pytest
+
+
+@pytest.fixture
+def legacy_database(tmp_path):
+    # A database as the app created it before schema versioning
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, github_id TEXT UNIQUE, username TEXT)')
+    conn.execute('''CREATE TABLE sessions (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, log_file TEXT,
+                    markdown_file TEXT, videos TEXT, created_at TIMESTAMP)''')
+    conn.execute("INSERT INTO users (github_id, username) VALUES ('1', 'pilot')")
+    conn.execute("INSERT INTO sessions (user_id, log_file, created_at) VALUES (1, 'uploads/1_flight.BIN', '2024-01-01')")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def columns(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def test_pooled_connections(app_module, tmp_path):
+    pool = app_module.ConnectionPool(str(tmp_path / 'pool.db'), 1)
+    with pool.connection() as conn:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+        conn.execute('CREATE TABLE t (x INTEGER)')
+        with pool.connection() as other:
+            assert other is not conn
+    assert pool.idle == [other]  # the first one back is kept, the second closed
+    with pool.connection() as conn:
+        assert conn is other
+
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            conn.execute('INSERT INTO t VALUES (1)')
+            raise RuntimeError
+    with pool.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0  # rolled back
+
+    # A forked child opens connections of its own
+    pool.pid = -1
+    with pool.connection() as child:
+        assert child is not conn
+    assert pool.inherited == [conn] and pool.idle == [child]
+
+
+def test_legacy_database_is_migrated(app_module, legacy_database, monkeypatch):
+    monkeypatch.setattr(app_module, 'db_pool', app_module.ConnectionPool(legacy_database, 2))
+    app_module.init_db()
+    app_module.init_db()  # already current: nothing to do
+    with app_module.db_connection() as conn:
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == len(app_module.MIGRATIONS)
+        assert {'airframe', 'messages', 'video_offset'} <= columns(conn, 'sessions')
+        assert {'stage', 'bytes_done', 'timings', 'worker'} <= columns(conn, 'jobs')
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert {'flight_summaries', 'flight_analytics', 'flight_metrics', 'workers'} <= tables
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {'idx_sessions_user_created', 'idx_sessions_airframe_created', 'idx_jobs_session',
+                'idx_jobs_status'} <= indexes
+        assert conn.execute('SELECT user_id, log_file FROM sessions').fetchall() == [(1, 'uploads/1_flight.BIN')]
+
+
+@pytest.mark.parametrize('sql, index', [
+    ('SELECT id FROM sessions WHERE user_id = ? ORDER BY created_at DESC', 'idx_sessions_user_created'),
+    ('SELECT id FROM sessions WHERE airframe = ? ORDER BY created_at DESC', 'idx_sessions_airframe_created'),
+    ('SELECT id FROM jobs WHERE session_id = ? ORDER BY id DESC LIMIT 1', 'idx_jobs_session'),
+])
+def test_queries_use_indexes(app_module, sql, index):
+    with app_module.db_connection() as conn:
+        plan = ' '.join(row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', (1,)))
+    assert index in plan and 'TEMP B-TREE' not in plan
+
+
+def test_load_user_is_cached(app_module, user_client, monkeypatch):
+    user_id = str(user_client.user_id)
+    assert app_module.load_user(user_id).id == user_client.user_id
+    with app_module.db_connection() as conn:
+        conn.execute("UPDATE users SET username = 'renamed' WHERE id = ?", (user_id,))
+        conn.commit()
+    assert app_module.load_user(user_id).username != 'renamed'  # within the TTL
+    monkeypatch.setattr(app_module, 'USER_CACHE_TTL', 0)
+    with app_module.user_cache_lock:
+        app_module.user_cache.pop(user_id)
+    app_module.load_user(user_id)
+    assert app_module.load_user(user_id).username == 'renamed'
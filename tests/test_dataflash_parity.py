@@ -0,0 +1,113 @@
+# The bulk DataFlash decoder must read exactly what pymavlink reads, on clean logs and
+# on logs with junk between and inside records, for all message types and for subsets
+# (which pymavlink reads through its index, where the log has one); indexing a log as
+# it is written must find the same records as indexing the finished file.
+import shutil
+import numpy as np
+import pytest
+
+from dataflash import FMT_LENGTH, FMT_TYPE, DataFlashLog
+from loganalysis import iter_streams, parse_log
+
+pytest.importorskip('pymavlink')
+
+DURATION = 10
+
+
+def insert_junk(path, seed, insertions=200, max_length=40):
+    # Splice runs of random bytes into the log's records at random offsets, some of
+    # them inside records and some starting with a stray header. The FMT records at
+    # the start are left intact: a corrupt format definition is rejected by the bulk
+    # decoder where pymavlink takes it as far as it parses.
+    with DataFlashLog(path) as log:
+        start = int(log.offsets[FMT_TYPE].max()) + FMT_LENGTH
+    rng = np.random.default_rng(seed)
+    data = np.fromfile(path, dtype=np.uint8)
+    positions = np.sort(rng.integers(start, len(data), insertions))
+    parts = []
+    previous = 0
+    for position in positions:
+        junk = rng.integers(0, 256, rng.integers(2, max_length + 1), dtype=np.uint8)
+        if rng.random() < 0.3:
+            junk[:2] = [0xA3, 0x95]
+        parts += [data[previous:position], junk]
+        previous = position
+    parts.append(data[previous:])
+    np.concatenate(parts).tofile(path)
+
+
+@pytest.fixture(params=['clean', 'junk'])
+def log_path(request, tmp_path, synthetic_log):
+    path = synthetic_log(DURATION, seed=1)
+    if request.param == 'junk':
+        path = shutil.copy(path, str(tmp_path / 'flight.BIN'))  # the shared log stays clean
+        insert_junk(path, seed=2)
+    return path
+
+
+@pytest.mark.parametrize('message_types', [None, ['ATT'], ['BARO', 'GPA']], ids=['all', 'ATT', 'BARO+GPA'])
+def test_engines_decode_identical_streams(log_path, message_types):
+    bulk = dict(iter_streams(parse_log(log_path, message_types, engine='dataflash')))
+    reference = dict(iter_streams(parse_log(log_path, message_types, engine='pymavlink')))
+    assert sorted(bulk) == sorted(reference)
+    for stream, series in reference.items():
+        assert bulk[stream].fields == series.fields, stream
+        for column in ['Time'] + series.fields:
+            np.testing.assert_array_equal(np.asarray(bulk[stream][column]), np.asarray(series[column]),
+                                          err_msg=f"{stream}.{column}")
+
+
+def test_pymavlink_unpacks_only_requested_types(synthetic_log, monkeypatch):
+    from pymavlink import DFReader
+    path = synthetic_log(DURATION, seed=1)
+    unpacked = []
+    parse_next = DFReader.DFReader_binary._parse_next
+
+    def record(self):
+        msg = parse_next(self)
+        if msg is not None:
+            unpacked.append(msg.get_type())
+        return msg
+
+    monkeypatch.setattr(DFReader.DFReader_binary, '_parse_next', record)
+    data = parse_log(path, ['ATT'], engine='pymavlink')
+    others = [msg_type for msg_type in unpacked if msg_type != 'ATT']
+    # Besides the ATT records, only the few the reader unpacks while indexing
+    assert len(data['ATT']) > 1000
+    assert len(others) < 100
+
+
+def test_pymavlink_reads_non_dataflash_text_log(tmp_path):
+    # pymavlink opens such a .log as a telemetry log, which has no offset index
+    path = str(tmp_path / 'notes.log')
+    with open(path, 'w') as f:
+        f.write('not a DataFlash log\n')
+    data = parse_log(path, ['ATT'], engine='pymavlink')
+    assert len(data['ATT']) == 0
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_incremental_index_matches_one_shot(log_path, tmp_path, seed):
+    data = open(log_path, 'rb').read()
+    with DataFlashLog(log_path) as log:
+        expected = log.offsets
+
+    rng = np.random.default_rng(seed)
+    growing = str(tmp_path / 'growing.BIN')
+    with open(growing, 'wb') as out:
+        log = DataFlashLog(growing, incremental=True)
+        position = 0
+        while position < len(data):
+            # Mostly small appends, so records and headers are often cut in two
+            size = int(rng.integers(1, 64)) if rng.random() < 0.5 else int(rng.integers(64, 64 * 1024))
+            out.write(data[position:position + size])
+            out.flush()
+            position += size
+            log.feed()
+        log.finish()
+    try:
+        assert sorted(log.offsets) == sorted(expected)
+        for msg_type, offsets in expected.items():
+            np.testing.assert_array_equal(log.offsets[msg_type], offsets, err_msg=f"type {msg_type}")
+    finally:
+        log.close()
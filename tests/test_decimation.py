@@ -0,0 +1,52 @@
+# Plotted lines are reduced to a min/max envelope: at most two samples per bucket, in
+# time order, keeping every bucket's extremes (so single-sample spikes survive), and
+# renders made at another PLOT_POINTS are redone.
+import os
+import numpy as np
+import pytest
+
+from loganalysis import minmax_decimate
+
+
+@pytest.mark.parametrize('n', [10_000, 10_007])  # with and without a short last bucket
+def test_envelope_keeps_bucket_extremes(n):
+    rng = np.random.default_rng(0)
+    time = np.arange(n, dtype=np.float64) / 400
+    values = rng.normal(size=n).astype(np.float32)
+    values[1234] = 50  # a one-sample spike
+    values[8765] = -50
+
+    decimated_time, decimated = minmax_decimate(time, values, 100)
+    assert len(decimated) == len(decimated_time) <= 2 * 101
+    assert np.all(np.diff(decimated_time) >= 0)
+    assert {50, -50} <= set(decimated.tolist())
+    # Every kept sample is a real one, at its own time
+    index = np.round(decimated_time * 400).astype(int)
+    np.testing.assert_array_equal(values[index], decimated)
+    # Each bucket's minimum and maximum are kept
+    size = -(-n // 100)
+    for start in range(0, n, size):
+        kept = decimated[(index >= start) & (index < start + size)]
+        assert kept.min() == values[start:start + size].min()
+        assert kept.max() == values[start:start + size].max()
+
+
+@pytest.mark.parametrize('n, buckets', [(200, 100), (5, 100), (10_000, 0)])
+def test_short_lines_and_disabled_decimation_are_unchanged(n, buckets):
+    time, values = np.arange(n, dtype=np.float64), np.arange(n, dtype=np.float32)
+    decimated_time, decimated = minmax_decimate(time, values, buckets)
+    assert decimated_time is time and decimated is values
+
+
+def test_renders_at_another_resolution_are_redone(app_module, synthetic_log, monkeypatch):
+    path = synthetic_log(1, seed=10)
+    rendered = []
+    monkeypatch.setattr(app_module, 'generate_plots',
+                        lambda data, out_dir, **kwargs: rendered.append(out_dir) or os.makedirs(out_dir) or {})
+
+    app_module.ensure_plots(path, ['ATT'])
+    app_module.ensure_plots(path, ['ATT'])
+    assert len(rendered) == 1
+    monkeypatch.setattr(app_module, 'PLOT_POINTS', app_module.PLOT_POINTS * 2)
+    app_module.ensure_plots(path, ['ATT'])
+    assert len(rendered) == 2
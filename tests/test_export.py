@@ -0,0 +1,96 @@
+# Every export format reads back as the decoded series it was written from, across
+# chunk boundaries and for instanced streams, and the web endpoint only ever exports
+# from the parse cache.
+import io
+import os
+import zipfile
+import numpy as np
+import pytest
+
+import export
+from loganalysis import iter_streams, parse_log
+
+MESSAGE_TYPES = ['ATT', 'BARO', 'ESC']
+
+
+@pytest.fixture
+def log_path(synthetic_log):
+    return synthetic_log(10, seed=5)
+
+
+@pytest.fixture
+def expected(log_path):
+    return dict(iter_streams(parse_log(log_path, MESSAGE_TYPES)))
+
+
+def exported(log_path, fmt, monkeypatch):
+    monkeypatch.setattr(export, 'EXPORT_CHUNK_ROWS', 1000)  # several chunks per stream
+    chunks = export.export_chunks(fmt, export.iter_message_data(log_path, MESSAGE_TYPES), MESSAGE_TYPES)
+    return b''.join(chunks)
+
+
+def assert_stream_equal(columns, series, stream):
+    assert sorted(columns) == sorted(['Time'] + series.fields), stream
+    for column in ['Time'] + series.fields:
+        np.testing.assert_array_equal(np.asarray(columns[column], dtype=np.float64),
+                                      np.asarray(series[column], dtype=np.float64), err_msg=f"{stream}.{column}")
+
+
+def test_parquet_round_trip(log_path, expected, monkeypatch):
+    pq = pytest.importorskip('pyarrow.parquet')
+    table = pq.read_table(io.BytesIO(exported(log_path, 'parquet', monkeypatch))).to_pydict()
+    streams = np.array(table.pop('stream'))
+    assert sorted(set(streams)) == sorted(expected)
+    for stream, series in expected.items():
+        rows = streams == stream
+        assert_stream_equal({column: np.array(values, dtype=np.float64)[rows] for column, values in table.items()
+                             if column == 'Time' or column in series.fields}, series, stream)
+        # Fields the stream lacks are null
+        for column in set(table) - {'Time'} - set(series.fields):
+            assert all(value is None for value, row in zip(table[column], rows) if row), f"{stream}.{column}"
+
+
+def test_csv_round_trip(log_path, expected, monkeypatch):
+    with zipfile.ZipFile(io.BytesIO(exported(log_path, 'csv', monkeypatch))) as archive:
+        assert sorted(archive.namelist()) == sorted(f'{stream}.csv' for stream in expected)
+        for stream, series in expected.items():
+            with archive.open(f'{stream}.csv') as member:
+                header = member.readline().decode().strip().split(',')
+                values = np.loadtxt(member, delimiter=',', ndmin=2)
+            columns = {column: values[:, i] for i, column in enumerate(header)}
+            # Written with 10 significant digits, which float32 columns survive exactly
+            assert_stream_equal({column: np.asarray(column_values, dtype=np.asarray(series[column]).dtype)
+                                 for column, column_values in columns.items()}, series, stream)
+
+
+def test_hdf5_round_trip(log_path, expected, monkeypatch):
+    h5py = pytest.importorskip('h5py')
+    with h5py.File(io.BytesIO(exported(log_path, 'hdf5', monkeypatch)), 'r') as f:
+        assert sorted(f) == sorted(expected)
+        for stream, series in expected.items():
+            assert f[stream].attrs['message'] == stream.split('.')[0]
+            assert_stream_equal({column: f[stream][column][:] for column in f[stream]}, series, stream)
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        export.export_chunks('xlsx', iter([]))
+
+
+def test_endpoint_exports_only_from_the_parse_cache(app_module, user_client, synthetic_log, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(app_module, 'submit_job', submitted.append)
+    monkeypatch.setattr(app_module, 'generate_plots', lambda data, out_dir, **kwargs: os.makedirs(out_dir) or {})
+    with app_module.db_connection() as conn:
+        session_id = conn.execute('INSERT INTO sessions (user_id, log_file, created_at) VALUES (?, ?, ?)',
+                                  (user_client.user_id, synthetic_log(5, seed=6), '2026-01-01')).lastrowid
+        conn.commit()
+    url = f'/session/{session_id}/export/csv?messages=ATT'
+
+    response = user_client.get(url)
+    assert response.status_code == 503 and response.headers['Retry-After']
+    app_module.run_job(submitted[0])
+    response = user_client.get(url)
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        assert archive.namelist() == ['ATT.csv']
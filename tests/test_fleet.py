@@ -0,0 +1,82 @@
+# Fleet queries over decoded columns: metrics are stored per log, so they survive the
+# parse cache being cleared, a flight whose log can't be read is reported rather than
+# failing the whole query, unknown streams and fields are refused, and the command
+# line runs against an existing database without importing the web app.
+import json
+import os
+import shutil
+import subprocess
+import sys
+import pytest
+
+import fleet
+from fleet import parse_fleet_metric
+
+
+@pytest.fixture
+def flights(app_module, user_client, synthetic_log):
+    # Three processed flights of one airframe; the middle one's log has been deleted
+    folder = app_module.app.config['UPLOAD_FOLDER']
+    summary = {column: 1.0 for column in app_module.FLIGHT_SUMMARY_COLUMNS}
+    session_ids = []
+    for seed in range(3):
+        path = os.path.join(folder, f'{user_client.user_id}_fleet{seed}.BIN')
+        if seed != 1:
+            shutil.copy(synthetic_log(5, seed=seed), path)
+        with app_module.db_connection() as conn:
+            c = conn.execute("INSERT INTO sessions (user_id, log_file, created_at, airframe) VALUES (?, ?, ?, 'fleet')",
+                             (user_client.user_id, path, f'2026-01-0{seed + 1}'))
+            conn.commit()
+        app_module.store_flight_summary(c.lastrowid, summary)
+        session_ids.append(c.lastrowid)
+    return session_ids
+
+
+def query(app_module, user_client):
+    metric = parse_fleet_metric('BAT.Volt:max')
+    return app_module.fleet_query(metrics=[metric], airframe='fleet', user_id=user_client.user_id)['flights']
+
+
+def test_failed_flight_is_reported(app_module, user_client, flights):
+    result = query(app_module, user_client)
+    assert [flight['session_id'] for flight in result] == flights
+    good, bad, _ = result
+    assert good['metrics']['BAT.Volt:max'] is not None and 'error' not in good
+    assert bad['metrics']['BAT.Volt:max'] is None and bad['error']
+
+
+def test_metrics_outlive_parse_cache(app_module, user_client, flights, monkeypatch):
+    first = query(app_module, user_client)
+    shutil.rmtree(app_module.app.config['PARSE_CACHE_FOLDER'])
+    os.makedirs(app_module.app.config['PARSE_CACHE_FOLDER'])
+    monkeypatch.setattr(app_module, 'load_series_index', lambda *args: pytest.fail("log decoded again"))
+    again = query(app_module, user_client)
+    assert [flight['metrics'] for flight in again if 'error' not in flight] == \
+           [flight['metrics'] for flight in first if 'error' not in flight]
+
+
+@pytest.mark.parametrize('text', ['BTA.Volt', 'BAT.Vlot', 'BAT.0.Volt', 'ESC.Temp', 'ESC.9.Temp', 'BAT.Volt:median'])
+def test_unknown_metric_is_refused(user_client, text):
+    with pytest.raises(ValueError):
+        parse_fleet_metric(text)
+    assert user_client.get('/fleet/query', query_string={'metric': text}).status_code == 400
+
+
+def test_cli_queries_existing_database(app_module, user_client, flights, tmp_path):
+    # Run where the app keeps its database and logs, after the parse cache was cleared
+    shutil.rmtree(app_module.app.config['PARSE_CACHE_FOLDER'])
+    before = sorted(name for name in os.listdir('.') if not name.startswith('users.db'))
+    command = [sys.executable, fleet.__file__, '--airframe', 'fleet', '--json',
+               '--user-id', str(user_client.user_id), '--metric', 'BAT.Volt:p5']
+    result = subprocess.run(command, capture_output=True, text=True)
+    after = sorted(name for name in os.listdir('.') if not name.startswith('users.db'))
+    os.makedirs(app_module.app.config['PARSE_CACHE_FOLDER'])
+    assert result.returncode == 0, result.stderr
+    assert after == before  # no parse cache or other folders, as importing the app would create
+    values = [flight['metrics']['BAT.Volt:p5'] for flight in json.loads(result.stdout)['flights']]
+    assert values[0] is not None and values[1] is None and values[2] is not None
+
+    result = subprocess.run(command + ['--database', str(tmp_path / 'missing.db')], capture_output=True, text=True)
+    assert result.returncode == 2 and 'No database' in result.stderr
+    result = subprocess.run(command + ['--metric', 'BAT.Vlot'], capture_output=True, text=True)
+    assert result.returncode == 2 and 'Unknown field' in result.stderr
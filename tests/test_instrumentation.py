@@ -0,0 +1,64 @@
+# Processing instrumentation: stage timings record wall and CPU time and memory per
+# stage, a job's breakdown from upload to plots is kept on its row and counted in the
+# job histogram, and the profiler keeps dumps only of slow blocks.
+import os
+import time
+import tracemalloc
+import pytest
+
+from instrumentation import Profiler, StageTimings
+
+
+def test_stage_timings():
+    timings = StageTimings()
+    tracemalloc.start()
+    try:
+        with timings.stage('parse', log='flight.BIN') as stage:
+            with timings.stage('parse.decode.ATT'):
+                buffer = bytearray(8 * 1024 ** 2)
+            stage['records'] = 10
+            del buffer
+            time.sleep(0.01)
+    finally:
+        tracemalloc.stop()
+    inner, outer = timings.as_list()
+    assert inner['stage'] == 'parse.decode.ATT' and outer['stage'] == 'parse'
+    assert outer['log'] == 'flight.BIN' and outer['records'] == 10
+    assert outer['seconds'] >= max(inner['seconds'], 0.01) and 'cpu_seconds' in outer
+    # The inner stage's allocation counts towards both peaks
+    assert inner['traced_peak_mb'] >= 8 and outer['traced_peak_mb'] >= 8
+    timings.add('parse', 1.5)
+    assert timings.total('parse') == pytest.approx(outer['seconds'] + 1.5)
+
+
+def test_job_timings_are_kept(app_module, user_client, synthetic_log, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(app_module, 'submit_job', submitted.append)
+    monkeypatch.setattr(app_module, 'generate_plots', lambda data, out_dir, **kwargs: os.makedirs(out_dir) or {})
+    with open(synthetic_log(2, seed=12), 'rb') as f:
+        user_client.post('/', data={'file': (f, 'flight.BIN')})
+
+    def jobs_done():
+        return app_module.job_duration.snapshot().get(('done',), [0, 0])[-2]
+
+    before = jobs_done()
+    app_module.run_job(submitted[0])
+    timings = user_client.get(f'/jobs/{submitted[0]}/status').get_json()['timings']
+    stages = [record['stage'] for record in timings]
+    assert stages[:3] == ['upload.log', 'db.session', 'queue']
+    assert {'parse', 'summary', 'db.summary', 'analytics', 'plots', 'plots.cache_read'} <= set(stages)
+    assert stages[-1] == 'job'
+    assert all(record['seconds'] >= 0 for record in timings)
+    assert jobs_done() == before + 1
+
+
+def test_only_slow_blocks_are_profiled(tmp_path):
+    folder = str(tmp_path / 'profiles')
+    with Profiler('cprofile', folder, slow_seconds=60).profile('fast'):
+        sum(range(1000))
+    assert not os.path.exists(folder)
+    with Profiler('cprofile', folder, slow_seconds=0).profile('job-1'):
+        sum(range(1000))
+    names = os.listdir(folder)
+    assert sorted(os.path.splitext(name)[1] for name in names) == ['.prof', '.txt']
+    assert all(name.startswith('job-1-') for name in names)
@@ -0,0 +1,141 @@
+# Uploaded logs are processed by a background job rather than in the upload request:
+# the upload redirects to the job's page, the session waits for the job, a job runs
+# once however often it is submitted, failures are reported, and jobs whose worker
+# died are queued again. Each job's progress is kept on its row and streamed to the
+# job's page as Server-Sent Events.
+import json
+import os
+import time
+import pytest
+
+
+@pytest.fixture
+def submitted(app_module, monkeypatch):
+    # Job ids handed to the thread pool, which the tests run themselves
+    submitted = []
+    monkeypatch.setattr(app_module, 'submit_job', submitted.append)
+    monkeypatch.setattr(app_module, 'generate_plots', lambda data, out_dir, **kwargs: os.makedirs(out_dir) or {})
+    return submitted
+
+
+def upload(client, path):
+    with open(path, 'rb') as f:
+        return client.post('/', data={'file': (f, os.path.basename(path))})
+
+
+def job_session(app_module, job_id):
+    with app_module.db_connection() as conn:
+        return conn.execute('SELECT session_id FROM jobs WHERE id = ?', (job_id,)).fetchone()[0]
+
+
+def test_upload_is_processed_by_a_job(app_module, user_client, synthetic_log, submitted, monkeypatch):
+    path = synthetic_log(5, seed=8)
+    parsed = []
+    load_parsed_log = app_module.load_parsed_log
+    monkeypatch.setattr(app_module, 'load_parsed_log',
+                        lambda *args, **kwargs: parsed.append(args[0]) or load_parsed_log(*args, **kwargs))
+
+    response = upload(user_client, path)
+    assert response.status_code == 302
+    job_id, = submitted
+    assert response.headers['Location'].endswith(f'/jobs/{job_id}')
+    assert parsed == []  # nothing decoded inside the request
+    session_id = job_session(app_module, job_id)
+    assert user_client.get(f'/jobs/{job_id}').status_code == 200
+    assert user_client.get(f'/jobs/{job_id}/status').get_json()['status'] == 'queued'
+    assert user_client.get(f'/session/{session_id}').headers['Location'].endswith(f'/jobs/{job_id}')
+
+    app_module.run_job(job_id)
+    assert parsed
+    runs = len(parsed)
+    app_module.run_job(job_id)  # claimed already, so not run again
+    assert len(parsed) == runs
+    status = user_client.get(f'/jobs/{job_id}/status').get_json()
+    assert status['status'] == 'done' and status['error'] is None and status['session_id'] == session_id
+    assert user_client.get(f'/session/{session_id}').status_code == 200
+
+
+def test_failed_job_is_reported(app_module, user_client, synthetic_log, submitted, monkeypatch):
+    def fail(*args, **kwargs):
+        raise ValueError("unreadable log")
+
+    monkeypatch.setattr(app_module, 'load_parsed_log', fail)
+    path = synthetic_log(1, seed=9)
+    upload(user_client, path)
+    job_id, = submitted
+    app_module.run_job(job_id)
+
+    status = user_client.get(f'/jobs/{job_id}/status').get_json()
+    assert status['status'] == 'failed' and status['error'] == "unreadable log"
+    response = user_client.get(f'/session/{job_session(app_module, job_id)}')
+    assert response.status_code == 200 and status['error'] in response.get_data(as_text=True)
+
+
+def test_jobs_are_private(app_module, user_client, synthetic_log, submitted):
+    path = synthetic_log(1, seed=9)
+    upload(user_client, path)
+    job_id, = submitted
+    with app_module.db_connection() as conn:
+        conn.execute('UPDATE jobs SET user_id = ? WHERE id = ?', (user_client.user_id + 1000, job_id))
+        conn.commit()
+    for url in (f'/jobs/{job_id}', f'/jobs/{job_id}/status', f'/jobs/{job_id}/events'):
+        assert user_client.get(url).status_code == 403
+
+
+def test_job_of_a_dead_worker_is_queued_again(app_module, user_client, synthetic_log, submitted):
+    path = synthetic_log(1, seed=9)
+    upload(user_client, path)
+    job_id, = submitted
+    with app_module.db_connection() as conn:
+        conn.execute("UPDATE jobs SET status = 'running', worker = 'gone:1:0' WHERE id = ?", (job_id,))
+        conn.commit()
+
+    app_module.recover_jobs()
+    assert submitted == [job_id, job_id]
+    assert app_module.read_job_state(job_id)['status'] == 'queued'
+    app_module.run_job(job_id)
+    assert app_module.read_job_state(job_id)['status'] == 'done'
+
+
+def test_progress_is_streamed_as_events(app_module, user_client, synthetic_log, submitted, monkeypatch):
+    path = synthetic_log(1, seed=9)
+    upload(user_client, path)
+    job_id, = submitted
+    progress = app_module.JobProgress(job_id, interval=0)
+    # The stream polls the job's row between sleeps; each sleep advances the job instead
+    steps = iter([lambda: progress.update(stage='parsing', bytes_done=0, bytes_total=100),
+                  lambda: progress.update(bytes_done=50),
+                  lambda: None,  # no change, so no event
+                  lambda: progress.update(stage='plotting', plots_done=1, plots_total=2),
+                  lambda: app_module.set_job_status(job_id, 'done')])
+    monkeypatch.setattr(time, 'sleep', lambda seconds: next(steps)())
+
+    response = user_client.get(f'/jobs/{job_id}/events')
+    assert response.mimetype == 'text/event-stream' and response.headers['Cache-Control'] == 'no-cache'
+    body = response.get_data(as_text=True)
+    assert body.endswith('\n\n')
+    events = [json.loads(event[len('data: '):]) for event in body.strip().split('\n\n')]
+    assert [(event['status'], event['stage'], event['bytes_done'], event['plots_done']) for event in events] == [
+        ('queued', None, 0, 0),
+        ('queued', 'parsing', 0, 0),
+        ('queued', 'parsing', 50, 0),
+        ('queued', 'plotting', 50, 1),
+        ('done', 'plotting', 50, 1),
+    ]
+
+
+def test_progress_writes_are_throttled(app_module, user_client, synthetic_log, submitted):
+    path = synthetic_log(1, seed=9)
+    upload(user_client, path)
+    job_id, = submitted
+    progress = app_module.JobProgress(job_id, interval=60)
+    progress.update(stage='parsing', bytes_done=1, bytes_total=100)
+    progress.parse_callback(2, 100)  # within the interval, so only kept in memory
+    assert app_module.read_job_state(job_id)['bytes_done'] == 1
+    progress.update(force=True)
+    assert app_module.read_job_state(job_id)['bytes_done'] == 2
+
+    # A finished job reports the whole log as parsed
+    app_module.run_job(job_id)
+    state = app_module.read_job_state(job_id)
+    assert state['status'] == 'done' and state['bytes_done'] == state['bytes_total'] == os.path.getsize(path)
@@ -0,0 +1,114 @@
+# /metrics: stage timings come out as valid Prometheus text exposition, histograms are
+# cumulative, label values are escaped, and snapshots of other server processes are
+# added to this one's.
+import os
+import re
+import pytest
+from instrumentation import MetricsRegistry
+
+SAMPLE = re.compile(r'([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{((?:[a-zA-Z_]\w*="(?:[^"\\\n]|\\.)*",?)*)\})? (\S+)')
+LABEL = re.compile(r'([a-zA-Z_]\w*)="((?:[^"\\\n]|\\.)*)"')
+
+
+def parse_exposition(text):
+    # {metric family: type}, [(sample name, {label: value}, value)], failing on any line
+    # that isn't a HELP, TYPE or sample line of the text format
+    assert text.endswith('\n')
+    types, samples = {}, []
+    for line in text.splitlines():
+        if line.startswith('# HELP '):
+            continue
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split(' ')
+            assert kind in ('counter', 'gauge', 'histogram', 'summary', 'untyped'), line
+            assert name not in types, f"{name} declared twice"
+            types[name] = kind
+            continue
+        match = SAMPLE.fullmatch(line)
+        assert match, f"not a sample line: {line!r}"
+        name, labels, value = match.groups()
+        family = re.sub(r'_(bucket|sum|count)$', '', name) if name not in types else name
+        assert family in types, f"{name} has no TYPE line"
+        samples.append((name, dict(LABEL.findall(labels or '')), float(value)))
+    return types, samples
+
+
+def histogram_series(samples, name, **labels):
+    # (bucket counts by bound, sum, count) of one labelled series of a histogram
+    def matches(sample_labels):
+        return all(sample_labels.get(label) == value for label, value in labels.items())
+
+    buckets = {float(sample_labels['le']): value for sample, sample_labels, value in samples
+               if sample == f'{name}_bucket' and matches(sample_labels)}
+    total, = [value for sample, sample_labels, value in samples if sample == f'{name}_sum' and matches(sample_labels)]
+    count, = [value for sample, sample_labels, value in samples if sample == f'{name}_count' and matches(sample_labels)]
+    return buckets, total, count
+
+
+def test_stage_timing_is_exposed(app_module, client):
+    with app_module.timed_stage('test.metrics'):
+        pass
+    app_module.observe_stages([{'stage': 'test.metrics', 'seconds': 7.0}])
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain' and response.mimetype_params['version'] == '0.0.4'
+    types, samples = parse_exposition(response.get_data(as_text=True))
+    assert types['loganalyser_stage_duration_seconds'] == 'histogram'
+    assert types['loganalyser_parse_cache_events_total'] == 'counter'
+
+    buckets, total, count = histogram_series(samples, 'loganalyser_stage_duration_seconds', stage='test.metrics')
+    assert count == 2 and total >= 7.0
+    bounds = sorted(buckets)
+    assert bounds[-1] == float('inf') and buckets[bounds[-1]] == count
+    assert [buckets[bound] for bound in bounds] == sorted(buckets.values())  # cumulative
+    assert buckets[5.0] == 1 and buckets[10.0] == 2
+    # The first scrape was itself timed, and shows up in the next one
+    _, samples = parse_exposition(client.get('/metrics').get_data(as_text=True))
+    assert histogram_series(samples, 'loganalyser_http_request_duration_seconds', endpoint='get_metrics')[2] >= 1
+
+
+def test_token_is_required_when_set(app_module, client, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'METRICS_TOKEN', 'secret')
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.histogram('test_seconds', "Test", ['stage'], buckets=(1,)).observe(0.5, stage='a "quoted"\\\nstage')
+    _, samples = parse_exposition(registry.render())
+    assert {labels['stage'] for _, labels, _ in samples} == {r'a \"quoted\"\\\nstage'}
+
+
+@pytest.fixture
+def process_registries(tmp_path):
+    # Two registries sharing a snapshot folder, standing in for two server processes
+    registries = []
+    for name in ('first', 'second'):
+        registry = MetricsRegistry(str(tmp_path))
+        registry.snapshot_pid, registry.snapshot_name = os.getpid(), f'{name}.json'
+        histogram = registry.histogram('test_seconds', "Test", ['stage'], buckets=(1, 10))
+        counter = registry.counter('test_total', "Test", ['event'])
+        registries.append((registry, histogram, counter))
+    return registries
+
+
+def test_other_processes_are_summed(process_registries):
+    (first, first_histogram, first_counter), (second, second_histogram, second_counter) = process_registries
+    first_histogram.observe(0.5, stage='parse')
+    first_counter.inc(event='hits')
+    second_histogram.observe(5, stage='parse')
+    second_histogram.observe(20, stage='plots')
+    second_counter.inc(2, event='hits')
+    second.write_snapshot()
+
+    _, samples = parse_exposition(first.render())
+    assert histogram_series(samples, 'test_seconds', stage='parse') == ({1.0: 1, 10.0: 2, float('inf'): 2}, 5.5, 2)
+    assert histogram_series(samples, 'test_seconds', stage='plots') == ({1.0: 0, 10.0: 0, float('inf'): 1}, 20, 1)
+    assert ('test_total', {'event': 'hits'}, 3) in samples
+
+    # A process's own snapshot is never counted on top of its live values
+    first.write_snapshot()
+    assert first.collect()['test_total'] == {('hits',): 3}
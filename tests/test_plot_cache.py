@@ -0,0 +1,97 @@
+# Rendered plots and the parse cache on disk: failed writes leave no .tmp- entries
+# behind, eviction clears out those of dead processes, and a session whose outputs were
+# evicted is processed again by a job rather than inside the page request. The memo of
+# log digests both caches are keyed by stays bounded.
+import os
+import time
+import pytest
+
+
+@pytest.fixture
+def log_path(synthetic_log):
+    return synthetic_log(20)
+
+
+def tmp_entries(folder):
+    return [name for name in os.listdir(folder) if '.tmp-' in name]
+
+
+def test_failed_render_leaves_no_tmp_dir(app_module, log_path, monkeypatch):
+    def fail(data, out_dir, **kwargs):
+        os.makedirs(out_dir)
+        open(os.path.join(out_dir, 'ATT.png'), 'w').close()
+        raise RuntimeError("render failed")
+
+    monkeypatch.setattr(app_module, 'generate_plots', fail)
+    with pytest.raises(RuntimeError):
+        app_module.ensure_plots(log_path, ['ATT'])
+    assert tmp_entries(app_module.app.config['PLOT_FOLDER']) == []
+
+
+def test_failed_cache_write_leaves_no_tmp_entry(app_module, log_path, monkeypatch):
+    def fail(values):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(app_module, 'build_minmax_pyramid', fail)
+    with pytest.raises(OSError):
+        app_module.write_parse_cache('0' * 64, app_module.parse_log(log_path, ['ATT']))
+    assert tmp_entries(app_module.app.config['PARSE_CACHE_FOLDER']) == []
+
+
+def test_eviction_removes_stale_tmp_entries(app_module, tmp_path):
+    cache_root = str(tmp_path / 'cache')
+    stale, fresh = os.path.join(cache_root, 'a.tmp-1-1'), os.path.join(cache_root, 'b.tmp-2-2')
+    for path in (stale, fresh):
+        os.makedirs(path)
+        open(os.path.join(path, 'x.npy'), 'w').close()
+    open(os.path.join(cache_root, 'c.tmp-3-3.error'), 'w').close()
+    old = time.time() - app_module.app.config['CACHE_TMP_GRACE_SECONDS'] - 1
+    os.utime(stale, (old, old))
+    os.utime(os.path.join(cache_root, 'c.tmp-3-3.error'), (old, old))
+    app_module.evict_lru(cache_root, 1024 ** 3)
+    assert sorted(os.listdir(cache_root)) == ['b.tmp-2-2']
+
+
+def test_evicted_session_is_processed_by_a_job(app_module, user_client, log_path, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(app_module, 'submit_job', submitted.append)
+    with app_module.db_connection() as conn:
+        c = conn.execute('INSERT INTO sessions (user_id, log_file, created_at) VALUES (?, ?, ?)',
+                         (user_client.user_id, log_path, '2026-01-01'))
+        conn.commit()
+        session_id = c.lastrowid
+    rendered = []
+
+    def render(data, out_dir, **kwargs):
+        rendered.append(out_dir)
+        os.makedirs(out_dir)
+        return {}
+
+    monkeypatch.setattr(app_module, 'generate_plots', render)
+
+    response = user_client.get(f'/session/{session_id}')
+    assert response.status_code == 302
+    job_id = submitted[0]
+    assert response.headers['Location'].endswith(f'/jobs/{job_id}')
+    assert rendered == []  # nothing rendered inside the request
+
+    app_module.run_job(job_id)
+    assert app_module.get_session_job(session_id)[1] == 'done' and len(rendered) == 1
+    assert user_client.get(f'/session/{session_id}').status_code == 200
+
+
+def test_digest_memo_is_bounded(app_module, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, '_digest_memo', {})
+    monkeypatch.setattr(app_module, 'DIGEST_MEMO_MAX', 3)
+    paths = []
+    for i in range(5):
+        paths.append(str(tmp_path / f'{i}.log'))
+        open(paths[-1], 'w').write(str(i))
+    for path in paths[:3]:
+        app_module.file_digest(path)
+    app_module.file_digest(paths[0])  # used again, so kept over 1 and 2
+    for path in paths[3:]:
+        app_module.file_digest(path)
+    assert [key[0] for key in app_module._digest_memo] == [os.path.abspath(path) for path in
+                                                          (paths[0], paths[3], paths[4])]
+    assert app_module.file_digest(paths[1]) == app_module.hashlib.sha256(b'1').hexdigest()
@@ -0,0 +1,79 @@
+# The series API behind the interactive chart: min/max reduction through the pyramid
+# keeps every window's true extremes, malformed query parameters are rejected, and a
+# log missing from the parse cache is decoded by a job rather than in the request.
+import os
+import numpy as np
+import pytest
+
+
+def test_pyramid_keeps_window_extremes(app_module):
+    rng = np.random.default_rng(0)
+    values = rng.standard_normal(100_000).astype(np.float32)
+    values[rng.integers(0, len(values), 200)] *= 50  # spikes, some just outside windows
+    pyramid = app_module.build_minmax_pyramid(values)
+    for _ in range(500):
+        start, stop = np.sort(rng.integers(0, len(values) + 1, 2))
+        points = int(rng.integers(1, 300))
+        picks = app_module.query_minmax_pyramid(pyramid, values, int(start), int(stop), points)
+        if stop - start == 0:
+            assert len(picks) == 0
+            continue
+        assert np.all((picks >= start) & (picks < stop))
+        assert np.all(np.diff(picks) >= 0)
+        assert len(picks) <= 2 * points + 4
+        window = values[start:stop]
+        assert values[picks].min() == window.min() and values[picks].max() == window.max()
+
+
+def test_pyramid_edge_block_extremes(app_module):
+    # Each edge block's own extreme lies just outside the window; the window's extremes
+    # are the runners-up just inside it
+    values = np.zeros(100_000, dtype=np.float32)
+    start, stop = 1000, 90_000
+    values[[start - 1, stop]] = 100, -100
+    values[[start + 1, stop - 1]] = 50, -50
+    pyramid = app_module.build_minmax_pyramid(values)
+    picks = app_module.query_minmax_pyramid(pyramid, values, start, stop, 10)
+    assert values[picks].max() == 50 and values[picks].min() == -50
+
+
+def insert_session(app_module, user_id, path):
+    with app_module.db_connection() as conn:
+        c = conn.execute('INSERT INTO sessions (user_id, log_file, created_at) VALUES (?, ?, ?)',
+                         (user_id, path, '2026-01-01'))
+        conn.commit()
+    return c.lastrowid
+
+
+@pytest.fixture
+def session_id(app_module, user_client, synthetic_log):
+    path = synthetic_log(20)
+    app_module.load_parsed_log(path)  # as the session's job left it
+    return insert_session(app_module, user_client.user_id, path)
+
+
+def test_series_window(user_client, session_id):
+    response = user_client.get(f'/session/{session_id}/series/ATT?fields=Roll&t0=5&t1=6&points=100')
+    assert response.status_code == 200
+    times = response.get_json()['fields']['Roll']['time']
+    assert 0 < len(times) <= 200 and 5 <= min(times) and max(times) <= 6
+
+
+@pytest.mark.parametrize('query', ['t0=abc', 't1=', 't0=nan', 't1=inf', 'points=many', 'points=1.5', 't0=6&t1=5'])
+def test_invalid_query_is_rejected(user_client, session_id, query):
+    assert user_client.get(f'/session/{session_id}/series/ATT?{query}').status_code == 400
+
+
+def test_uncached_series_is_decoded_by_a_job(app_module, user_client, synthetic_log, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(app_module, 'submit_job', submitted.append)
+    monkeypatch.setattr(app_module, 'generate_plots', lambda data, out_dir, **kwargs: os.makedirs(out_dir) or {})
+    session_id = insert_session(app_module, user_client.user_id, synthetic_log(20, seed=4))
+    url = f'/session/{session_id}/series/ATT?fields=Roll'
+
+    for _ in range(2):
+        response = user_client.get(url)
+        assert response.status_code == 503 and response.headers['Retry-After']
+    assert len(submitted) == 1  # the second request waits for the same job
+    app_module.run_job(submitted[0])
+    assert user_client.get(url).status_code == 200
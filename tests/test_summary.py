@@ -0,0 +1,69 @@
+# Per-flight summaries: each statistic is the plain reduction of the decoded columns,
+# statistics of message types that weren't decoded are missing, and a processed
+# flight's stored summary shows in the session list.
+import os
+import numpy as np
+import pytest
+
+from loganalysis import FLIGHT_SUMMARY_COLUMNS, compute_flight_summary, iter_streams, parse_log
+
+
+@pytest.fixture
+def log_path(synthetic_log):
+    return synthetic_log(10, seed=11)
+
+
+def column(streams, message, field):
+    return np.concatenate([np.asarray(series[field], dtype=np.float64) for stream, series in streams.items()
+                           if stream.split('.')[0] == message])
+
+
+def test_summary_reduces_decoded_columns(log_path):
+    streams = dict(iter_streams(parse_log(log_path)))
+    summary = compute_flight_summary(parse_log(log_path))
+    assert sorted(summary) == sorted(FLIGHT_SUMMARY_COLUMNS)
+    times = np.concatenate([np.asarray(series['Time']) for series in streams.values()])
+    expected = {
+        'duration': times.max() - times.min(),
+        'max_altitude': column(streams, 'BARO', 'Alt').max(),
+        'min_battery_voltage': column(streams, 'BAT', 'Volt').min(),
+        'max_battery_current': column(streams, 'BAT', 'Curr').max(),
+        'max_vibration': max(column(streams, 'VIBE', field).max() for field in ['VibeX', 'VibeY', 'VibeZ']),
+        'clip_count': column(streams, 'VIBE', 'Clip').max(),
+        'max_esc_temp': column(streams, 'ESC', 'Temp').max(),
+    }
+    for field in ['SV', 'SP', 'SH', 'SM', 'SVT']:
+        expected[f'max_innov_{field.lower()}'] = column(streams, 'XKF4', field).max()
+    for name, value in expected.items():
+        assert summary[name] == pytest.approx(value), name
+
+
+def test_undecoded_statistics_are_missing(log_path):
+    summary = compute_flight_summary(parse_log(log_path, ['BAT']))
+    assert summary['min_battery_voltage'] is not None and summary['duration'] > 0
+    assert all(summary[name] is None for name in FLIGHT_SUMMARY_COLUMNS
+               if name not in ('duration', 'min_battery_voltage', 'max_battery_current'))
+
+
+def test_session_list_shows_stored_summary(app_module, user_client, log_path, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(app_module, 'submit_job', submitted.append)
+    monkeypatch.setattr(app_module, 'generate_plots', lambda data, out_dir, **kwargs: os.makedirs(out_dir) or {})
+    with open(log_path, 'rb') as f:
+        user_client.post('/', data={'file': (f, 'flight.BIN')})
+    with app_module.db_connection() as conn:
+        conn.execute('INSERT INTO sessions (user_id, created_at) VALUES (?, ?)', (user_client.user_id, '2026-01-01'))
+        conn.commit()
+    summary = compute_flight_summary(parse_log(log_path))
+    duration = '%d:%02d' % (summary['duration'] // 60, summary['duration'] % 60)
+    assert f'<td>{duration}</td>' not in user_client.get('/').get_data(as_text=True)  # not processed yet
+
+    app_module.run_job(submitted[0])
+    with app_module.db_connection() as conn:
+        stored = conn.execute(f'''SELECT {', '.join(FLIGHT_SUMMARY_COLUMNS)} FROM flight_summaries
+                                  WHERE session_id = (SELECT session_id FROM jobs WHERE id = ?)''',
+                              (submitted[0],)).fetchone()
+    assert dict(zip(FLIGHT_SUMMARY_COLUMNS, stored)) == pytest.approx(summary)
+    page = user_client.get('/').get_data(as_text=True)
+    assert f'<td>{duration}</td>' in page
+    assert f"<td>{summary['min_battery_voltage']:.2f}</td>" in page
@@ -0,0 +1,129 @@
+# Thumbnail extraction state shared between server processes: failed extractions are
+# retried a limited number of times, and a claim on an extraction is given up once the
+# claiming process is gone. ffmpeg itself is replaced, so these run without it.
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import pytest
+
+
+@pytest.fixture
+def video(app_module, monkeypatch, tmp_path):
+    monkeypatch.setattr(app_module.videoindex, 'thumbnails_available', lambda: True)
+    path = tmp_path / 'flight.mp4'
+    path.write_bytes(os.urandom(1024))
+    return str(path)
+
+
+def settle(app_module):
+    # Wait for the queued extractions (VIDEO_WORKERS threads work in order)
+    for _ in range(app_module.app.config['VIDEO_WORKERS']):
+        app_module.video_executor.submit(lambda: None).result()
+
+
+def make_old(path, seconds):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_failed_extraction_is_retried_then_given_up(app_module, video, monkeypatch):
+    def fail(*args):
+        raise RuntimeError("ffmpeg failed: no video stream")
+    monkeypatch.setattr(app_module.videoindex, 'extract_thumbnails', fail)
+    retry = app_module.app.config['THUMBNAIL_RETRY_SECONDS']
+
+    status, key, _ = app_module.request_thumbnails(video)
+    assert status == 'pending'
+    settle(app_module)
+    error_path = os.path.join(app_module.app.config['THUMBNAIL_FOLDER'], f'{key}.error')
+    for attempt in range(1, app_module.app.config['THUMBNAIL_MAX_ATTEMPTS']):
+        assert app_module.request_thumbnails(video)[0] == 'failed'
+        assert app_module.read_thumbnail_error(key) == "ffmpeg failed: no video stream"
+        make_old(error_path, retry + 1)
+        assert app_module.request_thumbnails(video)[0] == 'pending'
+        settle(app_module)
+        assert json.load(open(error_path))['attempts'] == attempt + 1
+
+    make_old(error_path, retry + 1)
+    assert app_module.request_thumbnails(video)[0] == 'failed'
+    assert not os.path.exists(error_path.replace('.error', '.pending'))
+
+
+def test_retry_that_succeeds_clears_the_error(app_module, video, monkeypatch):
+    def fail(*args):
+        raise RuntimeError("ffmpeg timed out")
+    monkeypatch.setattr(app_module.videoindex, 'extract_thumbnails', fail)
+    _, key, _ = app_module.request_thumbnails(video)
+    settle(app_module)
+    error_path = os.path.join(app_module.app.config['THUMBNAIL_FOLDER'], f'{key}.error')
+    make_old(error_path, app_module.app.config['THUMBNAIL_RETRY_SECONDS'] + 1)
+
+    def extract(path, out_dir, interval, width):
+        os.makedirs(out_dir)
+        index = {'version': app_module.videoindex.THUMBNAIL_INDEX_VERSION, 'interval': interval,
+                 'width': width, 'duration': 0.0, 'thumbnails': []}
+        with open(os.path.join(out_dir, 'index.json'), 'w') as f:
+            json.dump(index, f)
+        return index
+    monkeypatch.setattr(app_module.videoindex, 'extract_thumbnails', extract)
+    assert app_module.request_thumbnails(video)[0] == 'pending'
+    settle(app_module)
+    assert app_module.request_thumbnails(video)[0] == 'ready'
+    assert not os.path.exists(error_path)
+
+
+@pytest.fixture
+def pending(app_module, tmp_path):
+    out_dir = str(tmp_path / 'thumbs')
+    yield out_dir, f'{out_dir}.pending'
+    with app_module.thumbnail_claims_lock:
+        app_module.thumbnail_claims.discard(f'{out_dir}.pending')
+
+
+def claim_by(path, host, pid):
+    with open(path, 'w') as f:
+        json.dump({'host': host, 'pid': pid}, f)
+
+
+def test_claim_of_live_process_is_kept(app_module, pending):
+    out_dir, path = pending
+    claim_by(path, socket.gethostname(), os.getppid())
+    assert not app_module.claim_thumbnails(out_dir)
+    claim_by(path, 'other-host', 12345)
+    assert not app_module.claim_thumbnails(out_dir)
+    open(path, 'w').close()  # just created, owner not written yet
+    assert not app_module.claim_thumbnails(out_dir)
+
+
+def test_claim_of_exited_process_is_taken_over(app_module, pending):
+    out_dir, path = pending
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+    claim_by(path, socket.gethostname(), exited.pid)
+    assert app_module.claim_thumbnails(out_dir)
+    assert json.load(open(path)) == {'host': socket.gethostname(), 'pid': os.getpid()}
+    assert path in app_module.thumbnail_claims
+
+
+def test_claim_without_heartbeat_is_taken_over(app_module, pending):
+    out_dir, path = pending
+    timeout = app_module.app.config['WORKER_TIMEOUT_SECONDS']
+    claim_by(path, 'other-host', 12345)
+    make_old(path, timeout + 1)
+    assert app_module.claim_thumbnails(out_dir)
+
+    # The new owner's heartbeat keeps its claim fresh
+    make_old(path, timeout + 1)
+    app_module.touch_thumbnail_claims()
+    assert time.time() - os.path.getmtime(path) < timeout
+    assert not app_module.claim_thumbnails(out_dir)
+
+
+def test_claim_left_by_earlier_process_with_our_pid_is_taken_over(app_module, pending):
+    out_dir, path = pending
+    claim_by(path, socket.gethostname(), os.getpid())
+    assert app_module.claim_thumbnails(out_dir)
+    assert not app_module.claim_thumbnails(out_dir)
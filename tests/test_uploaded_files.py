@@ -0,0 +1,121 @@
+# /uploads/<filename> over a log too big to read into memory: byte ranges and
+# conditional requests served by the app, and headers-only responses when the bytes
+# are handed off to a proxy (UPLOAD_OFFLOAD), all marked for revalidation.
+import os
+import pytest
+
+SIZE = 5 * 1024 ** 3  # past 4 GiB, so offsets don't fit in 32 bits
+MIDDLE = 3 * 1024 ** 3 + 12345
+MARKER = b'mid-file marker!'
+TAIL = b'end of the log'
+
+
+@pytest.fixture(scope='module')
+def big_log(app_module):
+    # A sparse file: only the marker and the tail take up disk space
+    path = os.path.join(app_module.app.config['UPLOAD_FOLDER'], 'big.BIN')
+    with open(path, 'wb') as f:
+        f.truncate(SIZE)
+        f.seek(MIDDLE)
+        f.write(MARKER)
+        f.seek(SIZE - len(TAIL))
+        f.write(TAIL)
+    yield 'big.BIN'
+    os.remove(path)
+
+
+@pytest.fixture
+def offload(app_module, monkeypatch):
+    def set_mode(mode):
+        monkeypatch.setitem(app_module.app.config, 'UPLOAD_OFFLOAD', mode)
+    return set_mode
+
+
+def get(client, path, **headers):
+    # The body is never read unless asked for: a full response is 5 GB
+    response = client.get(path, headers=headers, buffered=False)
+    response.close()
+    return response
+
+
+def etag(client, filename):
+    return get(client, f'/uploads/{filename}').headers['ETag']
+
+
+def test_mid_file_range(client, big_log):
+    end = MIDDLE + len(MARKER) - 1
+    response = client.get(f'/uploads/{big_log}', headers={'Range': f'bytes={MIDDLE}-{end}'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes {MIDDLE}-{end}/{SIZE}'
+    assert response.data == MARKER
+
+
+def test_suffix_range(client, big_log):
+    response = client.get(f'/uploads/{big_log}', headers={'Range': f'bytes=-{len(TAIL)}'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes {SIZE - len(TAIL)}-{SIZE - 1}/{SIZE}'
+    assert response.data == TAIL
+
+
+def test_unsatisfiable_range(client, big_log):
+    response = get(client, f'/uploads/{big_log}', Range=f'bytes={SIZE}-')
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{SIZE}'
+
+
+def test_if_range(client, big_log):
+    current = etag(client, big_log)
+    response = client.get(f'/uploads/{big_log}', headers={'Range': f'bytes={MIDDLE}-{MIDDLE + 3}',
+                                                          'If-Range': current})
+    assert response.status_code == 206
+    assert response.data == MARKER[:4]
+
+    # A stale validator gets the whole, current file instead of a range of it
+    response = get(client, f'/uploads/{big_log}', Range=f'bytes={MIDDLE}-{MIDDLE + 3}', **{'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert response.content_length == SIZE
+
+
+def test_not_modified(client, big_log):
+    response = get(client, f'/uploads/{big_log}', **{'If-None-Match': etag(client, big_log)})
+    assert response.status_code == 304
+
+
+@pytest.mark.parametrize('mode', ['off', 'x-accel-redirect', 'x-sendfile'])
+def test_revalidated_on_every_use(app_module, client, big_log, offload, monkeypatch, mode):
+    # A later upload can reuse the name, so caches must check back before reusing a copy,
+    # whatever max age is configured for static files
+    monkeypatch.setitem(app_module.app.config, 'SEND_FILE_MAX_AGE_DEFAULT', 3600)
+    offload(mode)
+    response = get(client, f'/uploads/{big_log}')
+    assert response.cache_control.no_cache
+    assert not response.cache_control.max_age
+
+
+@pytest.mark.parametrize('mode', ['x-accel-redirect', 'x-sendfile'])
+def test_offload_headers(app_module, client, big_log, offload, mode):
+    offload(mode)
+    response = client.get(f'/uploads/{big_log}')
+    assert response.status_code == 200
+    assert response.data == b''
+    path = os.path.abspath(os.path.join(app_module.app.config['UPLOAD_FOLDER'], big_log))
+    if mode == 'x-sendfile':
+        assert response.headers['X-Sendfile'] == path
+        assert 'X-Accel-Redirect' not in response.headers
+    else:
+        assert response.headers['X-Accel-Redirect'] == f"{app_module.app.config['UPLOAD_ACCEL_PREFIX']}/{big_log}"
+        assert 'X-Sendfile' not in response.headers
+
+    # Revalidation is still answered by the app, without handing anything to the proxy
+    response = client.get(f'/uploads/{big_log}', headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+    assert 'X-Sendfile' not in response.headers and 'X-Accel-Redirect' not in response.headers
+
+
+@pytest.mark.parametrize('mode', ['off', 'x-accel-redirect', 'x-sendfile'])
+@pytest.mark.parametrize('path', ['..%2Fusers.db', '%2E%2E%2Fusers.db', '..', 'partial', 'missing.BIN'])
+def test_outside_or_missing_is_not_found(client, offload, mode, path):
+    offload(mode)
+    response = client.get(f'/uploads/{path}')
+    assert response.status_code == 404
+    assert 'X-Sendfile' not in response.headers and 'X-Accel-Redirect' not in response.headers
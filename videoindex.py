@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# Video thumbnails and the video-to-log time index. Thumbnails are decoded from
+# keyframes only with ffmpeg (an optional external program; without it videos still
+# play and seek, just without thumbnails), one every `interval` seconds of video, and
+# written with an index.json next to them:
+#
+#   {"version": 1, "interval": 5.0, "width": 320, "duration": 93.4,
+#    "thumbnails": ["thumb-00001.jpg", ...]}       # thumbnail i shows video time i * interval
+#
+# A session's videos share one offset: log time = video time + offset, where log time
+# is seconds on the log's own clock (the x axis of every plot).
+import json
+import math
+import os
+import shutil
+import subprocess
+
+THUMBNAIL_INDEX_VERSION = 1
+FFMPEG = shutil.which('ffmpeg')
+FFPROBE = shutil.which('ffprobe')
+FFMPEG_TIMEOUT = 3600
+
+
+def thumbnails_available():
+    return FFMPEG is not None
+
+
+def probe_duration(path):
+    # Video length in seconds, or None if ffprobe is missing or can't tell
+    if FFPROBE is None:
+        return None
+    try:
+        result = subprocess.run([FFPROBE, '-v', 'error', '-show_entries', 'format=duration',
+                                 '-of', 'default=noprint_wrappers=1:nokey=1', path],
+                                capture_output=True, text=True, timeout=60, check=True)
+        duration = float(result.stdout.strip())
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return None
+    return duration if math.isfinite(duration) else None
+
+
+def extract_thumbnails(path, out_dir, interval, width):
+    # Write thumbnails of `path` and their index.json to out_dir (which must not exist);
+    # returns the index. Only keyframes are decoded, each grid point showing the
+    # keyframe at or before it, so this is far faster than decoding every frame.
+    if FFMPEG is None:
+        raise RuntimeError("ffmpeg is not installed")
+    if interval <= 0 or width <= 0:
+        raise ValueError("Thumbnail interval and width must be positive")
+    os.makedirs(out_dir)
+    command = [FFMPEG, '-nostdin', '-v', 'error', '-skip_frame', 'nokey', '-i', path, '-an', '-sn',
+               '-vf', f'fps=1/{interval:g},scale={width}:-2', '-q:v', '5',
+               os.path.join(out_dir, 'thumb-%05d.jpg')]
+    try:
+        subprocess.run(command, capture_output=True, text=True, timeout=FFMPEG_TIMEOUT, check=True)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"ffmpeg failed: {e.stderr.strip()[-500:]}")
+    thumbnails = sorted(name for name in os.listdir(out_dir) if name.startswith('thumb-'))
+    index = {'version': THUMBNAIL_INDEX_VERSION, 'interval': interval, 'width': width,
+             'duration': probe_duration(path) or len(thumbnails) * interval, 'thumbnails': thumbnails}
+    with open(os.path.join(out_dir, 'index.json'), 'w') as f:
+        json.dump(index, f)
+    return index
+
+
+def read_thumbnail_index(out_dir):
+    try:
+        with open(os.path.join(out_dir, 'index.json')) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return index if index.get('version') == THUMBNAIL_INDEX_VERSION else None
+
+
+def nearest_thumbnail(index, video_time):
+    # Position in index['thumbnails'] of the thumbnail closest to video_time, or None
+    count = len(index['thumbnails'])
+    if not count:
+        return None
+    return min(max(int(round(video_time / index['interval'])), 0), count - 1)
+
+
+def video_to_log_time(video_time, offset):
+    return video_time + offset
+
+
+def log_to_video_time(log_time, offset):
+    return log_time - offset